@@ -0,0 +1,103 @@
+"""Memory and parse-time benchmark of the AST built by the Parser.
+
+Run from the repository root with ``python -m benchmarks.ast_benchmark``.
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from mrog.lexer import Lexer
+from mrog.nodes import Node
+from mrog.parser import Parser
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure parse time and AST memory of a generated program.")
+    parser.add_argument("--lines", type=int, default=20000, help="Number of generated statements")
+    parser.add_argument("--repeat", type=int, default=3, help="Best-of repetitions for the parse time")
+    args = parser.parse_args()
+
+    text = generate_program(args.lines)
+    tokens = list(Lexer(text).tokenize())
+
+    best = float('inf')
+    for _ in range(args.repeat):
+        gc.collect()
+        start = time.perf_counter()
+        Parser(Lexer(text)).parse_program()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    ast = Parser(Lexer(text)).parse_program()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    nodes = count_nodes(ast)
+    print(f"statements {len(ast)}, tokens {len(tokens)}, nodes {nodes}")
+    print(f"parse time {best:.3f} s")
+    print(f"AST memory {(after - before) / 1e6:.1f} MB ({(after - before) / nodes:.0f} bytes/node)")
+
+
+def generate_expression(rng, depth):
+    """Generate a random expression over x, y and z with nested calls and functions."""
+    if depth == 0:
+        return rng.choice(['x', 'y', 'z', str(rng.randint(1, 9)), f"{rng.random():.3f}"])
+    kind = rng.random()
+    if kind < 0.6:
+        operator = rng.choice(['+', '-', '*', '/', '^'])
+        return f"({generate_expression(rng, depth - 1)} {operator} {generate_expression(rng, depth - 1)})"
+    if kind < 0.8:
+        function = rng.choice(['sin', 'cos', 'exp', 'sqrt', 'ln', 'tanh'])
+        return f"{function}({generate_expression(rng, depth - 1)})"
+    if kind < 0.9:
+        return f"log(2, {generate_expression(rng, depth - 1)})"
+    return f"({generate_expression(rng, depth - 1)})!"
+
+
+def function_name(i):
+    """Spell a function index with letters, since identifiers cannot contain digits."""
+    name = 'f'
+    while True:
+        i, letter = divmod(i, 26)
+        name += chr(ord('a') + letter)
+        if not i:
+            return name
+
+
+def generate_program(lines, depth=4, seed=0):
+    """Generate a parseable program of function definitions and prints."""
+    rng = random.Random(seed)
+    statements = []
+    for i in range(lines):
+        if i and i % 10 == 0:
+            statements.append(f"print({function_name(i - 1)}(1, 2, 3))")
+        else:
+            statements.append(f"{function_name(i)}(x, y, z) = {generate_expression(rng, depth)}")
+    return '\n'.join(statements) + '\n'
+
+
+def count_nodes(ast):
+    """Count the nodes of a program, whatever their representation."""
+    stack = list(ast)
+    count = 0
+    while stack:
+        node = stack.pop()
+        count += 1
+        values = node.values() if isinstance(node, dict) else [getattr(node, f) for f in node.__slots__]
+        for value in values:
+            items = value if isinstance(value, list) else [value]
+            for item in items:
+                stack.extend(i for i in (item if isinstance(item, list) else [item]) if is_node(i))
+    return count
+
+
+def is_node(value):
+    return isinstance(value, (dict, Node))
+
+
+if __name__ == '__main__':
+    main()
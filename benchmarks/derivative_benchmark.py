@@ -0,0 +1,48 @@
+"""Benchmark of the derivative strategies on 3-variable matrix-valued functions.
+
+Run from the repository root with ``python -m benchmarks.derivative_benchmark``.
+"""
+import argparse
+import random
+import time
+
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter, DERIVATIVE_STRATEGIES
+
+ENTRIES = ['x*y*z', 'sin(x)*cos(y)', 'exp(z/4)', 'log(2, x + y)', 'sqrt(x^2 + z^2)',
+           'atan(y*z)', 'x^y', 'tanh(x - z)', 'g(x, z)', '3!', 'cosh(y)/x']
+
+
+def generate_program(size, seed=0):
+    """Generate a size x size matrix-valued function of x, y and z."""
+    rng = random.Random(seed)
+    rows = ', '.join('[' + ', '.join(rng.choice(ENTRIES) for _ in range(size)) + ']' for _ in range(size))
+    return f"g(x, y) = x*y + sin(y)\nm(x, y, z) = matrix([{rows}])\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare derivative strategies on a matrix-valued function.")
+    parser.add_argument("--size", type=int, default=6, help="Rows and columns of the matrix")
+    parser.add_argument("--calls", type=int, default=2000, help="Jacobian evaluations per strategy")
+    args = parser.parse_args()
+
+    text = generate_program(args.size)
+    points = [(1.1 + i % 7 * 0.1, 1.3 + i % 5 * 0.1, 0.7 + i % 3 * 0.1) for i in range(args.calls)]
+    for strategy in DERIVATIVE_STRATEGIES:
+        interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(text))), derivative_strategy=strategy)
+        interpreter.interpret()
+        # The first call builds and compiles whatever the strategy caches
+        start = time.perf_counter()
+        interpreter.evaluate_derivative('m', list(points[0]))
+        setup = time.perf_counter() - start
+        start = time.perf_counter()
+        for point in points:
+            interpreter.evaluate_derivative('m', list(point))
+        elapsed = time.perf_counter() - start
+        print(f"{strategy:9} first call {setup * 1e3:8.2f} ms  {elapsed / args.calls * 1e6:9.1f} us/Jacobian")
+
+
+if __name__ == '__main__':
+    main()
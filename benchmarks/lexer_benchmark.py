@@ -0,0 +1,137 @@
+"""Throughput benchmark of the regex Lexer against the previous character scanner.
+
+Run from the repository root with ``python -m benchmarks.lexer_benchmark``.
+"""
+import argparse
+import random
+import time
+
+from mrog.lexer import Lexer
+from mrog.symbols import TRIG_FUNCTIONS, MATH_FUNCTIONS, BUILTIN_FUNCTIONS, SYMBOLS
+from mrog.token import Token, TokenType
+from mrog.exceptions import UnknownSymbolError
+
+
+class CharLexer:
+    """The character-at-a-time Lexer that the regex scanner replaced."""
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.current_char = self.text[self.pos] if self.text else None
+
+    def error(self):
+        raise UnknownSymbolError(self.current_char)
+
+    def advance(self):
+        self.pos += 1
+        if self.pos < len(self.text):
+            self.current_char = self.text[self.pos]
+        else:
+            self.current_char = None
+
+    def skip_whitespace(self):
+        while self.current_char is not None and self.current_char.isspace():
+            self.advance()
+
+    def number(self):
+        result = ''
+        while self.current_char is not None and self.current_char.isdigit():
+            result += self.current_char
+            self.advance()
+        if self.current_char == '.':
+            result += self.current_char
+            self.advance()
+            while self.current_char is not None and self.current_char.isdigit():
+                result += self.current_char
+                self.advance()
+        return Token(TokenType.NUMBER, float(result))
+
+    def symbol(self):
+        token_type = SYMBOLS[self.current_char]
+        char = self.current_char
+        self.advance()
+        return Token(token_type, char)
+
+    def alpha(self):
+        result = ''
+        while self.current_char is not None and self.current_char.isalpha():
+            result += self.current_char
+            self.advance()
+        if result in TRIG_FUNCTIONS:
+            return Token(TokenType.TRIG_FUNCTION, result)
+        elif result in MATH_FUNCTIONS:
+            return Token(TokenType.MATH_FUNCTION, result)
+        elif result in BUILTIN_FUNCTIONS:
+            return Token(BUILTIN_FUNCTIONS[result], result)
+        else:
+            return Token(TokenType.IDENTIFIER, result)
+
+    def get_next_token(self):
+        while self.current_char is not None:
+            if self.current_char.isspace():
+                self.skip_whitespace()
+                continue
+            if self.current_char.isdigit():
+                return self.number()
+            if self.current_char.isalpha():
+                return self.alpha()
+            if self.current_char in SYMBOLS:
+                return self.symbol()
+            if self.current_char == '#':
+                self.advance()
+                while self.current_char is not None and self.current_char != '\n':
+                    self.advance()
+                continue
+            self.error()
+        return Token(TokenType.EOF, None)
+
+
+def generate_program(lines, seed=0):
+    """Generate a program of function definitions, comments and prints."""
+    rng = random.Random(seed)
+    functions = sorted(TRIG_FUNCTIONS) + ['exp', 'sqrt', 'ln', 'abs']
+    program = []
+    for i in range(lines):
+        terms = [f"{rng.choice(functions)}({rng.randint(1, 999)}.{rng.randint(0, 99)}*x^2)"
+                 for _ in range(rng.randint(2, 6))]
+        program.append(f"f{'abcdefghij'[i % 10]}(x, y) = " + ' + '.join(terms)
+                       + f" - log(2, y) * matrix([[x, 1], [y, 2]])  # line {i}")
+        program.append(f"print(fa'({rng.randint(1, 9)}, 2)!)")
+    return '\n'.join(program)
+
+
+def drain(lexer):
+    tokens = []
+    token = lexer.get_next_token()
+    while token.type != TokenType.EOF:
+        tokens.append((token.type, token.value))
+        token = lexer.get_next_token()
+    return tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Lexer throughput with the character scanner.")
+    parser.add_argument("--lines", type=int, default=20000, help="Number of generated statements")
+    parser.add_argument("--repeat", type=int, default=3, help="Best-of repetitions")
+    args = parser.parse_args()
+
+    text = generate_program(args.lines)
+    if drain(CharLexer(text)) != drain(Lexer(text)):
+        raise SystemExit("Token streams differ")
+
+    megabytes = len(text) / 1e6
+    for name, lexer_class in (('char scanner', CharLexer), ('regex scanner', Lexer)):
+        best = min(_timed(lambda: drain(lexer_class(text))) for _ in range(args.repeat))
+        print(f"{name:14} {best:8.3f} s  {megabytes / best:8.2f} MB/s")
+    best = min(_timed(lambda: list(Lexer(text).tokenize())) for _ in range(args.repeat))
+    print(f"{'tokenize()':14} {best:8.3f} s  {megabytes / best:8.2f} MB/s")
+
+
+def _timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    main()
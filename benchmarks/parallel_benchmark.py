@@ -0,0 +1,63 @@
+"""Scaling benchmark of print statements and point sweeps across worker processes.
+
+Run from the repository root with ``python -m benchmarks.parallel_benchmark``.
+"""
+import argparse
+import io
+import os
+import time
+from contextlib import redirect_stdout
+
+from benchmarks.derivative_benchmark import generate_program
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter
+from mrog.parallel import ParallelExecutor
+
+
+def interpreter_for(text):
+    # Finite differences of a matrix function make each print statement expensive
+    return Interpreter(SemanticAnalyzer(Parser(Lexer(text))), derivative_strategy='finite')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure scaling of parallel evaluation with the number of workers.")
+    parser.add_argument("--prints", type=int, default=2000, help="Number of print statements")
+    parser.add_argument("--points", type=int, default=20000, help="Number of points in the sweep")
+    parser.add_argument("--workers", type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}), help="Worker counts to measure")
+    args = parser.parse_args()
+
+    text = generate_program(4)
+    text += ''.join(f"print(m'({1 + i % 7 * 0.1}, {1.3 + i % 5 * 0.1}, {0.7 + i % 3 * 0.1}))\n"
+                    for i in range(args.prints))
+    points = [(1 + i % 7 * 0.1, 1.3 + i % 5 * 0.1, 0.7 + i % 3 * 0.1) for i in range(args.points)]
+    print(f"{os.cpu_count()} cores, {args.prints} print statements, {args.points} points")
+
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        interpreter_for(text).interpret()
+    serial = time.perf_counter() - start
+    sweep_interpreter = interpreter_for(generate_program(4))
+    sweep_interpreter.interpret()
+    start = time.perf_counter()
+    [sweep_interpreter.call_function('m', list(p)) for p in points]
+    serial_sweep = time.perf_counter() - start
+    print(f"serial       prints {serial:7.3f} s   sweep {serial_sweep:7.3f} s")
+
+    for workers in args.workers:
+        with ParallelExecutor(interpreter_for(text), workers) as executor:
+            start = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                executor.interpret()
+            elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            executor.map_points('m', points)
+            sweep = time.perf_counter() - start
+        print(f"{workers:2d} workers   prints {elapsed:7.3f} s ({serial / elapsed:4.2f}x)"
+              f"   sweep {sweep:7.3f} s ({serial_sweep / sweep:4.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
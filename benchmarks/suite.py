@@ -0,0 +1,211 @@
+"""Benchmark suite timing every pipeline stage on the generated workloads.
+
+Run from the repository root with ``python -m benchmarks.suite``. Results can
+be saved with ``--save`` and compared with a stored baseline with
+``--baseline benchmarks/baseline.json``; the exit status is 1 when a stage
+is slower than the baseline by more than ``--threshold``.
+
+Each stage is timed on its own input, so a slower stage does not hide in the
+time of the others: the parser reads tokens replayed from a list, the
+analyzer checks an already parsed program and the interpreter runs already
+analyzed statements. Stages shorter than MIN_MEASURED_SECONDS are run
+several times per measurement, so sub-millisecond stages are not timed
+within the noise of the timer and of the machine.
+"""
+import argparse
+import gc
+import io
+import json
+import math
+import platform
+import sys
+import time
+from contextlib import redirect_stdout
+
+from mrog import __version__
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter
+from mrog.programcache import CachedProgram
+from mrog.token import TokenType
+from benchmarks.workloads import WORKLOADS
+
+STAGES = ('lexer', 'parser', 'analyzer', 'interpreter')
+
+DEFAULT_SCALE = 5
+DEFAULT_THRESHOLD = 0.25
+
+# Shortest measurement of a stage, which faster stages reach by being run several times
+MIN_MEASURED_SECONDS = 0.05
+
+
+class ReplayLexer:
+    """Lexer stand-in returning tokens that have already been scanned."""
+    def __init__(self, tokens):
+        self.tokens = iter(tokens)
+        self.eof = tokens[-1]
+
+    def get_next_token(self):
+        return next(self.tokens, self.eof)
+
+
+class ParsedProgram:
+    """Parser stand-in handing an already parsed program to the SemanticAnalyzer."""
+    def __init__(self, parser, ast):
+        self.ast = ast
+        self.used_variables = parser.used_variables
+        self.functions_called = parser.functions_called
+
+    def parse(self):
+        return self.ast
+
+
+def tokenize(text):
+    lexer = Lexer(text)
+    tokens = [lexer.get_next_token()]
+    while tokens[-1].type != TokenType.EOF:
+        tokens.append(lexer.get_next_token())
+    return tokens
+
+
+def best_time(function, repeat):
+    """Return the best wall time per call of several measurements, and the result of the last call.
+
+    The first call tells how many calls a measurement needs to last at least
+    MIN_MEASURED_SECONDS, and is the first measurement when it lasts as long.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    if elapsed >= MIN_MEASURED_SECONDS:
+        number, best, repeat = 1, elapsed, repeat - 1
+    else:
+        number, best = math.ceil(MIN_MEASURED_SECONDS / max(elapsed, 1e-9)), float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(number):
+            result = function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best, result
+
+
+def calibrate(repeat=3):
+    """Time a fixed pure Python loop, as a measure of the speed of the machine during a run."""
+    def loop():
+        total = 0.0
+        for i in range(300000):
+            total += (i % 7) * 0.5
+        return total
+    return best_time(loop, repeat)[0]
+
+
+def run_workload(text, repeat=3):
+    """Time each stage of the pipeline on a program and return the measurements."""
+    times = {}
+    times['lexer'], tokens = best_time(lambda: tokenize(text), repeat)
+
+    def parse():
+        parser = Parser(ReplayLexer(tokens))
+        return parser, parser.parse_program()
+    times['parser'], (parser, ast) = best_time(parse, repeat)
+
+    times['analyzer'], statements = best_time(lambda: SemanticAnalyzer(ParsedProgram(parser, ast)).analyze(),
+                                              repeat)
+
+    def interpret():
+        with redirect_stdout(io.StringIO()):
+            Interpreter(CachedProgram(statements)).interpret()
+    times['interpreter'], _ = best_time(interpret, repeat)
+
+    return {'statements': len(statements), 'tokens': len(tokens), 'seconds': times,
+            'calibration': calibrate(repeat)}
+
+
+def run_suite(workloads=None, scale=DEFAULT_SCALE, repeat=3):
+    """Run the named workloads, or every workload, and return the results as a dict."""
+    results = {}
+    for name in workloads or WORKLOADS:
+        results[name] = run_workload(WORKLOADS[name](scale), repeat)
+    return {
+        'mrog': __version__,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'scale': scale,
+        'results': results,
+    }
+
+
+def compare(results, baseline):
+    """Return (workload, stage, baseline seconds, seconds, ratio) for every stage in both runs.
+
+    The ratio is relative to the calibration loop timed along with each
+    workload, when both runs have one, so a machine that is slower or busier
+    overall is not reported as a slower stage.
+    """
+    rows = []
+    for name, result in results['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        speed = 1.0
+        if result.get('calibration') and base.get('calibration'):
+            speed = result['calibration'] / base['calibration']
+        for stage in STAGES:
+            before, after = base['seconds'].get(stage), result['seconds'].get(stage)
+            if before and after is not None:
+                rows.append((name, stage, before, after, after / before / speed))
+    return rows
+
+
+def regressions(rows, threshold=DEFAULT_THRESHOLD):
+    return [row for row in rows if row[4] > 1 + threshold]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the lexer, parser, analyzer and interpreter "
+                                                 "on generated workloads.")
+    parser.add_argument("workloads", nargs='*', metavar="WORKLOAD",
+                        help=f"Workloads to run (default: all of {', '.join(WORKLOADS)})")
+    parser.add_argument("--scale", type=int, default=DEFAULT_SCALE,
+                        help=f"Size factor of the generated programs (default: {DEFAULT_SCALE})")
+    parser.add_argument("--repeat", type=int, default=3, help="Best-of repetitions of every stage")
+    parser.add_argument("--save", metavar="FILE", help="Write the results to FILE as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare the results with a saved run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Relative slowdown reported as a regression (default: {DEFAULT_THRESHOLD})")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.workloads if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workload {', '.join(unknown)}")
+
+    results = run_suite(args.workloads, args.scale, args.repeat)
+    print(f"{'workload':<14}{'statements':>12}{'tokens':>10}" + ''.join(f"{s:>14}" for s in STAGES))
+    for name, result in results['results'].items():
+        print(f"{name:<14}{result['statements']:>12}{result['tokens']:>10}"
+              + ''.join(f"{result['seconds'][s]:>14.4f}" for s in STAGES))
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+            file.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get('scale') != results['scale']:
+            print(f"Warning: the baseline was run at scale {baseline.get('scale')}", file=sys.stderr)
+        rows = compare(results, baseline)
+        print(f"\n{'workload':<14}{'stage':<14}{'baseline':>12}{'now':>12}{'ratio':>8}")
+        for name, stage, before, after, ratio in rows:
+            flag = '  slower' if ratio > 1 + args.threshold else ''
+            print(f"{name:<14}{stage:<14}{before:>12.4f}{after:>12.4f}{ratio:>8.2f}{flag}")
+        if regressions(rows, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
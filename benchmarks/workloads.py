@@ -0,0 +1,110 @@
+"""Generators of large .mg programs stressing different parts of the pipeline.
+
+Every workload takes a scale factor and returns the text of a program that
+runs without errors, so it can be timed from the lexer to the interpreter.
+"""
+import random
+
+from benchmarks.ast_benchmark import function_name
+
+
+def safe_expression(rng, depth, variables=('x', 'y', 'z')):
+    """Generate a random expression that evaluates without errors for any finite arguments."""
+    if depth == 0:
+        return rng.choice(list(variables) + [str(rng.randint(1, 9)), f"{rng.random():.3f}"])
+    kind = rng.random()
+    if kind < 0.6:
+        operator = rng.choice(['+', '-', '*'])
+        return f"({safe_expression(rng, depth - 1, variables)} {operator} {safe_expression(rng, depth - 1, variables)})"
+    if kind < 0.9:
+        function = rng.choice(['sin', 'cos', 'tanh', 'atan'])
+        return f"{function}({safe_expression(rng, depth - 1, variables)})"
+    return f"sin({safe_expression(rng, depth - 1, variables)})^2"
+
+
+def nested(rng, depth):
+    """Generate a chain of nested functions and parentheses `depth` levels deep."""
+    expression = 'x'
+    for _ in range(depth):
+        expression = rng.choice([f"sin({expression})", f"(1 + {expression}) * 0.5", f"atan({expression} - y)"])
+    return expression
+
+
+def deep(scale, seed=0, nesting=100):
+    """Few functions with large expression trees up to depth 10, plus a chain nested `nesting` deep."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(20 * scale):
+        lines.append(f"{function_name(i)}(x, y, z) = {safe_expression(rng, 10)} + {nested(rng, nesting)}")
+        lines.append(f"print({function_name(i)}(1, 2, 3))")
+    return '\n'.join(lines) + '\n'
+
+
+def wide(scale, seed=0):
+    """Many small function definitions, some calling earlier ones, with a print every ten lines."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(2000 * scale):
+        if i and i % 10 == 0:
+            lines.append(f"print({function_name(i - 1)}(1, 2))")
+        expression = safe_expression(rng, 2, ('x', 'y'))
+        if i and rng.random() < 0.3:
+            expression += f" + {function_name(rng.randrange(i))}(y, x)"
+        lines.append(f"{function_name(i)}(x, y) = {expression}")
+    return '\n'.join(lines) + '\n'
+
+
+def calls(scale, depth=200):
+    """Chains of functions each calling the previous one, evaluated from the end of the chain."""
+    lines = ["fa(x) = x + 1"]
+    for i in range(1, depth):
+        lines.append(f"{function_name(i)}(x) = {function_name(i - 1)}(x) * 0.5 + 1")
+    for i in range(100 * scale):
+        lines.append(f"print({function_name(depth - 1)}({i % 7 + 1}))")
+    return '\n'.join(lines) + '\n'
+
+
+def matrix(scale, seed=0):
+    """Functions building 3x3 matrices and multiplying them, some through other matrix functions."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(50 * scale):
+        rows = [[safe_expression(rng, 1, ('x', 'y')) for _ in range(3)] for _ in range(3)]
+        literal = 'matrix([' + ', '.join('[' + ', '.join(row) + ']' for row in rows) + '])'
+        if i:
+            expression = f"{literal} * {function_name(rng.randrange(i))}(y, x) + 1"
+        else:
+            expression = f"{literal} * {literal}"
+        lines.append(f"{function_name(i)}(x, y) = {expression}")
+        lines.append(f"print({function_name(i)}({rng.randint(1, 5)}, {rng.randint(1, 5)}))")
+    return '\n'.join(lines) + '\n'
+
+
+def derivatives(scale, seed=0):
+    """Gradients of multi-variable functions, including derivatives used inside other functions."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(100 * scale):
+        name = function_name(i)
+        if i % 4 == 2:
+            lines.append(f"{name}(x) = {safe_expression(rng, 5, ('x',))}")
+            lines.append(f"print({name}'({rng.randint(1, 5)}))")
+            continue
+        if i % 4 == 3:
+            # Gradients of one variable are numbers, so they can be used in expressions
+            previous = function_name(i - 1)
+            lines.append(f"{name}(x, y) = {previous}'(x) * y + {previous}'(y) * {safe_expression(rng, 3, ('x', 'y'))}")
+        else:
+            lines.append(f"{name}(x, y) = {safe_expression(rng, 5, ('x', 'y'))}")
+        for _ in range(3):
+            lines.append(f"print({name}'({rng.randint(1, 5)}, {rng.randint(1, 5)}))")
+    return '\n'.join(lines) + '\n'
+
+
+WORKLOADS = {
+    'deep': deep,
+    'wide': wide,
+    'calls': calls,
+    'matrix': matrix,
+    'derivatives': derivatives,
+}
@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+
+from .exceptions import AnalysisError
+
+# Absolute error of integrals, or relative error when they exceed 1, and step size at a root
+DEFAULT_TOLERANCE = 1e-10
+
+# Most points an integrand is evaluated at, and most Newton iterations
+MAX_EVALUATIONS = 200000
+MAX_ITERATIONS = 100
+
+# Times a Newton step is halved when it does not bring the function closer to zero
+MAX_HALVINGS = 30
+
+# 15-point Kronrod rule on [-1, 1], whose points of odd index form the 7-point Gauss rule
+_KRONROD_HALF = [
+    (0.991455371120812639206854697526329, 0.022935322010529224963732008058970),
+    (0.949107912342758524526189684047851, 0.063092092629978553290700663189204),
+    (0.864864423359769072789712788640926, 0.104790010322250183839876322541518),
+    (0.741531185599394439863864773280788, 0.140653259715525918745189590510238),
+    (0.586087235467691130294144845693013, 0.169004726639267902826583426598550),
+    (0.405845151377397166906606412076961, 0.190350578064785409913256402421014),
+    (0.207784955007898467600689403773245, 0.204432940075298892414161999234649),
+]
+_GAUSS_HALF = [0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+               0.381830050505118944950369775488975]
+KRONROD_NODES = np.array([-x for x, _ in _KRONROD_HALF] + [0.0] + [x for x, _ in reversed(_KRONROD_HALF)])
+KRONROD_WEIGHTS = np.array([w for _, w in _KRONROD_HALF] + [0.209482141084727828012999174891714]
+                           + [w for _, w in reversed(_KRONROD_HALF)])
+GAUSS_INDICES = np.arange(1, 15, 2)
+GAUSS_WEIGHTS = np.array(_GAUSS_HALF + [0.417959183673469387755102040816327] + list(reversed(_GAUSS_HALF)))
+
+
+def integrate(interpreter, function_name, lower, upper, tolerance=DEFAULT_TOLERANCE,
+              max_evaluations=MAX_EVALUATIONS):
+    """Integrate a function of one variable with adaptive Gauss-Kronrod quadrature.
+
+    Every step evaluates the 15 points of all the intervals not yet accurate
+    enough in one call of the vectorized function, then bisects those whose
+    error estimate exceeds their share of the tolerance, proportional to
+    their width. Returns the integral and statistics about the evaluations.
+    """
+    evaluator = interpreter.vectorized_evaluator()
+    lower, upper = float(lower), float(upper)
+    stats = {'evaluations': 0, 'batches': 0, 'intervals': 0, 'error': 0.0}
+    width = abs(upper - lower)
+    if width == 0:
+        return 0.0, stats
+    left, right = np.array([lower]), np.array([upper])
+    value = 0.0
+    scale = None
+    while len(left):
+        if stats['evaluations'] + KRONROD_NODES.size * len(left) > max_evaluations:
+            raise AnalysisError(f"integral of {function_name} over [{lower}, {upper}] did not reach tolerance "
+                                f"{tolerance} in {max_evaluations} evaluations")
+        center, half = (left + right) / 2, (right - left) / 2
+        points = center[:, None] + half[:, None] * KRONROD_NODES
+        values = evaluator.evaluate(function_name, points)
+        if values.shape != points.shape:
+            raise AnalysisError(f"{function_name} does not return a number")
+        stats['evaluations'] += points.size
+        stats['batches'] += 1
+        # Near a singularity the estimates are infinite or NaN, and the interval is bisected
+        with np.errstate(all='ignore'):
+            kronrod = half * (values @ KRONROD_WEIGHTS)
+            errors = np.abs(kronrod - half * (values[:, GAUSS_INDICES] @ GAUSS_WEIGHTS))
+        if scale is None:
+            # Tolerance relative to the first estimate of large integrals
+            scale = max(1.0, abs(kronrod[0])) if math.isfinite(kronrod[0]) else 1.0
+        accepted = errors <= tolerance * scale * np.abs(2 * half) / width
+        value += kronrod[accepted].sum()
+        stats['error'] += float(errors[accepted].sum())
+        stats['intervals'] += int(accepted.sum())
+        rejected = ~accepted
+        left = np.concatenate([left[rejected], center[rejected]])
+        right = np.concatenate([center[rejected], right[rejected]])
+    return float(value), stats
+
+
+def solve(interpreter, function_name, start, tolerance=DEFAULT_TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """Find a zero of a function of one variable with Newton's method from a starting point.
+
+    The derivative comes from the interpreter, with the strategy of the run.
+    A step that does not bring the function closer to zero is halved, so
+    starting far from the root does not diverge. The iteration stops once a
+    step is below the tolerance, relative to the root when it exceeds 1, and
+    fails when no step brings the function closer to zero.
+    Returns the root and statistics about the evaluations.
+    """
+    function = interpreter.compiled_functions[function_name]
+    # The function is evaluated in the numbers of the run, the iteration in floats
+    convert = interpreter.numeric.convert
+    stats = {'evaluations': 1, 'derivative_evaluations': 0, 'iterations': 0, 'residual': 0.0}
+    x = float(start)
+    fx = float(function(convert(x)))
+    for _ in range(max_iterations):
+        if fx == 0:
+            break
+        stats['iterations'] += 1
+        slope = float(interpreter.evaluate_derivative(function_name, [convert(x)]))
+        stats['derivative_evaluations'] += 1
+        if slope == 0 or not math.isfinite(slope):
+            raise AnalysisError(f"derivative of {function_name} is {slope} at {x}, starting from {start}")
+        step = fx / slope
+        converged = abs(step) <= tolerance * max(1.0, abs(x))
+        for _ in range(MAX_HALVINGS):
+            candidate = x - step
+            f_candidate = float(function(convert(candidate)))
+            stats['evaluations'] += 1
+            if converged or abs(f_candidate) < abs(fx):
+                break
+            step /= 2
+        else:
+            raise AnalysisError(f"Newton's method stalled at {x}, where {function_name} is {fx}, "
+                                f"starting from {start}")
+        x, fx = candidate, f_candidate
+        if converged:
+            break
+    else:
+        raise AnalysisError(f"no zero of {function_name} found from {start} in {max_iterations} iterations")
+    if not math.isfinite(fx):
+        raise AnalysisError(f"{function_name} is {fx} at {x}, starting from {start}")
+    stats['residual'] = abs(fx)
+    return x, stats
@@ -0,0 +1,226 @@
+import time
+
+import numpy as np
+
+from .exceptions import AnalysisError, InvalidGridError
+
+# Largest absolute error of an approximation unless given
+DEFAULT_TOLERANCE = 1e-9
+
+# Degree of the polynomial on every piece, cubic being the fastest to evaluate, and most pieces
+DEFAULT_DEGREE = 3
+MAX_PIECES = 2 ** 16
+
+# Highest degree, above which power coefficients lose too much to rounding
+MAX_DEGREE = 12
+
+# Doublings of the pieces that may leave the error above half its lowest value before giving up
+MAX_STALLED = 3
+
+# Points per coefficient at which the error of every piece is measured
+TEST_POINTS = 4
+
+# Points evaluated at a time by the NumPy evaluator, small enough to stay in cache
+CHUNK_SIZE = 8192
+
+
+def exact_values(function, x):
+    """Values of a vectorized function at an array of arguments, one per argument even if it is constant."""
+    with np.errstate(all='ignore'):
+        values = np.asarray(function(x), dtype=float)
+    if values.shape != x.shape:
+        values = np.broadcast_to(values, x.shape)
+    return values
+
+
+def chebyshev_matrix(degree):
+    """Return the Chebyshev points of a degree on [-1, 1] and the matrix taking values there to power coefficients.
+
+    Values at the points times the matrix give the coefficients, lowest first,
+    of the interpolating polynomial, which is the Chebyshev interpolant
+    computed through the well-conditioned Chebyshev basis.
+    """
+    count = degree + 1
+    nodes = np.cos(np.pi * (np.arange(count) + 0.5) / count)
+    to_chebyshev = np.linalg.inv(np.polynomial.chebyshev.chebvander(nodes, degree))
+    to_power = np.zeros((count, count))
+    for k in range(count):
+        power = np.polynomial.chebyshev.cheb2poly(np.eye(count)[k])
+        to_power[k, :len(power)] = power
+    return nodes, to_chebyshev.T @ to_power
+
+
+class Approximation:
+    """Piecewise polynomial approximation of a function of one variable on an interval.
+
+    The interval is split into pieces of equal width, so the piece of an
+    argument is found by one multiplication, and each piece holds the
+    Chebyshev interpolant of the function, as power coefficients in t on
+    [-1, 1] for Horner's rule. With a single piece this is a Chebyshev
+    approximation. The approximation is called with a number, through Python
+    source generated with the coefficients of a single piece as constants,
+    or evaluated over a NumPy array by `evaluate`. Arguments outside the
+    interval are given to the exact function.
+    """
+    def __init__(self, function_name, lower, upper, coefficients, exact, exact_vectorized, max_error):
+        self.function_name = function_name
+        self.lower = lower
+        self.upper = upper
+        # Coefficients of shape (pieces, degree + 1), lowest first
+        self.coefficients = coefficients
+        self.pieces, self.degree = coefficients.shape[0], coefficients.shape[1] - 1
+        self.exact = exact
+        self.exact_vectorized = exact_vectorized
+        # Largest error measured at the test points
+        self.max_error = max_error
+        self.scale = self.pieces / (upper - lower)
+        self.source, self.scalar = self.compile_scalar()
+        self.__name__ = function_name
+
+    def __call__(self, x, *_):
+        return self.scalar(x)
+
+    def compile_scalar(self):
+        """Return the source of the evaluator of one argument, and the evaluator."""
+        # Coefficients of a single piece are constants of the source, those of pieces come from a table
+        if self.pieces == 1:
+            constants = [repr(float(c)) for c in self.coefficients[0]]
+        else:
+            constants = [f"c{k}" for k in range(self.degree + 1)]
+        horner = constants[-1]
+        for constant in reversed(constants[:-1]):
+            horner = f"({horner} * t + {constant})"
+        lines = ["def _approximation(x, *_):", f"    if {self.lower!r} <= x < {self.upper!r}:"]
+        if self.pieces == 1:
+            lines.append(f"        t = (x - {self.lower!r}) * {2 * self.scale!r} - 1.0")
+        else:
+            lines += [f"        u = (x - {self.lower!r}) * {self.scale!r}",
+                      "        i = int(u)",
+                      f"        {', '.join(constants)} = _table[i]",
+                      "        t = (u - i) * 2.0 - 1.0"]
+        lines += [f"        return {horner}", "    return _exact(x)"]
+        source = '\n'.join(lines) + '\n'
+        # Rounding may put an argument just below the upper end on the piece after the last, which
+        # holds the value at the upper end
+        last = np.polynomial.polynomial.polyval(1.0, self.coefficients[-1])
+        table = [tuple(float(c) for c in row) for row in self.coefficients]
+        table.append((float(last),) + (0.0,) * self.degree)
+        namespace = {'_table': table, '_exact': self.exact}
+        exec(compile(source, f"<mrog approximation of {self.function_name}>", 'exec'), namespace)
+        return source, namespace['_approximation']
+
+    def evaluate(self, x, *_):
+        """Evaluate the approximation over an array of arguments."""
+        x = np.asarray(x, dtype=float)
+        inside = (x >= self.lower) & (x < self.upper)
+        if inside.all():
+            return self.evaluate_inside(x.ravel()).reshape(x.shape)
+        result = exact_values(self.exact_vectorized, x).copy()
+        result[inside] = self.evaluate_inside(x[inside])
+        return result
+
+    def evaluate_inside(self, x):
+        """Evaluate a flat array of arguments within the interval, a chunk at a time with Horner's rule."""
+        result = np.empty(len(x))
+        columns = np.ascontiguousarray(self.coefficients.T)
+        for start in range(0, len(x), CHUNK_SIZE):
+            u = (x[start:start + CHUNK_SIZE] - self.lower) * self.scale
+            value = result[start:start + CHUNK_SIZE]
+            if self.pieces == 1:
+                t = u * 2.0 - 1.0
+                value.fill(columns[-1, 0])
+                for k in range(self.degree - 1, -1, -1):
+                    value *= t
+                    value += columns[k, 0]
+            else:
+                piece = u.astype(np.intp)
+                np.minimum(piece, self.pieces - 1, out=piece)
+                t = (u - piece) * 2.0 - 1.0
+                np.take(columns[-1], piece, out=value)
+                for k in range(self.degree - 1, -1, -1):
+                    value *= t
+                    value += columns[k].take(piece)
+        return result
+
+    def benchmark(self, points=100000, repeat=3):
+        """Time the approximation against the exact function on points of the interval.
+
+        Returns the nanoseconds per point of each, called with one number at a
+        time and over an array, and the speedups.
+        """
+        x = np.linspace(self.lower, self.upper, points, endpoint=False)
+        numbers = x[:min(points, 20000)].tolist()
+        def per_point(evaluate, count):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                evaluate()
+                best = min(best, time.perf_counter() - start)
+            return best / count * 1e9
+        def calls(function):
+            return lambda: [function(number) for number in numbers]
+        with np.errstate(all='ignore'):
+            timings = {
+                'exact_scalar_ns': per_point(calls(self.exact), len(numbers)),
+                'scalar_ns': per_point(calls(self.scalar), len(numbers)),
+                'exact_vectorized_ns': per_point(lambda: self.exact_vectorized(x), points),
+                'vectorized_ns': per_point(lambda: self.evaluate(x), points),
+            }
+        timings['scalar_speedup'] = timings['exact_scalar_ns'] / timings['scalar_ns']
+        timings['vectorized_speedup'] = timings['exact_vectorized_ns'] / timings['vectorized_ns']
+        return timings
+
+
+def parse_interval(specification):
+    """Parse a specification such as ``f=0:1`` into a function name and the ends of an interval."""
+    function_name, _, bounds = specification.partition('=')
+    parts = bounds.split(':')
+    if not function_name or len(parts) != 2:
+        raise InvalidGridError(f"expected FUNCTION=START:STOP but got {specification}")
+    try:
+        return function_name.strip(), float(parts[0]), float(parts[1])
+    except ValueError:
+        raise InvalidGridError(f"expected FUNCTION=START:STOP but got {specification}")
+
+
+def approximate(function_name, exact, exact_vectorized, lower, upper, tolerance=DEFAULT_TOLERANCE,
+                degree=DEFAULT_DEGREE, max_pieces=MAX_PIECES):
+    """Approximate a function on an interval within an absolute error, given its scalar and NumPy evaluators.
+
+    The interval is split into 1, 2, 4, ... pieces until the interpolants of
+    the given degree are within the tolerance at test points between the
+    interpolation points of every piece. Splitting stops with an error once
+    it no longer reduces the error, which rounding bounds below.
+    """
+    lower, upper = float(lower), float(upper)
+    if not lower < upper:
+        raise AnalysisError(f"cannot approximate {function_name} on [{lower}, {upper}], which is empty")
+    if not 0 <= degree <= MAX_DEGREE:
+        raise AnalysisError(f"cannot approximate {function_name} with polynomials of degree {degree}, "
+                            f"which must be between 0 and {MAX_DEGREE}")
+    nodes, to_power = chebyshev_matrix(degree)
+    tests = np.linspace(-1, 1, TEST_POINTS * (degree + 1) + 1)
+    pieces = 1
+    lowest, stalled = float('inf'), 0
+    while True:
+        width = (upper - lower) / pieces
+        centers = lower + width * (np.arange(pieces) + 0.5)
+        try:
+            with np.errstate(all='ignore'):
+                values = exact_values(exact_vectorized, centers[:, None] + width / 2 * nodes)
+                expected = exact_values(exact_vectorized, centers[:, None] + width / 2 * tests)
+        except (TypeError, ValueError):
+            raise AnalysisError(f"{function_name} does not return a number and cannot be approximated")
+        if not (np.isfinite(values).all() and np.isfinite(expected).all()):
+            raise AnalysisError(f"{function_name} is not a finite number everywhere on [{lower}, {upper}]")
+        coefficients = values @ to_power
+        approximated = np.polynomial.polynomial.polyval(tests, coefficients.T)
+        error = float(np.abs(approximated - expected).max())
+        if error <= tolerance:
+            return Approximation(function_name, lower, upper, coefficients, exact, exact_vectorized, error)
+        stalled = stalled + 1 if error > lowest / 2 else 0
+        lowest = min(lowest, error)
+        if pieces * 2 > max_pieces or stalled > MAX_STALLED:
+            raise AnalysisError(f"approximation of {function_name} on [{lower}, {upper}] has error {error:.3g} "
+                                f"with {pieces} pieces of degree {degree}, above {tolerance}")
+        pieces *= 2
@@ -0,0 +1,230 @@
+import math
+from itertools import repeat
+from operator import add, sub, mul
+
+import numpy as np
+
+from .compiler import Compiler
+from .matrix import MatrixValue, elementwise
+from .exceptions import NotDifferentiableError
+
+
+class Dual:
+    """A value together with its gradient with respect to every function variable."""
+    __slots__ = ('value', 'gradient')
+
+    def __init__(self, value, gradient):
+        self.value = value
+        self.gradient = gradient
+
+    def __repr__(self):
+        return f"Dual({self.value!r}, {self.gradient!r})"
+
+    def __add__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value + other.value, tuple(map(add, self.gradient, other.gradient)))
+        if isinstance(other, MatrixValue):
+            return NotImplemented
+        return Dual(self.value + other, self.gradient)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value - other.value, tuple(map(sub, self.gradient, other.gradient)))
+        if isinstance(other, MatrixValue):
+            return NotImplemented
+        return Dual(self.value - other, self.gradient)
+
+    def __rsub__(self, other):
+        return Dual(other - self.value, tuple(map(mul, self.gradient, repeat(-1.0))))
+
+    def __mul__(self, other):
+        if isinstance(other, Dual):
+            u, v = self.value, other.value
+            return Dual(u * v, tuple(a * v + u * b for a, b in zip(self.gradient, other.gradient)))
+        if isinstance(other, MatrixValue):
+            return NotImplemented
+        return Dual(self.value * other, tuple(map(mul, self.gradient, repeat(other))))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, Dual):
+            u, v = self.value, other.value
+            return Dual(u / v, tuple((a * v - u * b) / (v * v) for a, b in zip(self.gradient, other.gradient)))
+        if isinstance(other, MatrixValue):
+            return NotImplemented
+        return Dual(self.value / other, tuple(map(mul, self.gradient, repeat(1 / other))))
+
+    def __rtruediv__(self, other):
+        v = self.value
+        scale = -other / (v * v)
+        return Dual(other / v, tuple(map(mul, self.gradient, repeat(scale))))
+
+    def __pow__(self, other):
+        u = self.value
+        if isinstance(other, MatrixValue):
+            return NotImplemented
+        if not isinstance(other, Dual):
+            scale = other * u ** (other - 1)
+            return Dual(u ** other, tuple(map(mul, self.gradient, repeat(scale))))
+        v = other.value
+        result = u ** v
+        # d(u^v) = v u^(v-1) du + u^v ln(u) dv, where ln(u) is only needed if v varies
+        scale = v * u ** (v - 1)
+        log_u = math.log(u) if any(other.gradient) else 0.0
+        return Dual(result, tuple(scale * a + result * log_u * b for a, b in zip(self.gradient, other.gradient)))
+
+    def __rpow__(self, other):
+        result = other ** self.value
+        scale = result * math.log(other) if any(self.gradient) else 0.0
+        return Dual(result, tuple(map(mul, self.gradient, repeat(scale))))
+
+
+def lift(function, derivative):
+    """Extend a scalar function to dual numbers with the chain rule."""
+    def dual_function(u):
+        if isinstance(u, Dual):
+            scale = derivative(u.value)
+            return Dual(function(u.value), tuple(map(mul, u.gradient, repeat(scale))))
+        return function(u)
+    return dual_function
+
+
+def sign(x):
+    return (x > 0) - (x < 0)
+
+
+# Mapping of function names to their dual-number extensions
+DUAL_FUNCTIONS_MAP = {
+    'exp': lift(math.exp, math.exp),
+    'sqrt': lift(math.sqrt, lambda x: 0.5 / math.sqrt(x)),
+    'ln': lift(math.log, lambda x: 1 / x),
+    'abs': lift(abs, sign),
+    'sin': lift(math.sin, math.cos),
+    'cos': lift(math.cos, lambda x: -math.sin(x)),
+    'tan': lift(math.tan, lambda x: 1 / math.cos(x) ** 2),
+    'csc': lift(lambda x: 1 / math.sin(x), lambda x: -math.cos(x) / math.sin(x) ** 2),
+    'sec': lift(lambda x: 1 / math.cos(x), lambda x: math.sin(x) / math.cos(x) ** 2),
+    'cot': lift(lambda x: 1 / math.tan(x), lambda x: -1 / math.sin(x) ** 2),
+    'sinh': lift(math.sinh, math.cosh),
+    'cosh': lift(math.cosh, math.sinh),
+    'tanh': lift(math.tanh, lambda x: 1 / math.cosh(x) ** 2),
+    'csch': lift(lambda x: 1 / math.sinh(x), lambda x: -math.cosh(x) / math.sinh(x) ** 2),
+    'sech': lift(lambda x: 1 / math.cosh(x), lambda x: -math.sinh(x) / math.cosh(x) ** 2),
+    'coth': lift(lambda x: 1 / math.tanh(x), lambda x: -1 / math.sinh(x) ** 2),
+    'asin': lift(math.asin, lambda x: 1 / math.sqrt(1 - x * x)),
+    'acos': lift(math.acos, lambda x: -1 / math.sqrt(1 - x * x)),
+    'atan': lift(math.atan, lambda x: 1 / (1 + x * x)),
+    'acsc': lift(lambda x: math.asin(1 / x), lambda x: -1 / (x * x * math.sqrt(1 - 1 / (x * x)))),
+    'asec': lift(lambda x: math.acos(1 / x), lambda x: 1 / (x * x * math.sqrt(1 - 1 / (x * x)))),
+    'acot': lift(lambda x: math.atan(1 / x), lambda x: -1 / (x * x + 1)),
+    'asinh': lift(math.asinh, lambda x: 1 / math.sqrt(x * x + 1)),
+    'acosh': lift(math.acosh, lambda x: 1 / math.sqrt(x * x - 1)),
+    'atanh': lift(math.atanh, lambda x: 1 / (1 - x * x)),
+    'acsch': lift(lambda x: math.asinh(1 / x), lambda x: -1 / (x * x * math.sqrt(1 + 1 / (x * x)))),
+    'asech': lift(lambda x: math.acosh(1 / x), lambda x: -1 / (x * x * math.sqrt(1 / (x * x) - 1))),
+    'acoth': lift(lambda x: math.atanh(1 / x), lambda x: 1 / (1 - x * x)),
+}
+
+# Dual numbers in a matrix are kept in an object array, so functions apply to them one by one
+for name, function in DUAL_FUNCTIONS_MAP.items():
+    DUAL_FUNCTIONS_MAP[name] = elementwise(function)
+
+_ln = DUAL_FUNCTIONS_MAP['ln']
+
+
+def log(argument, base):
+    """Logarithm of dual numbers, matching `math.log(argument, base)`."""
+    if isinstance(argument, (Dual, MatrixValue)) or isinstance(base, (Dual, MatrixValue)):
+        return _ln(argument) / _ln(base)
+    return math.log(argument, base)
+
+
+def factorial(operand):
+    """Factorial of a dual number that does not vary, truncated like the scalar interpreter."""
+    if isinstance(operand, Dual):
+        if any(operand.gradient):
+            raise NotDifferentiableError(f"{operand.value}!", "factorial has no derivative")
+        return Dual(math.factorial(int(operand.value)), operand.gradient)
+    return math.factorial(int(operand))
+
+
+def components(result, n):
+    """Split a value into its derivatives along each of n variables, keeping matrix structure."""
+    if isinstance(result, Dual):
+        return list(result.gradient)
+    if isinstance(result, MatrixValue):
+        gradients = np.frompyfunc(lambda e: e.gradient if isinstance(e, Dual) else (0.0,) * n, 1, 1)
+        entries = gradients(result.array)
+        return [MatrixValue(np.frompyfunc(lambda g: g[i], 1, 1)(entries).astype(float)) for i in range(n)]
+    return [0.0] * n
+
+
+class DualCompiler(Compiler):
+    """Compiler producing callables that take dual numbers for x, y and z."""
+    def __init__(self, differentiator):
+        super().__init__(differentiator.interpreter, DUAL_FUNCTIONS_MAP, log=log, factorial=factorial,
+                         derivative=differentiator.derivative, partial=differentiator.partial)
+
+    def fallback(self, function_name):
+        """Functions that cannot be compiled cannot carry dual numbers through them."""
+        def not_differentiable(*arguments):
+            raise NotDifferentiableError(function_name, "the function could not be compiled")
+        return not_differentiable
+
+
+class ForwardDifferentiator:
+    """Forward-mode automatic differentiation of user functions with dual numbers.
+
+    Function bodies are compiled with dual-number versions of the built-in
+    functions, so a single evaluation seeded with one unit gradient per
+    variable yields the whole gradient, or Jacobian for matrix-valued functions.
+    """
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.compiler = DualCompiler(self)
+        self.compiled_functions = self.compiler.registry
+        # Dual-number evaluators of higher-order partial derivative trees
+        self.derivative_functions = {}
+
+    def seed(self, arguments):
+        n = len(arguments)
+        return [Dual(a, tuple(1.0 if i == j else 0.0 for j in range(n))) for i, a in enumerate(arguments)]
+
+    def gradient(self, func_name, arguments):
+        """Evaluate the gradient, or Jacobian, of a function in one dual-number pass."""
+        vars_, _ = self.interpreter.functions[func_name]
+        result = self.compiled_functions[func_name](*self.seed(arguments[:len(vars_)]))
+        grads = components(result, len(vars_))
+        return grads[0] if len(grads) == 1 else grads
+
+    def evaluate_partial(self, func_name, variables, arguments):
+        """Evaluate a partial derivative by differentiating the next lower-order one."""
+        vars_, _ = self.interpreter.functions[func_name]
+        seeded = self.seed(arguments[:len(vars_)])
+        if len(variables) == 1:
+            result = self.compiled_functions[func_name](*seeded)
+        else:
+            result = self.derivative_function(func_name, variables[:-1])(*seeded)
+        return components(result, len(vars_))[vars_.index(variables[-1])]
+
+    def derivative_function(self, func_name, variables):
+        """Return a dual-number evaluator of a symbolic partial derivative tree."""
+        functions = self.derivative_functions.setdefault(func_name, {})
+        if variables not in functions:
+            vars_, _ = self.interpreter.functions[func_name]
+            tree = self.interpreter.differentiator.partial(func_name, variables)
+            functions[variables] = self.compiler.compile_definition(func_name, vars_, tree)
+        return functions[variables]
+
+    def derivative(self, func_name, arguments):
+        """Value of f'(...) inside a body, carrying dual arguments through it."""
+        vars_, _ = self.interpreter.functions[func_name]
+        if len(vars_) == 1:
+            return self.partial(func_name, tuple(vars_), arguments)
+        return [self.partial(func_name, (var,), arguments) for var in vars_]
+
+    def partial(self, func_name, variables, arguments):
+        return self.derivative_function(func_name, tuple(variables))(*arguments)
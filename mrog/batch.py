@@ -0,0 +1,172 @@
+import csv
+from itertools import chain, islice
+
+import numpy as np
+
+from .exceptions import InvalidInputError
+from .vectorize import VectorizedEvaluator
+
+# Number of points read, evaluated and written at a time
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def read_chunks(path, function_variables, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generate arrays of shape (points, variables) from a CSV or .npy file of points."""
+    if path.endswith('.npy'):
+        return read_npy_chunks(path, function_variables, chunk_size)
+    return read_csv_chunks(path, function_variables, chunk_size)
+
+
+def read_npy_chunks(path, function_variables, chunk_size):
+    """Generate chunks of a memory-mapped .npy file with one row per point."""
+    points = np.load(path, mmap_mode='r')
+    if points.ndim == 1:
+        points = points[:, None]
+    if points.ndim != 2 or points.shape[1] != len(function_variables):
+        raise InvalidInputError(f"expected {len(function_variables)} columns but {path} has shape {points.shape}")
+    for start in range(0, len(points), chunk_size):
+        yield np.asarray(points[start:start + chunk_size], dtype=float)
+
+
+def read_csv_chunks(path, function_variables, chunk_size):
+    """Generate chunks of a CSV file with one row per point.
+
+    If the first row is a header, the columns named after the function
+    variables are used, otherwise the columns are taken in variable order.
+    """
+    with open(path, newline='') as file:
+        lines = (line for line in file if line.strip())
+        first = next(lines, None)
+        if first is None:
+            return
+        columns = header_columns(next(csv.reader([first])), function_variables, path)
+        if columns is None:
+            lines = chain([first], lines)
+            columns = list(range(len(function_variables)))
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield csv_points(chunk, columns, path)
+
+
+def is_point(row):
+    """Check whether a CSV row holds numbers rather than column names."""
+    try:
+        [float(value) for value in row]
+        return True
+    except ValueError:
+        return False
+
+
+def header_columns(row, function_variables, path):
+    """Return the column of each variable if the row is a header, or None if it holds a point."""
+    if is_point(row):
+        return None
+    header = [value.strip() for value in row]
+    missing = [v for v in function_variables if v not in header]
+    if missing:
+        raise InvalidInputError(f"no column for variable {', '.join(missing)} in {path}")
+    return [header.index(v) for v in function_variables]
+
+
+def csv_points(lines, columns, path):
+    try:
+        return np.loadtxt(lines, delimiter=',', quotechar='"', usecols=columns, ndmin=2, dtype=float)
+    except ValueError:
+        raise InvalidInputError(f"expected {len(columns)} numeric columns in every row of {path}")
+
+
+def count_points(path):
+    """Count the points of an input file without loading them."""
+    if path.endswith('.npy'):
+        return len(np.load(path, mmap_mode='r'))
+    with open(path, newline='') as file:
+        lines = (line for line in file if line.strip())
+        first = next(lines, None)
+        if first is None:
+            return 0
+        return is_point(next(csv.reader([first]))) + sum(1 for _ in lines)
+
+
+class CSVWriter:
+    """Write chunks of points as CSV rows of the point followed by its value.
+
+    Matrix entries become extra columns, named like the columns of --grid output.
+    """
+    def __init__(self, file, function_name, function_variables):
+        self.file = file
+        self.function_name = function_name
+        self.function_variables = function_variables
+        self.written = 0
+
+    def write(self, points, values):
+        """Write a chunk of points and their values, with the points along the first axis."""
+        if self.written == 0:
+            header = list(self.function_variables)
+            for index in np.ndindex(*values.shape[1:]):
+                header.append(self.function_name + ''.join(f"[{i}]" for i in index))
+            print(','.join(header), file=self.file)
+        np.savetxt(self.file, np.column_stack([points, values.reshape(len(values), -1)]),
+                   fmt='%.17g', delimiter=',')
+        self.written += len(values)
+
+    def close(self):
+        pass
+
+
+class NpyWriter:
+    """Write chunks of values into a .npy file through a memory map.
+
+    The shape of the file is fixed by the number of points, which must be known
+    in advance, and the shape of the first value.
+    """
+    def __init__(self, path, points):
+        self.path = path
+        self.points = points
+        self.array = None
+        self.written = 0
+
+    def write(self, points, values):
+        if self.array is None:
+            self.array = np.lib.format.open_memmap(self.path, mode='w+', dtype=float,
+                                                   shape=(self.points,) + values.shape[1:])
+        self.array[self.written:self.written + len(values)] = values
+        self.array.flush()
+        self.written += len(values)
+
+    def close(self):
+        if self.array is None:
+            np.save(self.path, np.empty(0))
+        self.array = None
+
+
+def evaluate_file(interpreter, function_name, input_path, output, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Evaluate a function at every point of an input file, one chunk at a time.
+
+    The output is a file name ending in .npy, any other file name for CSV, or
+    an open text file for CSV. Returns the number of points evaluated.
+    """
+    if chunk_size < 1:
+        raise InvalidInputError(f"chunk size must be positive but got {chunk_size}")
+    function_variables, _ = interpreter.functions[function_name]
+    if not function_variables:
+        raise InvalidInputError(f"function {function_name} has no variables to read from {input_path}")
+
+    if not isinstance(output, str):
+        writer = CSVWriter(output, function_name, function_variables)
+    elif output.endswith('.npy'):
+        writer = NpyWriter(output, count_points(input_path))
+    else:
+        with open(output, 'w') as file:
+            return evaluate_file(interpreter, function_name, input_path, file, chunk_size)
+
+    evaluator = VectorizedEvaluator(interpreter)
+    try:
+        for points in read_chunks(input_path, function_variables, chunk_size):
+            values = evaluator.evaluate(function_name, *points.T)
+            # The vectorized layout puts the points last, behind any matrix entries
+            writer.write(points, np.moveaxis(values, -1, 0))
+    finally:
+        writer.close()
+    return writer.written
@@ -0,0 +1,376 @@
+from array import array
+
+import numpy as np
+
+from .compiler import Compiler, child_nodes, count_references, MATRIX_NODES
+from .exceptions import CompilationError
+from .matrix import multiply
+
+# Opcodes. Every instruction is two bytes, the opcode and its argument,
+# and arguments above 255 are spread over EXTENDED_ARG prefixes as in CPython.
+LOAD = 0                  # Push register `arg`, an argument or a temporary
+LOAD_CONST = 1            # Push float constant `arg`
+LOAD_OBJECT = 2           # Push object `arg`, a constant that is not a float
+STORE = 3                 # Copy the top of the stack into the next temporary register
+ADD = 4
+SUBTRACT = 5
+MULTIPLY = 6
+DIVIDE = 7
+POWER = 8
+ELEMENTWISE_MULTIPLY = 9
+CALL_BUILTIN = 10         # Apply object `arg`, a builtin, to the top of the stack
+LOG = 11                  # Apply object `arg`, a logarithm, to the argument and the base on top of it
+CALL_FUNCTION = 12        # Call a user function; object `arg` is (name, argument count)
+DERIVATIVE = 13           # Object `arg` is (name, argument count)
+PARTIAL = 14              # Object `arg` is (name, variables, argument count)
+BUILD_MATRIX = 15         # Object `arg` is the length of every row
+BUILD_LIST = 16           # Collect the `arg` topmost values into a list
+BUILD_SPARSE_MATRIX = 17  # Object `arg` is (shape, rows, columns) of the stored entries
+EXTENDED_ARG = 18
+
+OPCODE_NAMES = [
+    'LOAD', 'LOAD_CONST', 'LOAD_OBJECT', 'STORE', 'ADD', 'SUBTRACT', 'MULTIPLY', 'DIVIDE', 'POWER',
+    'ELEMENTWISE_MULTIPLY', 'CALL_BUILTIN', 'LOG', 'CALL_FUNCTION', 'DERIVATIVE', 'PARTIAL',
+    'BUILD_MATRIX', 'BUILD_LIST', 'BUILD_SPARSE_MATRIX', 'EXTENDED_ARG',
+]
+
+# Opcodes whose argument is the index of an object
+OBJECT_OPERANDS = (CALL_BUILTIN, LOG, CALL_FUNCTION, DERIVATIVE, PARTIAL, BUILD_MATRIX, BUILD_SPARSE_MATRIX)
+
+BINARY_OPCODES = {
+    '+': ADD,
+    '-': SUBTRACT,
+    '*': MULTIPLY,
+    '/': DIVIDE,
+    '^': POWER,
+    '.*': ELEMENTWISE_MULTIPLY,
+}
+
+
+class Code:
+    """Bytecode of a function body.
+
+    Instructions are stored in an `array('B')` and float constants in an
+    `array('d')`. Every other operand, such as builtins, call descriptions and
+    constants that are not floats, is kept in `objects`. Registers hold the
+    arguments of the function followed by its temporaries, the values of
+    subexpressions used more than once.
+    """
+    def __init__(self, name, variables):
+        self.name = name
+        self.variables = list(variables)
+        self.instructions = array('B')
+        self.constants = array('d')
+        self.objects = []
+        self.temporaries = 0
+        self.constant_indexes = {}
+        self.object_indexes = {}
+        # Names shown by the disassembler for object operands
+        self.labels = {}
+        # Decoded instructions run by `execute`
+        self.program = None
+
+    def emit(self, opcode, argument=0):
+        self.program = None
+        if argument > 0xff:
+            self.emit(EXTENDED_ARG, argument >> 8)
+            argument &= 0xff
+        self.instructions.append(opcode)
+        self.instructions.append(argument)
+
+    def constant(self, value):
+        """Return the index of a float constant, keyed by its bits so that 0.0 and -0.0 stay apart."""
+        key = value.hex()
+        if key not in self.constant_indexes:
+            self.constant_indexes[key] = len(self.constants)
+            self.constants.append(value)
+        return self.constant_indexes[key]
+
+    def object(self, value, label=None):
+        """Return the index of an object operand, shared with equal operands when it can be hashed."""
+        try:
+            key = (type(value), value, label)
+            if key not in self.object_indexes:
+                self.object_indexes[key] = len(self.objects)
+                self.objects.append(value)
+                self.labels[len(self.objects) - 1] = label
+            return self.object_indexes[key]
+        except TypeError:
+            self.objects.append(value)
+            self.labels[len(self.objects) - 1] = label
+            return len(self.objects) - 1
+
+    def store(self):
+        """Emit a STORE and return the register it writes."""
+        register = len(self.variables) + self.temporaries
+        self.temporaries += 1
+        self.emit(STORE, register)
+        return register
+
+    def instructions_list(self):
+        """Return (offset, opcode, argument) of every instruction, with extended arguments resolved."""
+        instructions = []
+        extended = 0
+        for offset in range(0, len(self.instructions), 2):
+            opcode = self.instructions[offset]
+            argument = self.instructions[offset + 1] | extended
+            if opcode == EXTENDED_ARG:
+                extended = argument << 8
+                continue
+            extended = 0
+            instructions.append((offset, opcode, argument))
+        return instructions
+
+    def decode(self):
+        """Return the instructions as (opcode, operand) pairs, with operands looked up, and keep them.
+
+        Constants, objects and extended arguments are resolved once here
+        instead of on every run of the dispatch loop. Constants that are not
+        floats are pushed by LOAD_CONST like the others.
+        """
+        program = []
+        for offset, opcode, argument in self.instructions_list():
+            if opcode == LOAD_CONST:
+                operand = self.constants[argument]
+            elif opcode == LOAD_OBJECT:
+                opcode, operand = LOAD_CONST, self.objects[argument]
+            elif opcode in OBJECT_OPERANDS:
+                operand = self.objects[argument]
+            else:
+                operand = argument
+            program.append((opcode, operand))
+        self.program = program
+        return program
+
+    def disassemble(self):
+        """Return a listing of the instructions, one per line, with their operands spelled out."""
+        names = self.variables + [f"_t{i}" for i in range(self.temporaries)]
+        lines = [f"{self.name}({', '.join(self.variables)}): {len(self.instructions)} bytes, "
+                 f"{len(self.constants)} constants, {len(self.objects)} objects, {self.temporaries} temporaries"]
+        for offset, opcode, argument in self.instructions_list():
+            if opcode in (LOAD, STORE):
+                operand = names[argument]
+            elif opcode == LOAD_CONST:
+                operand = repr(self.constants[argument])
+            elif opcode == LOAD_OBJECT or opcode in OBJECT_OPERANDS:
+                operand = self.labels.get(argument) or repr(self.objects[argument])
+            elif opcode == BUILD_LIST:
+                operand = str(argument)
+            else:
+                lines.append(f"{offset:>6} {OPCODE_NAMES[opcode]}")
+                continue
+            lines.append(f"{offset:>6} {OPCODE_NAMES[opcode]:<22}{argument:>4} ({operand})")
+        return '\n'.join(lines)
+
+
+def execute(code, arguments, functions, derivative, partial, matrix, sparse=None):
+    """Run the bytecode of a function body on a stack and return its value.
+
+    User functions are called through `functions`, the registry of the
+    Compiler, so they are resolved at call time like in compiled Python.
+    """
+    program = code.program or code.decode()
+    arity = len(code.variables)
+    if len(arguments) < arity:
+        raise TypeError(f"{code.name}() takes {arity} arguments but {len(arguments)} were given")
+    # Temporaries are appended in the order of their STORE instructions
+    registers = list(arguments[:arity])
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    for opcode, operand in program:
+        if opcode == LOAD:
+            push(registers[operand])
+        elif opcode == LOAD_CONST:
+            push(operand)
+        elif opcode == MULTIPLY:
+            right = pop()
+            stack[-1] = stack[-1] * right
+        elif opcode == ADD:
+            right = pop()
+            stack[-1] = stack[-1] + right
+        elif opcode == SUBTRACT:
+            right = pop()
+            stack[-1] = stack[-1] - right
+        elif opcode == CALL_BUILTIN:
+            stack[-1] = operand(stack[-1])
+        elif opcode == POWER:
+            right = pop()
+            stack[-1] = stack[-1] ** right
+        elif opcode == DIVIDE:
+            right = pop()
+            stack[-1] = stack[-1] / right
+        elif opcode == STORE:
+            registers.append(stack[-1])
+        elif opcode == CALL_FUNCTION:
+            name, count = operand
+            start = len(stack) - count
+            values = stack[start:]
+            del stack[start:]
+            push(functions[name](*values))
+        elif opcode == LOG:
+            base = pop()
+            stack[-1] = operand(stack[-1], base)
+        elif opcode == ELEMENTWISE_MULTIPLY:
+            right = pop()
+            stack[-1] = multiply(stack[-1], right)
+        elif opcode == BUILD_MATRIX:
+            start = len(stack) - sum(operand)
+            entries = iter(stack[start:])
+            del stack[start:]
+            push(matrix([[next(entries) for _ in range(length)] for length in operand]))
+        elif opcode == BUILD_SPARSE_MATRIX:
+            shape, rows, columns = operand
+            start = len(stack) - len(rows)
+            entries = stack[start:]
+            del stack[start:]
+            push(sparse(shape, rows, columns, entries))
+        elif opcode == DERIVATIVE:
+            name, count = operand
+            start = len(stack) - count
+            values = stack[start:]
+            del stack[start:]
+            push(derivative(name, values))
+        elif opcode == PARTIAL:
+            name, variables, count = operand
+            start = len(stack) - count
+            values = stack[start:]
+            del stack[start:]
+            push(partial(name, variables, values))
+        elif opcode == BUILD_LIST:
+            start = len(stack) - operand
+            values = stack[start:]
+            del stack[start:]
+            push(values)
+    return stack[-1]
+
+
+class BytecodeCompiler(Compiler):
+    """Compiler that assembles function bodies into bytecode run by `execute`.
+
+    Assembling is much cheaper than generating and compiling Python source,
+    and the callables it returns evaluate a body in a single loop over its
+    instructions instead of walking its tree. Functions that cannot be
+    assembled fall back to the tree-walker, as with the Compiler.
+    """
+    def compile_definition(self, function_name, function_variables, expression):
+        code = self.assemble(function_name, function_variables, expression)
+        functions, derivative, partial = self.registry, self.derivative, self.partial
+        matrix, sparse = self.matrix, self.sparse
+        def function(*arguments):
+            return execute(code, arguments, functions, derivative, partial, matrix, sparse)
+        function.__name__ = function_name
+        function.code = code
+        return function
+
+    def assemble(self, function_name, function_variables, expression):
+        """Return the Code of an expression, or of a list of expressions returned together."""
+        self.function_name = function_name
+        code = Code(function_name, function_variables)
+        expressions = expression if isinstance(expression, list) else [expression]
+        # Subexpressions shared by several parents are computed once into a temporary register
+        references = count_references(expressions)
+        temporaries = {}
+        for root in expressions:
+            self.assemble_expression(code, root, references, temporaries)
+        if isinstance(expression, list):
+            code.emit(BUILD_LIST, len(expressions))
+        return code
+
+    def assemble_expression(self, code, root, references, temporaries):
+        """Emit the instructions of an expression, children first, walking its tree with an explicit stack."""
+        # Whether each value the instructions leave on the stack may be a matrix
+        matrices = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if type(node) is tuple:
+                node, count = node
+                if count == 2:
+                    matrix = matrices.pop() | matrices.pop()
+                else:
+                    start = len(matrices) - count
+                    matrix = True in matrices[start:]
+                    del matrices[start:]
+                self.emit_node(code, node, not matrix)
+                matrix = matrix or node.type in MATRIX_NODES
+                if count and references[id(node)] > 1:
+                    temporaries[id(node)] = (code.store(), matrix)
+                matrices.append(matrix)
+            elif node.type == 'Number' or node.type == 'Variable':
+                self.emit_node(code, node, True)
+                matrices.append(False)
+            elif id(node) in temporaries:
+                register, matrix = temporaries[id(node)]
+                code.emit(LOAD, register)
+                matrices.append(matrix)
+            elif node.type == 'BinaryExpression':
+                stack += (node, 2), node.right, node.left
+            else:
+                children = child_nodes(node)
+                stack.append((node, len(children)))
+                stack.extend(reversed(children))
+
+    def emit_node(self, code, node, scalar):
+        """Emit the instruction computing a node from the values of its children.
+
+        `scalar` tells whether no child can be a matrix, in which case the
+        scalar versions of the builtins extended to matrices are used.
+        """
+        if node.type == 'Number':
+            if type(node.value) is float:
+                code.emit(LOAD_CONST, code.constant(node.value))
+            else:
+                code.emit(LOAD_OBJECT, code.object(node.value))
+        elif node.type == 'Variable':
+            if node.value not in code.variables:
+                raise CompilationError(self.function_name, f"unbound variable {node.value}")
+            # The last of repeated variables wins, as when the tree-walker zips them with the arguments
+            code.emit(LOAD, len(code.variables) - 1 - code.variables[::-1].index(node.value))
+        elif node.type == 'BinaryExpression':
+            if node.operator not in BINARY_OPCODES:
+                raise CompilationError(self.function_name, f"unknown operator {node.operator}")
+            code.emit(BINARY_OPCODES[node.operator])
+        elif node.type == 'MathFunction':
+            if node.function == 'log':
+                function = self.log
+                opcode = LOG
+            elif node.function in self.function_map:
+                function = self.function_map[node.function]
+                opcode = CALL_BUILTIN
+            else:
+                raise CompilationError(self.function_name, f"unknown function {node.function}")
+            if scalar and hasattr(function, 'scalar'):
+                function = function.scalar
+            code.emit(opcode, code.object(function, node.function))
+        elif node.type == 'Matrix':
+            rows = tuple(len(row) for row in node.elements)
+            code.emit(BUILD_MATRIX, code.object(rows, f"{len(rows)} rows of {', '.join(map(str, rows))}"))
+        elif node.type == 'SparseMatrix':
+            positions = (node.shape, np.array(node.rows, dtype=np.intp), np.array(node.columns, dtype=np.intp))
+            label = f"{node.shape[0]}x{node.shape[1]} with {len(node.entries)} entries"
+            code.emit(BUILD_SPARSE_MATRIX, code.object(positions, label))
+        elif node.type == 'FunctionCall':
+            code.emit(CALL_FUNCTION, code.object((node.name, len(node.arguments)), node.name))
+        elif node.type == 'Factorial':
+            code.emit(CALL_BUILTIN, code.object(self.factorial, 'factorial'))
+        elif node.type == 'Derivative':
+            if node.variables is not None:
+                variables = tuple(node.variables)
+                code.emit(PARTIAL, code.object((node.function, variables, len(node.arguments)),
+                                               f"{node.function}[{''.join(variables)}]'"))
+            else:
+                code.emit(DERIVATIVE, code.object((node.function, len(node.arguments)), f"{node.function}'"))
+        else:
+            raise CompilationError(self.function_name, f"unsupported node type {node.type}")
+
+
+def disassemble(function):
+    """Return the listing of a bytecode function, or of a Code."""
+    # Result caches and profiling counters keep the callable they wrap as __wrapped__
+    while hasattr(function, '__wrapped__'):
+        function = function.__wrapped__
+    code = getattr(function, 'code', function)
+    if not isinstance(code, Code):
+        raise TypeError(f"{getattr(function, '__name__', function)!r} is not a bytecode function")
+    return code.disassemble()
@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded result cache that evicts the least recently used entry.
+
+    Keys are argument tuples. Arguments that cannot be hashed, such as
+    matrices, bypass the cache and are counted separately.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self.data.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'bypassed': self.bypassed,
+                'size': len(self.data), 'maxsize': self.maxsize}
+
+    def wrap(self, function):
+        """Return a callable that looks results of a pure function up before computing them."""
+        data = self.data
+        def memoized(*arguments):
+            try:
+                result = data[arguments]
+            except KeyError:
+                self.misses += 1
+                result = data[arguments] = function(*arguments)
+                if len(data) > self.maxsize:
+                    data.popitem(last=False)
+                return result
+            except TypeError:
+                self.bypassed += 1
+                return function(*arguments)
+            self.hits += 1
+            data.move_to_end(arguments)
+            return result
+        memoized.__name__ = function.__name__
+        memoized.__wrapped__ = function
+        return memoized
@@ -0,0 +1,418 @@
+import math
+
+import numpy as np
+
+from .exceptions import CompilationError
+from .matrix import MatrixValue, SparseMatrixValue, multiply, log
+from .nodes import BinaryExpression, MathFunction, Matrix, SparseMatrix, FunctionCall, Derivative, Factorial
+
+
+def child_nodes(node):
+    """Return the subexpressions of an expression node."""
+    if node.type == 'BinaryExpression':
+        return [node.left, node.right]
+    elif node.type == 'MathFunction':
+        return [node.argument] if node.base is None else [node.argument, node.base]
+    elif node.type == 'Matrix':
+        return [e for row in node.elements for e in row]
+    elif node.type == 'SparseMatrix':
+        return node.entries
+    elif node.type in ('FunctionCall', 'Derivative'):
+        return node.arguments
+    elif node.type == 'Factorial':
+        return [node.operand]
+    return []
+
+
+def replace_children(node, children):
+    """Return a copy of an expression node with other subexpressions, given in the order of `child_nodes`."""
+    if node.type == 'BinaryExpression':
+        return BinaryExpression(children[0], node.operator, children[1])
+    elif node.type == 'MathFunction':
+        return MathFunction(node.function, children[0], None if node.base is None else children[1])
+    elif node.type == 'Matrix':
+        entries = iter(children)
+        return Matrix([[next(entries) for _ in row] for row in node.elements])
+    elif node.type == 'SparseMatrix':
+        return SparseMatrix(node.shape, node.rows, node.columns, children)
+    elif node.type == 'FunctionCall':
+        return FunctionCall(node.name, children)
+    elif node.type == 'Derivative':
+        return Derivative(node.function, children, node.variables)
+    elif node.type == 'Factorial':
+        return Factorial(children[0])
+    return node
+
+
+def is_compiled(function):
+    """Check whether a registered callable runs a compiled body rather than walking the tree."""
+    return hasattr(function, 'source') or hasattr(function, 'code')
+
+
+def fold(node, combine):
+    """Combine the values of the subexpressions of an expression bottom up, without recursion.
+
+    `combine(node, values)` receives the values of the children of a node in
+    the order of `child_nodes`, so trees of any depth can be walked.
+    """
+    values = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if type(item) is tuple:
+            node, count = item
+            children = values[len(values) - count:]
+            del values[len(values) - count:]
+            values.append(combine(node, children))
+        else:
+            children = child_nodes(item)
+            stack.append((item, len(children)))
+            stack.extend(reversed(children))
+    return values[0]
+
+
+def fold_shared(node, combine):
+    """Like `fold`, but combine every node of an expression DAG once, however many parents share it."""
+    values = {}
+    stack = [node]
+    while stack:
+        item = stack[-1]
+        if id(item) in values:
+            stack.pop()
+            continue
+        children = child_nodes(item)
+        pending = [child for child in children if id(child) not in values]
+        if pending:
+            stack.extend(pending)
+        else:
+            stack.pop()
+            values[id(item)] = combine(item, [values[id(child)] for child in children])
+    return values[id(node)]
+
+
+def dependents(callers, function_name):
+    """Return the functions calling a function, directly or not, each after the functions it calls.
+
+    `callers` maps every function to the functions calling it. Cycles are
+    followed once, so a function calling itself is not its own dependent.
+    """
+    finished = []
+    seen = {function_name}
+    path = [function_name]
+    stack = [iter(sorted(callers.get(function_name, ())))]
+    while stack:
+        for caller in stack[-1]:
+            if caller not in seen:
+                seen.add(caller)
+                path.append(caller)
+                stack.append(iter(sorted(callers.get(caller, ()))))
+                break
+        else:
+            stack.pop()
+            finished.append(path.pop())
+    # Callers finish before the functions they call; the function itself finishes last
+    finished.pop()
+    finished.reverse()
+    return finished
+
+
+def postorder(node):
+    """List the nodes of an expression children first, left to right, without recursion."""
+    nodes = []
+    stack = [node]
+    pop, push, visit = stack.pop, stack.append, nodes.append
+    while stack:
+        node = pop()
+        visit(node)
+        node_type = node.type
+        if node_type == 'BinaryExpression':
+            push(node.left)
+            push(node.right)
+        elif node_type != 'Number' and node_type != 'Variable':
+            stack.extend(child_nodes(node))
+    # Reversing the order root, last child, ..., first child gives first child, ..., root
+    nodes.reverse()
+    return nodes
+
+
+def may_be_matrix(node):
+    """Check whether an expression could evaluate to a matrix, counting calls as possible matrices."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.type in MATRIX_NODES:
+            return True
+        stack.extend(child_nodes(node))
+    return False
+
+
+def count_references(expressions):
+    """Count how many parents refer to each node of a DAG of expressions, keyed by id."""
+    references = {}
+    stack = list(expressions)
+    while stack:
+        node = stack.pop()
+        key = id(node)
+        if key in references:
+            references[key] += 1
+        else:
+            references[key] = 1
+            if node.type == 'BinaryExpression':
+                stack += node.left, node.right
+            elif node.type != 'Number' and node.type != 'Variable':
+                stack.extend(child_nodes(node))
+    return references
+
+
+# Nodes whose value may be a matrix, whatever their children
+MATRIX_NODES = ('Matrix', 'SparseMatrix', 'FunctionCall', 'Derivative')
+
+# Deepest nesting of a generated Python expression; Python cannot parse source nested about 200 deep
+MAX_NESTING = 32
+
+
+def factorial(operand):
+    """Factorial with the same integer truncation as the tree-walking interpreter."""
+    return math.factorial(int(operand))
+
+
+class CompiledFunctions(dict):
+    """Registry of compiled functions, compiling each one on first lookup."""
+    def __init__(self, compiler):
+        super().__init__()
+        self.compiler = compiler
+
+    def __missing__(self, function_name):
+        function = self.compiler.compile_or_fallback(function_name)
+        if self.compiler.decorate:
+            function = self.compiler.decorate(function_name, function)
+        self[function_name] = function
+        return function
+
+
+class Compiler:
+    """Compiler that turns function definitions into specialized Python callables.
+
+    Each function body is translated into the source of a Python function and
+    compiled with `compile`, so evaluating it no longer dispatches on node types.
+    Nested function calls are resolved through the registry at call time, which
+    keeps the late binding of the tree-walking interpreter.
+    """
+    def __init__(self, interpreter, function_map, log=log, factorial=factorial,
+                 derivative=None, partial=None, matrix=MatrixValue.from_rows, sparse=SparseMatrixValue.from_entries,
+                 decorate=None, enabled=True):
+        self.interpreter = interpreter
+        self.function_map = function_map
+        self.log = log
+        self.factorial = factorial
+        self.derivative = derivative or interpreter.evaluate_derivative
+        self.partial = partial or interpreter.evaluate_partial
+        # Constructors of matrix values from the rows of a matrix literal, and from the entries of a sparse one
+        self.matrix = matrix
+        self.sparse = sparse
+        # Optional wrapper applied to every registered function, e.g. a result cache
+        self.decorate = decorate
+        # When disabled, the registry holds tree-walking callables instead
+        self.enabled = enabled
+        self.registry = CompiledFunctions(self)
+
+    def compile_or_fallback(self, function_name):
+        """Compile a function, falling back to the tree-walker if it cannot be compiled."""
+        if not self.enabled:
+            return self.fallback(function_name)
+        try:
+            return self.compile_function(function_name)
+        except CompilationError:
+            return self.fallback(function_name)
+
+    def compile_or_fallback_definition(self, function_name, function_variables, expression):
+        """Compile an expression, falling back to evaluating its tree."""
+        try:
+            return self.compile_definition(function_name, function_variables, expression)
+        except CompilationError:
+            return self.interpreter.tree_walker(expression, function_variables)
+
+    def fallback(self, function_name):
+        """Return a callable that evaluates a function by walking its expression tree."""
+        interpreter = self.interpreter
+        def tree_walker(*arguments):
+            return interpreter.evaluate_function(function_name, arguments)
+        tree_walker.__name__ = function_name
+        return tree_walker
+
+    def compile_function(self, function_name):
+        """Compile the stored definition of a function into a Python callable."""
+        function_variables, expression = self.interpreter.functions[function_name]
+        return self.compile_definition(function_name, function_variables, expression)
+
+    def compile_definition(self, function_name, function_variables, expression):
+        """Compile an expression, or a list of expressions returned together, into a callable."""
+        self.namespace = {
+            '_functions': self.registry,
+            '_derivative': self.derivative,
+            '_partial': self.partial,
+            '_matrix': self.matrix,
+            '_sparse': self.sparse,
+            '_multiply': multiply,
+            '_log': self.log,
+            '_factorial': self.factorial,
+        }
+        self.function_name = function_name
+        self.function_variables = function_variables
+        expressions = expression if isinstance(expression, list) else [expression]
+        # Subexpressions shared by several parents are computed once into a temporary
+        self.references = count_references(expressions)
+        self.temporaries = {}
+        self.statements = []
+        try:
+            if isinstance(expression, list):
+                body = '[' + ', '.join(self.compile_expression(e) for e in expression) + ']'
+            else:
+                body = self.compile_expression(expression)
+        except RecursionError:
+            raise CompilationError(function_name, "expression is nested too deeply")
+
+        # Extra arguments are ignored, as when the tree-walker zips them with the variables
+        parameters = ', '.join([*function_variables, '*_'])
+        lines = [f"def _function({parameters}):"]
+        lines += [f"    {statement}" for statement in self.statements]
+        lines.append(f"    return {body}")
+        source = '\n'.join(lines) + '\n'
+        try:
+            code = compile(source, f"<mrog {function_name}>", 'exec')
+        except (SyntaxError, RecursionError, MemoryError) as e:
+            raise CompilationError(function_name, str(e))
+        exec(code, self.namespace)
+        function = self.namespace['_function']
+        function.__name__ = function_name
+        function.source = source
+        return function
+
+    def constant(self, value):
+        """Return a Python expression for a constant value."""
+        if type(value) in (int, float) and math.isfinite(value):
+            return repr(value)
+        name = f"_k{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def compile_expression(self, root):
+        """Return the Python source for an expression, walking its tree with an explicit stack.
+
+        Subexpressions shared by several parents, or nested MAX_NESTING deep,
+        are computed into temporaries first, so any tree compiles to source
+        that Python can parse.
+        """
+        # Source, nesting depth and whether it may be a matrix, of each compiled subexpression
+        sources, depths, matrices = [], [], []
+        stack = [root]
+        references, temporaries = self.references, self.temporaries
+        while stack:
+            node = stack.pop()
+            if type(node) is tuple:
+                node, count = node
+                if count == 1:
+                    children = [sources.pop()]
+                    nesting = depths.pop() + 1
+                    matrix = matrices.pop()
+                elif count == 2:
+                    right, left = sources.pop(), sources.pop()
+                    children = [left, right]
+                    nesting = max(depths.pop(), depths.pop()) + 1
+                    matrix = matrices.pop() | matrices.pop()
+                else:
+                    start = len(sources) - count
+                    children = sources[start:]
+                    nesting = max(depths[start:]) + 1
+                    matrix = True in matrices[start:]
+                    del sources[start:], depths[start:], matrices[start:]
+                source = self.compile_node(node, children, not matrix)
+                matrix = matrix or node.type in MATRIX_NODES
+                if nesting >= MAX_NESTING or references[id(node)] > 1:
+                    source, nesting = self.store(node, source, matrix), 0
+            elif node.type == 'Number' or node.type == 'Variable':
+                source, nesting, matrix = self.compile_node(node, None, True), 0, False
+            elif id(node) in temporaries:
+                source, nesting, matrix = temporaries[id(node)]
+            elif node.type == 'BinaryExpression':
+                stack += (node, 2), node.right, node.left
+                continue
+            else:
+                children = child_nodes(node)
+                if children:
+                    stack.append((node, len(children)))
+                    stack.extend(reversed(children))
+                    continue
+                source, nesting, matrix = self.compile_node(node, children, True), 0, node.type in MATRIX_NODES
+                if matrix and references[id(node)] > 1:
+                    # Calls without arguments
+                    source = self.store(node, source, matrix)
+            sources.append(source)
+            depths.append(nesting)
+            matrices.append(matrix)
+        return sources[0]
+
+    def store(self, node, source, matrix):
+        """Compute a subexpression into a temporary and return its name, sharing it if it has several parents."""
+        name = f"_t{len(self.statements)}"
+        self.statements.append(f"{name} = {source}")
+        if self.references[id(node)] > 1:
+            self.temporaries[id(node)] = (name, 0, matrix)
+        return name
+
+    def compile_node(self, node, children, scalar):
+        """Return the Python source computing a node from the sources of its children.
+
+        `scalar` tells whether no child can be a matrix.
+        """
+        if node.type == 'Number':
+            return self.constant(node.value)
+        elif node.type == 'Variable':
+            if node.value not in self.function_variables:
+                raise CompilationError(self.function_name, f"unbound variable {node.value}")
+            return node.value
+        elif node.type == 'BinaryExpression':
+            left, right = children
+            if node.operator == '.*':
+                return f"_multiply({left}, {right})"
+            operator = '**' if node.operator == '^' else node.operator
+            return f"({left} {operator} {right})"
+        elif node.type == 'MathFunction':
+            argument = children[0]
+            func_name = node.function
+            # Functions extended to matrices have a faster scalar version for other arguments
+            if func_name == 'log':
+                base = children[1]
+                if scalar and hasattr(self.log, 'scalar'):
+                    self.namespace['_scalar_log'] = self.log.scalar
+                    return f"_scalar_log({argument}, {base})"
+                return f"_log({argument}, {base})"
+            if func_name not in self.function_map:
+                raise CompilationError(self.function_name, f"unknown function {func_name}")
+            function = self.function_map[func_name]
+            if scalar and hasattr(function, 'scalar'):
+                self.namespace[f"_scalar_{func_name}"] = function.scalar
+                return f"_scalar_{func_name}({argument})"
+            self.namespace[f"_{func_name}"] = function
+            return f"_{func_name}({argument})"
+        elif node.type == 'Matrix':
+            entries = iter(children)
+            rows = ('[' + ', '.join(next(entries) for _ in row) + ']' for row in node.elements)
+            matrix = '[' + ', '.join(rows) + ']'
+            return f"_matrix({matrix})"
+        elif node.type == 'SparseMatrix':
+            # Only the stored entries are computed, at positions kept as constants of the function
+            rows = self.constant(np.array(node.rows, dtype=np.intp))
+            columns = self.constant(np.array(node.columns, dtype=np.intp))
+            return f"_sparse({node.shape!r}, {rows}, {columns}, [{', '.join(children)}])"
+        elif node.type == 'FunctionCall':
+            arguments = ', '.join(children)
+            return f"_functions[{node.name!r}]({arguments})"
+        elif node.type == 'Factorial':
+            return f"_factorial({children[0]})"
+        elif node.type == 'Derivative':
+            arguments = ', '.join(children)
+            if node.variables is not None:
+                return f"_partial({node.function!r}, {tuple(node.variables)!r}, [{arguments}])"
+            return f"_derivative({node.function!r}, [{arguments}])"
+        raise CompilationError(self.function_name, f"unsupported node type {node.type}")
@@ -0,0 +1,224 @@
+from .exceptions import NotDifferentiableError
+from .nodes import Number, MathFunction, BinaryExpression, Derivative, matrix_literal, sparse_matrix
+from .compiler import may_be_matrix
+
+
+def number(value):
+    return Number(value)
+
+def is_number(node, value=None):
+    return node.type == 'Number' and (value is None or node.value == value)
+
+def function(name, argument):
+    return MathFunction(name, argument)
+
+def add(left, right):
+    if is_number(left, 0):
+        return right
+    if is_number(right, 0):
+        return left
+    if is_number(left) and is_number(right):
+        return number(left.value + right.value)
+    return BinaryExpression(left, '+', right)
+
+def sub(left, right):
+    if is_number(right, 0):
+        return left
+    if is_number(left) and is_number(right):
+        return number(left.value - right.value)
+    return BinaryExpression(left, '-', right)
+
+def mul(left, right, operator='*'):
+    if is_number(left, 0) or is_number(right, 0):
+        return number(0.0)
+    if is_number(left, 1):
+        return right
+    if is_number(right, 1):
+        return left
+    if is_number(left) and is_number(right):
+        return number(left.value * right.value)
+    return BinaryExpression(left, operator, right)
+
+def emul(left, right):
+    """Product of factors that multiply entry by entry, rather than as matrices, if both are matrices."""
+    return mul(left, right, '.*' if may_be_matrix(left) and may_be_matrix(right) else '*')
+
+def div(left, right):
+    if is_number(left, 0):
+        return number(0.0)
+    if is_number(right, 1):
+        return left
+    return BinaryExpression(left, '/', right)
+
+def power(left, right):
+    if is_number(right, 1):
+        return left
+    return BinaryExpression(left, '^', right)
+
+def neg(node):
+    return mul(number(-1.0), node)
+
+def square(node):
+    return power(node, number(2.0))
+
+def inverse(node):
+    return div(number(1.0), node)
+
+
+# Derivative of each built-in function with respect to its argument u
+FUNCTION_DERIVATIVES = {
+    'exp': lambda u: function('exp', u),
+    'sqrt': lambda u: inverse(mul(number(2.0), function('sqrt', u))),
+    'ln': lambda u: inverse(u),
+    'abs': lambda u: div(u, function('abs', u)),
+    'sin': lambda u: function('cos', u),
+    'cos': lambda u: neg(function('sin', u)),
+    'tan': lambda u: square(function('sec', u)),
+    'csc': lambda u: neg(emul(function('csc', u), function('cot', u))),
+    'sec': lambda u: emul(function('sec', u), function('tan', u)),
+    'cot': lambda u: neg(square(function('csc', u))),
+    'sinh': lambda u: function('cosh', u),
+    'cosh': lambda u: function('sinh', u),
+    'tanh': lambda u: square(function('sech', u)),
+    'csch': lambda u: neg(emul(function('csch', u), function('coth', u))),
+    'sech': lambda u: neg(emul(function('sech', u), function('tanh', u))),
+    'coth': lambda u: neg(square(function('csch', u))),
+    'asin': lambda u: inverse(function('sqrt', sub(number(1.0), square(u)))),
+    'acos': lambda u: neg(inverse(function('sqrt', sub(number(1.0), square(u))))),
+    'atan': lambda u: inverse(add(number(1.0), square(u))),
+    'acsc': lambda u: neg(inverse(emul(square(u), function('sqrt', sub(number(1.0), inverse(square(u))))))),
+    'asec': lambda u: inverse(emul(square(u), function('sqrt', sub(number(1.0), inverse(square(u)))))),
+    'acot': lambda u: neg(inverse(add(square(u), number(1.0)))),
+    'asinh': lambda u: inverse(function('sqrt', add(square(u), number(1.0)))),
+    'acosh': lambda u: inverse(function('sqrt', sub(square(u), number(1.0)))),
+    'atanh': lambda u: inverse(sub(number(1.0), square(u))),
+    'acsch': lambda u: neg(inverse(emul(square(u), function('sqrt', add(number(1.0), inverse(square(u))))))),
+    'asech': lambda u: neg(inverse(emul(square(u), function('sqrt', sub(inverse(square(u)), number(1.0)))))),
+    'acoth': lambda u: inverse(sub(number(1.0), square(u))),
+}
+
+
+class Differentiator:
+    """Symbolic differentiation of function bodies over the parser's AST nodes.
+
+    Partial derivatives are built once per function and sequence of variables
+    and cached. Calls to other user functions are differentiated with the chain
+    rule through partial Derivative nodes, which are resolved by name at
+    evaluation time, so a cached tree stays valid when a callee is redefined.
+    """
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        # Partial derivative trees per function, keyed by the tuple of variables
+        self.trees = {}
+
+    def partial(self, function_name, variables):
+        """Return the tree of the partial derivative of a function along the given variables."""
+        variables = tuple(variables)
+        trees = self.trees.setdefault(function_name, {})
+        if variables not in trees:
+            if variables:
+                expression = self.partial(function_name, variables[:-1])
+                trees[variables] = self.differentiate(expression, variables[-1])
+            else:
+                trees[variables] = self.interpreter.functions[function_name][1]
+        return trees[variables]
+
+    def depends(self, node, var):
+        """Check whether an expression depends on a variable."""
+        if node.type == 'Variable':
+            return node.value == var
+        elif node.type == 'BinaryExpression':
+            return self.depends(node.left, var) or self.depends(node.right, var)
+        elif node.type == 'MathFunction':
+            return self.depends(node.argument, var) or (node.base is not None and self.depends(node.base, var))
+        elif node.type == 'Matrix':
+            return any(self.depends(e, var) for row in node.elements for e in row)
+        elif node.type == 'SparseMatrix':
+            return any(self.depends(e, var) for e in node.entries)
+        elif node.type in ('FunctionCall', 'Derivative'):
+            return any(self.depends(a, var) for a in node.arguments)
+        elif node.type == 'Factorial':
+            return self.depends(node.operand, var)
+        return False
+
+    def differentiate(self, node, var):
+        """Return the derivative of an expression with respect to a variable."""
+        if not self.depends(node, var):
+            if node.type == 'Matrix':
+                return matrix_literal([[number(0.0) for _ in row] for row in node.elements])
+            if node.type == 'SparseMatrix':
+                return sparse_matrix(node.shape, [])
+            return number(0.0)
+
+        if node.type == 'Variable':
+            return number(1.0)
+        elif node.type == 'BinaryExpression':
+            return self.differentiate_binary(node, var)
+        elif node.type == 'MathFunction':
+            u = node.argument
+            if node.function == 'log':
+                # log(b, u) = ln(u) / ln(b)
+                b = node.base
+                ln_b = function('ln', b)
+                if not self.depends(b, var):
+                    return div(self.differentiate(u, var), emul(u, ln_b))
+                numerator = sub(emul(div(self.differentiate(u, var), u), ln_b),
+                                emul(function('ln', u), div(self.differentiate(b, var), b)))
+                return div(numerator, square(ln_b))
+            return emul(FUNCTION_DERIVATIVES[node.function](u), self.differentiate(u, var))
+        elif node.type == 'Matrix':
+            # Entries that do not depend on the variable have 0 derivatives, which a sparse matrix leaves out
+            return matrix_literal([[self.differentiate(e, var) for e in row] for row in node.elements])
+        elif node.type == 'SparseMatrix':
+            derivatives = [self.differentiate(e, var) for e in node.entries]
+            return sparse_matrix(node.shape, zip(node.rows, node.columns, derivatives))
+        elif node.type == 'FunctionCall':
+            return self.chain_rule(node.name, (), node.arguments, var)
+        elif node.type == 'Derivative':
+            variables = node.variables
+            if variables is None:
+                # f'(u) is a partial derivative only for functions of one variable
+                function_variables, _ = self.interpreter.functions[node.function]
+                if len(function_variables) != 1:
+                    raise NotDifferentiableError(node.function, "the derivative of a gradient is not a scalar")
+                variables = tuple(function_variables)
+            return self.chain_rule(node.function, tuple(variables), node.arguments, var)
+        raise NotDifferentiableError(self.describe(node), f"{node.type} has no derivative")
+
+    def differentiate_binary(self, node, var):
+        left, right, operator = node.left, node.right, node.operator
+        if operator == '+':
+            return add(self.differentiate(left, var), self.differentiate(right, var))
+        elif operator == '-':
+            return sub(self.differentiate(left, var), self.differentiate(right, var))
+        elif operator == '*':
+            # The order of the factors is kept, so the product rule also holds for matrix products
+            return add(mul(self.differentiate(left, var), right), mul(left, self.differentiate(right, var)))
+        elif operator == '.*':
+            return add(emul(self.differentiate(left, var), right), emul(left, self.differentiate(right, var)))
+        elif operator == '/':
+            numerator = sub(emul(self.differentiate(left, var), right), emul(left, self.differentiate(right, var)))
+            return div(numerator, square(right))
+        # Power rule, exponential rule or the general u^v rule depending on what varies
+        if not self.depends(right, var):
+            exponent = number(right.value - 1) if is_number(right) else sub(right, number(1.0))
+            return emul(emul(right, power(left, exponent)), self.differentiate(left, var))
+        if not self.depends(left, var):
+            return emul(emul(node, function('ln', left)), self.differentiate(right, var))
+        return emul(node, add(emul(self.differentiate(right, var), function('ln', left)),
+                              div(emul(right, self.differentiate(left, var)), left)))
+
+    def chain_rule(self, function_name, variables, arguments, var):
+        """Differentiate a call g(u1, ..., un) as the sum of dg/dvi(u) * dui/dvar."""
+        function_variables, _ = self.interpreter.functions[function_name]
+        result = number(0.0)
+        for v, argument in zip(function_variables, arguments):
+            inner = self.differentiate(argument, var)
+            if is_number(inner, 0):
+                continue
+            outer = Derivative(function_name, arguments, variables + (v,))
+            result = add(result, emul(outer, inner))
+        return result
+
+    def describe(self, node):
+        return self.interpreter.expression_to_string(node)
@@ -56,7 +56,61 @@ class InvalidPrintArgumentError(Exception):
         self.message = f"Error in line {line}: {message} {argument}\n{self.description}"
         super().__init__(self.message)
 
+class CompilationError(Exception):
+    """Raised when a function body cannot be compiled into a Python callable"""
+    def __init__(self, function_name, reason):
+        self.function_name = function_name
+        self.message = f"Could not compile function {function_name}: {reason}"
+        super().__init__(self.message)
+
+class NotDifferentiableError(Exception):
+    """Raised when an expression has no symbolic derivative"""
+    def __init__(self, expression, reason):
+        self.expression = expression
+        self.message = f"Cannot differentiate {expression}: {reason}"
+        super().__init__(self.message)
+
+class InvalidGridError(Exception):
+    """Raised when a grid or range specification cannot be used"""
+    def __init__(self, message):
+        self.message = f"Invalid grid: {message}"
+        super().__init__(self.message)
+
+class InvalidInputError(Exception):
+    """Raised when an input file of points cannot be evaluated"""
+    def __init__(self, message):
+        self.message = f"Invalid input: {message}"
+        super().__init__(self.message)
+
+class InvalidMatrixOperationError(Exception):
+    """Raised when an operation is applied to matrices of incompatible shapes"""
+    def __init__(self, message):
+        self.message = f"Invalid matrix operation: {message}"
+        super().__init__(self.message)
+
+class InvalidRequestError(Exception):
+    """Raised when a request to the evaluation server cannot be served"""
+    def __init__(self, message):
+        self.message = f"Invalid request: {message}"
+        super().__init__(self.message)
+
+class InvalidAnalysisArgumentError(Exception):
+    """Raised when integrate or solve is given a function or bound it cannot use"""
+    def __init__(self, line, statement, reason):
+        self.message = f"Error in line {line}: Invalid argument of {statement}: {reason}"
+        super().__init__(self.message)
+
+class AnalysisError(Exception):
+    """Raised when an integral, root or approximation cannot be computed to the requested tolerance"""
+    def __init__(self, message):
+        self.message = f"Analysis failed: {message}"
+        super().__init__(self.message)
 
+class InvalidOperandError(Exception):
+    """Raised when an exact numeric mode cannot apply an operation to a value, such as factorial to a non-integer"""
+    def __init__(self, message):
+        self.message = f"Invalid operand: {message}"
+        super().__init__(self.message)
 
 
 
@@ -1,4 +1,18 @@
 import math
+import operator
+
+from .compiler import Compiler, fold, postorder, is_compiled
+from .bytecode import BytecodeCompiler
+from .differentiation import Differentiator
+from .autodiff import ForwardDifferentiator
+from .optimizer import Optimizer, INLINE_THRESHOLD
+from .numeric import numeric_backend
+from .analysis import integrate, solve, DEFAULT_TOLERANCE
+from .approximation import approximate, DEFAULT_TOLERANCE as APPROXIMATION_TOLERANCE, DEFAULT_DEGREE
+from .cache import LRUCache
+from .matrix import MatrixValue, SparseMatrixValue, elementwise, multiply, log
+from .vectorize import TRIG_UFUNCS_MAP, MATH_UFUNCS_MAP, VectorizedEvaluator
+from .exceptions import NotDifferentiableError, AnalysisError, InvalidOperandError
 
 # Mapping of function names to their corresponding Python callables
 TRIG_FUNCTIONS_MAP = {
@@ -35,111 +49,429 @@ MATH_FUNCTIONS_MAP = {
     'abs': abs,
 }
 
+# Built-in functions apply to every entry of a matrix argument
+for name, function in TRIG_FUNCTIONS_MAP.items():
+    TRIG_FUNCTIONS_MAP[name] = elementwise(function, TRIG_UFUNCS_MAP[name])
+for name, function in MATH_FUNCTIONS_MAP.items():
+    MATH_FUNCTIONS_MAP[name] = elementwise(function, MATH_UFUNCS_MAP[name])
+
+BINARY_OPERATIONS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '^': operator.pow,
+    '.*': multiply,
+}
+
+# Strategies for evaluating the Derivative node
+DERIVATIVE_STRATEGIES = ('symbolic', 'forward', 'finite')
+
+def pop_values(values, count):
+    """Remove and return the topmost values of a value stack."""
+    popped = values[len(values) - count:]
+    del values[len(values) - count:]
+    return popped
+
+
 class Interpreter:
-    def __init__(self, semantic_analyzer):
+    def __init__(self, semantic_analyzer, compile=True, derivative_strategy='symbolic', optimize=False,
+                 memoize=None, stream=False, profiler=None, bytecode=False, inline_threshold=INLINE_THRESHOLD,
+                 numeric='float', precision=None):
         self.semantic_analyzer = semantic_analyzer
+        # Optional Profiler; instance attributes shadow the methods it measures only when profiling
+        self.profiler = profiler
+        if profiler:
+            self.evaluate_postorder = profiler.count_evaluations(self.evaluate_postorder)
+            self.evaluate_derivative = profiler.time_derivative(self.evaluate_derivative)
+            self.evaluate_partial = profiler.time_partial(self.evaluate_partial)
+        # Execute each statement as soon as it is analyzed instead of after the whole program
+        self.stream = stream
         self.functions = {}
+        # Body of each function as written, printed even when the optimizer rewrote it
+        self.definitions = {}
         self.function_strings = {}
+        # Nodes of each function body in evaluation order, for the tree-walker
+        self.postorders = {}
+        # Compiled callables for each function, used instead of walking the tree,
+        # either Python functions or bytecode run by the mrog virtual machine
+        self.compile = compile
+        self.bytecode = bytecode
+        # Number type of the run, with the built-in functions, log and factorial evaluating it
+        self.numeric = numeric_backend(numeric, {**MATH_FUNCTIONS_MAP, **TRIG_FUNCTIONS_MAP}, precision)
+        self.numeric.activate()
+        self.function_map = self.numeric.function_map
+        self.number_types = self.numeric.number_types
+        if bytecode and self.numeric.exact:
+            raise ValueError("bytecode only runs float arithmetic")
+        compiler = BytecodeCompiler if bytecode else Compiler
+        self.compiler = compiler(self, self.function_map, log=self.numeric.log, factorial=self.numeric.factorial,
+                                 decorate=self.decorate, enabled=compile)
+        self.compiled_functions = self.compiler.registry
+        # Constant folding, common-subexpression elimination and inlining of the analyzed AST
+        self.optimizer = Optimizer(self.function_map, self.functions, inline_threshold,
+                                   self.numeric) if optimize else None
+        # Exact derivative trees, and the callables evaluating them, per function
+        self.derivative_strategy = derivative_strategy
+        self.differentiator = Differentiator(self)
+        self.derivative_functions = {}
+        # Dual-number evaluation for the forward-mode strategy
+        self.forward = ForwardDifferentiator(self)
+        # Opt-in result caches: maximum size per function name, or for every function under None
+        self.memoize_sizes = {} if memoize is None else {None: memoize}
+        self.memo_caches = {}
+        # Opt-in polynomial approximations: interval, tolerance and degree per function, and those built
+        self.approximation_options = {}
+        self.approximations = {}
+        # Every per-function cache that must be dropped when a function is redefined
+        self.function_caches = [self.compiled_functions, self.postorders, self.differentiator.trees, self.derivative_functions,
+                                self.forward.compiled_functions, self.forward.derivative_functions]
+        # NumPy evaluation of the integrands of integrate statements, created on first use
+        self.vectorized = None
+        # Label and statistics of every integrate and solve statement run
+        self.analysis_stats = []
 
     def interpret(self):
-        for node in self.semantic_analyzer.analyze():
-            if node['type'] == 'FunctionDefinition':
+        for node in self.statements():
+            if node.type == 'FunctionDefinition':
                 self.handle_function_definition(node)
-            elif node['type'] == 'PrintStatement':
+            elif node.type == 'PrintStatement':
                 self.handle_print_statement(node)
+            elif node.type in ('IntegrateStatement', 'SolveStatement'):
+                print(self.format_analysis_statement(node))
+
+    def statements(self):
+        """Return the analyzed, and optionally optimized, statements of the program."""
+        if self.stream:
+            ast = self.semantic_analyzer.analyze_statements()
+        else:
+            ast = self.semantic_analyzer.analyze()
+        if self.optimizer:
+            ast = map(self.optimizer.optimize_statement, ast)
+        return ast
 
-    def handle_function_definition(self, node):
-        function_name = node['name']
-        function_variables = node['function_variables']
-        expression = node['expression']
+    def handle_function_definition(self, node, dependents=None):
+        function_name = node.name
+        function_variables = node.function_variables
+        expression = node.expression
+        # Nothing is derived yet from a function defined for the first time
+        redefined = function_name in self.functions
         self.functions[function_name] = (function_variables, expression)
+        self.definitions[function_name] = self.optimizer.definitions[function_name].expression \
+            if self.optimizer else expression
+        if redefined:
+            self.invalidate(function_name, dependents)
+        # Functions holding an inlined copy of the previous definition inline the new one
+        if self.optimizer:
+            for definition in self.optimizer.stale_definitions(function_name):
+                self.functions[definition.name] = (definition.function_variables, definition.expression)
+                self.invalidate(definition.name, dependents)
+
+    def invalidate(self, function_name, dependents=None):
+        """Drop everything derived from a function that has been (re)defined.
+
+        Cached results of any function may depend on the redefined one, so
+        they are all cleared unless the functions calling it, directly or
+        not, are given as `dependents`.
+        """
+        # Approximations hold values of the functions they call, like cached results
+        stale_approximations = self.approximation_options if dependents is None else ()
+        for cache in self.function_caches:
+            cache.pop(function_name, None)
+            for name in stale_approximations:
+                cache.pop(name, None)
+        for name in (function_name, *stale_approximations):
+            self.approximations.pop(name, None)
+        if dependents is None:
+            stale = self.memo_caches.values()
+        else:
+            stale = [self.memo_caches[name] for name in (function_name, *dependents) if name in self.memo_caches]
+        for cache in stale:
+            cache.clear()
+
+    def memoize(self, function_name=None, maxsize=1024):
+        """Cache results of a function, or of every function when no name is given."""
+        self.memoize_sizes[function_name] = maxsize
+        self.memo_caches.pop(function_name, None)
+        if function_name:
+            self.compiled_functions.pop(function_name, None)
+        else:
+            self.compiled_functions.clear()
+
+    def approximate(self, function_name, lower, upper, tolerance=APPROXIMATION_TOLERANCE, degree=DEFAULT_DEGREE):
+        """Evaluate a function of one variable on an interval by a piecewise polynomial, built on first call."""
+        if self.numeric.exact:
+            raise ValueError("approximations only run float arithmetic")
+        self.approximation_options[function_name] = (lower, upper, tolerance, degree)
+        self.approximations.pop(function_name, None)
+        self.compiled_functions.pop(function_name, None)
+        if self.vectorized:
+            self.vectorized.compiled_functions.pop(function_name, None)
+
+    def approximated(self, function_name, function):
+        """Return the approximation replacing a function, installing it for NumPy arrays too."""
+        function_variables, _ = self.functions[function_name]
+        if len(function_variables) != 1:
+            raise AnalysisError(f"only functions of one variable can be approximated but {function_name} "
+                                f"has {len(function_variables)}")
+        lower, upper, tolerance, degree = self.approximation_options[function_name]
+        registry = self.vectorized_evaluator().compiled_functions
+        # The exact vectorized function, compiled again if it was approximated before
+        registry.pop(function_name, None)
+        approximation = approximate(function_name, function, registry[function_name], lower, upper,
+                                    tolerance, degree)
+        registry[function_name] = approximation.evaluate
+        self.approximations[function_name] = approximation
+        return approximation.scalar
+
+    def decorate(self, function_name, function):
+        """Wrap a registered callable with its approximation, its result cache and, when profiling, its counters."""
+        if function_name in self.approximation_options:
+            function = self.approximated(function_name, function)
+        if self.profiler and is_compiled(function):
+            function = self.profiler.count_nodes(self.functions[function_name][1], function)
+        function = self.memoized(function_name, function)
+        if self.profiler:
+            function = self.profiler.time_function(function_name, function)
+        return function
+
+    def memoized(self, function_name, function):
+        """Wrap a callable with the result cache of its function, if it has one."""
+        maxsize = self.memoize_sizes.get(function_name, self.memoize_sizes.get(None))
+        if not maxsize:
+            return function
+        if function_name not in self.memo_caches:
+            self.memo_caches[function_name] = LRUCache(maxsize)
+        return self.memo_caches[function_name].wrap(function)
+
+    def memo_stats(self):
+        """Return the hit and miss counters of every result cache."""
+        return {name: cache.stats() for name, cache in self.memo_caches.items()}
+
+    def call_function(self, function_name, arguments):
+        """Call a user function with evaluated arguments."""
+        if not any(isinstance(a, str) for a in arguments):
+            return self.compiled_functions[function_name](*arguments)
+        return self.evaluate_function(function_name, arguments)
+
+    def evaluate_function(self, function_name, arguments):
+        """Call a user function by walking its expression tree."""
+        vars_, expression = self.functions[function_name]
+        env = {v: val for v, val in zip(vars_, arguments)}
+        if function_name not in self.postorders:
+            self.postorders[function_name] = postorder(expression)
+        return self.evaluate_postorder(self.postorders[function_name], env)
 
     def handle_print_statement(self, node):
-        argument = node['argument']
-        if argument['type'] == 'FunctionCall':
-            function_name = argument['name']
-            args = [self.evaluate_expression(a) for a in argument['arguments']]
-            if all(isinstance(a, (int, float)) for a in args):
-                display_args = [int(a) if isinstance(a, float) and a % 1 == 0 else a for a in args]
+        print(self.format_print_statement(node))
+
+    def format_print_statement(self, node):
+        """Return the line printed by a print statement."""
+        argument = node.argument
+        if argument.type == 'FunctionCall':
+            function_name = argument.name
+            args = [self.evaluate_expression(a) for a in argument.arguments]
+            if all(isinstance(a, self.number_types) for a in args):
                 result = self.evaluate_expression(argument)
-                args_str = ', '.join(str(a) for a in display_args)
-                print(f"{function_name}({args_str}) = {result}")
+                args_str = ', '.join(self.format_number(a) for a in args)
+                return f"{function_name}({args_str}) = {self.format_value(result)}"
             else:
                 func_str = self.get_function_string(function_name, args)
-                print(f"{function_name}({', '.join(str(a) for a in args)}) = {func_str}")
+                return f"{function_name}({', '.join(str(a) for a in args)}) = {func_str}"
         else:
             result = self.evaluate_expression(argument)
-            print(result)
+            return self.format_value(result)
+
+    def format_statement(self, node):
+        """Return the line printed by a print, integrate or solve statement."""
+        if node.type == 'PrintStatement':
+            return self.format_print_statement(node)
+        return self.format_analysis_statement(node)
+
+    def format_analysis_statement(self, node):
+        """Compute an integral or a root and return the line printed for it."""
+        tolerance = DEFAULT_TOLERANCE if node.tolerance is None else float(self.evaluate_expression(node.tolerance))
+        if node.type == 'IntegrateStatement':
+            bounds = [self.evaluate_expression(node.lower), self.evaluate_expression(node.upper)]
+            result, stats = integrate(self, node.function, *bounds, tolerance)
+            label = f"integrate({node.function}, {', '.join(self.format_number(b) for b in bounds)})"
+        else:
+            start = self.evaluate_expression(node.start)
+            result, stats = solve(self, node.function, start, tolerance)
+            label = f"solve({node.function}, {self.format_number(start)})"
+        self.analysis_stats.append((label, stats))
+        return f"{label} = {self.format_value(result)}"
+
+    def format_number(self, value):
+        """Text of an argument as printed by print statements, integral floats without decimals."""
+        return str(int(value) if isinstance(value, float) and value % 1 == 0 else value)
+
+    def format_value(self, value):
+        """Text of a printed result, with the numbers of a gradient written like a single number."""
+        if isinstance(value, list):
+            return '[' + ', '.join(self.format_value(v) for v in value) + ']'
+        return str(value)
+
+    def vectorized_evaluator(self):
+        """Return the evaluator of the functions over NumPy arrays, created on first use."""
+        if self.vectorized is None:
+            self.vectorized = VectorizedEvaluator(self)
+        return self.vectorized
 
     def evaluate_expression(self, node, variable_values={}):
-        if node['type'] == 'Number':
-            return node['value']
-        elif node['type'] == 'Variable':
-            return variable_values.get(node['value'], node['value'])
-        elif node['type'] == 'BinaryExpression':
-            left = self.evaluate_expression(node['left'], variable_values)
-            right = self.evaluate_expression(node['right'], variable_values)
-            if node['operator'] == '+':
-                return left + right
-            elif node['operator'] == '-':
-                return left - right
-            elif node['operator'] == '*':
-                return left * right
-            elif node['operator'] == '/':
-                return left / right
-            elif node['operator'] == '^':
-                return left ** right
-        elif node['type'] == 'MathFunction':
-            argument = self.evaluate_expression(node['argument'], variable_values)
-            func_name = node['function']
-            if func_name == 'log':
-                base = self.evaluate_expression(node['base'], variable_values)
-                return math.log(argument, base)
-            if func_name in MATH_FUNCTIONS_MAP:
-                return MATH_FUNCTIONS_MAP[func_name](argument)
-            if func_name in TRIG_FUNCTIONS_MAP:
-                return TRIG_FUNCTIONS_MAP[func_name](argument)
-        elif node['type'] == 'Matrix':
-            return [[self.evaluate_expression(elem, variable_values) for elem in row] for row in node['elements']]
-        elif node['type'] == 'FunctionCall':
-            function_name = node['name']
-            arguments = [self.evaluate_expression(a, variable_values) for a in node['arguments']]
-            vars_, expression = self.functions[function_name]
-            env = {v: val for v, val in zip(vars_, arguments)}
-            return self.evaluate_expression(expression, env)
-        elif node['type'] == 'Factorial':
-            operand = self.evaluate_expression(node['operand'], variable_values)
-            if isinstance(operand, (int, float)):
-                return math.factorial(int(operand))
-            return f"{self.expression_to_string(node['operand'], variable_values)}!"
-        elif node['type'] == 'Derivative':
-            func_name = node['function']
-            arguments = [self.evaluate_expression(a, variable_values) for a in node['arguments']]
-            vars_, expr = self.functions[func_name]
-            if all(isinstance(a, (int, float)) for a in arguments):
-                h = 1e-6
-                grads = []
-                for i, var in enumerate(vars_):
-                    plus_args = arguments.copy()
-                    minus_args = arguments.copy()
-                    plus_args[i] += h
-                    minus_args[i] -= h
-                    try:
-                        plus = self.evaluate_expression(expr, {v: val for v, val in zip(vars_, plus_args)})
-                        minus = self.evaluate_expression(expr, {v: val for v, val in zip(vars_, minus_args)})
-                        diff = self.matrix_subtract(plus, minus)
-                        grads.append(self.matrix_scalar_divide(diff, 2*h))
-                    except Exception:
-                        plus = self.evaluate_expression(expr, {v: val for v, val in zip(vars_, plus_args)})
-                        base = self.evaluate_expression(expr, {v: val for v, val in zip(vars_, arguments)})
-                        diff = self.matrix_subtract(plus, base)
-                        grads.append(self.matrix_scalar_divide(diff, h))
-                return grads[0] if len(grads) == 1 else grads
-            arg_str = ', '.join(self.expression_to_string(a, variable_values) for a in node['arguments'])
-            return f"{func_name}'({arg_str})"
+        """Evaluate an expression without recursion, so its depth is only limited by memory."""
+        return self.evaluate_postorder(postorder(node), variable_values)
+
+    def evaluate_postorder(self, nodes, variable_values):
+        """Evaluate the nodes of an expression listed children first, on a stack of values.
+
+        Every node takes the values of its children from the top of the stack,
+        where they were left in order, and replaces them by its own value.
+        """
+        values = []
+        push = values.append
+        function_map = self.function_map
+        for node in nodes:
+            node_type = node.type
+            if node_type == 'Number':
+                push(node.value)
+            elif node_type == 'Variable':
+                push(variable_values.get(node.value, node.value))
+            elif node_type == 'BinaryExpression':
+                right = values.pop()
+                operation = BINARY_OPERATIONS.get(node.operator)
+                values[-1] = operation(values[-1], right) if operation else None
+            elif node_type == 'MathFunction':
+                func_name = node.function
+                if func_name == 'log':
+                    base = values.pop()
+                    values[-1] = self.numeric.log(values[-1], base)
+                elif func_name in function_map:
+                    values[-1] = function_map[func_name](values[-1])
+                else:
+                    values[-1] = None
+            elif node_type == 'FunctionCall':
+                arguments = pop_values(values, len(node.arguments))
+                push(self.call_function(node.name, arguments))
+            elif node_type == 'Derivative':
+                arguments = pop_values(values, len(node.arguments))
+                push(self.derivative_value(node, arguments, variable_values))
+            elif node_type == 'Matrix':
+                entries = iter(pop_values(values, sum(len(row) for row in node.elements)))
+                push(MatrixValue.from_rows([[next(entries) for _ in row] for row in node.elements]))
+            elif node_type == 'SparseMatrix':
+                entries = pop_values(values, len(node.entries))
+                push(SparseMatrixValue.from_entries(node.shape, node.rows, node.columns, entries))
+            elif node_type == 'Factorial':
+                operand = values[-1]
+                if isinstance(operand, self.number_types):
+                    values[-1] = self.numeric.factorial(operand)
+                else:
+                    values[-1] = f"{self.expression_to_string(node.operand, variable_values)}!"
+            else:
+                push(None)
+        return values[0]
+
+    def derivative_value(self, node, arguments, variable_values):
+        """Value of a Derivative node at evaluated arguments, or its text if they are not numbers."""
+        func_name = node.function
+        if all(isinstance(a, self.number_types) for a in arguments):
+            if node.variables is not None:
+                return self.evaluate_partial(func_name, tuple(node.variables), arguments)
+            return self.evaluate_derivative(func_name, arguments)
+        arg_str = ', '.join(self.expression_to_string(a, variable_values) for a in node.arguments)
+        return f"{func_name}'({arg_str})"
+
+    def evaluate_derivative(self, func_name, arguments):
+        """Evaluate the gradient of a function at numeric arguments."""
+        vars_, _ = self.functions[func_name]
+        try:
+            if self.derivative_strategy == 'symbolic':
+                # All components come out of one call to the compiled gradient
+                return self.derivative_function(func_name, None)(*arguments)
+            if self.derivative_strategy == 'forward':
+                return self.forward.gradient(func_name, arguments)
+        except (NotDifferentiableError, ArithmeticError, ValueError, RecursionError):
+            # Fall back to finite differences where the exact derivative is undefined, or the
+            # function is nested too deeply for the recursive differentiator
+            pass
+        grads = [self.finite_difference(func_name, (var,), arguments) for var in vars_]
+        return grads[0] if len(grads) == 1 else grads
+
+    def evaluate_partial(self, func_name, variables, arguments):
+        """Evaluate the partial derivative of a function along a sequence of variables."""
+        try:
+            if self.derivative_strategy == 'symbolic':
+                return self.derivative_function(func_name, variables)(*arguments)
+            if self.derivative_strategy == 'forward':
+                return self.forward.evaluate_partial(func_name, variables, arguments)
+        except (NotDifferentiableError, ArithmeticError, ValueError, RecursionError):
+            pass
+        return self.finite_difference(func_name, variables, arguments)
+
+    def derivative_function(self, func_name, variables):
+        """Return a cached callable evaluating an exact partial derivative, or the gradient for None."""
+        functions = self.derivative_functions.setdefault(func_name, {})
+        if variables not in functions:
+            vars_, _ = self.functions[func_name]
+            if variables is None and len(vars_) == 1:
+                tree = self.differentiator.partial(func_name, tuple(vars_))
+            elif variables is None:
+                tree = [self.differentiator.partial(func_name, (var,)) for var in vars_]
+            else:
+                tree = self.differentiator.partial(func_name, variables)
+            if self.numeric.exact:
+                # Constants of the derivative are floats, which must not mix with decimals
+                tree = self.numeric.convert_tree(tree)
+            if self.optimizer:
+                tree = [self.optimizer.optimize_expression(t) for t in tree] if isinstance(tree, list) \
+                    else self.optimizer.optimize_expression(tree)
+            if self.compile:
+                function = self.compiler.compile_or_fallback_definition(func_name, vars_, tree)
+                if self.profiler and is_compiled(function):
+                    function = self.profiler.count_nodes(tree, function)
+                functions[variables] = function
+            else:
+                functions[variables] = self.tree_walker(tree, vars_)
+        return functions[variables]
+
+    def tree_walker(self, tree, function_variables):
+        """Return a callable evaluating an expression, or each of a list of expressions, by walking the tree."""
+        if isinstance(tree, list):
+            walkers = [self.tree_walker(t, function_variables) for t in tree]
+            return lambda *arguments: [walker(*arguments) for walker in walkers]
+        nodes = postorder(tree)
+        return lambda *arguments: self.evaluate_postorder(nodes, dict(zip(function_variables, arguments)))
+
+    def finite_difference(self, func_name, variables, arguments):
+        """Evaluate a partial derivative with central differences."""
+        if not variables:
+            return self.call_function(func_name, list(arguments))
+        vars_, _ = self.functions[func_name]
+        i = vars_.index(variables[-1])
+        h = self.numeric.step
+        plus_args = list(arguments)
+        minus_args = list(arguments)
+        plus_args[i] += h
+        minus_args[i] -= h
+        try:
+            plus = self.finite_difference(func_name, variables[:-1], plus_args)
+            minus = self.finite_difference(func_name, variables[:-1], minus_args)
+            return (plus - minus) / (2*h)
+        except (ArithmeticError, ValueError, TypeError, InvalidOperandError):
+            pass
+        # Forward differences, where the function is only defined on one side of the argument
+        try:
+            plus = self.finite_difference(func_name, variables[:-1], plus_args)
+            base = self.finite_difference(func_name, variables[:-1], arguments)
+            return (plus - base) / h
+        except (ArithmeticError, ValueError, TypeError, InvalidOperandError) as e:
+            raise NotDifferentiableError(f"{func_name} at {', '.join(self.format_number(a) for a in arguments)}",
+                                         f"finite differences cannot be evaluated ({getattr(e, 'message', e)})")
 
     def get_function_string(self, function_name, arguments):
-        vars_, expression = self.functions[function_name]
+        vars_, _ = self.functions[function_name]
+        expression = self.definitions[function_name]
         if arguments == vars_:
             return self.expression_to_string(expression)
         else:
@@ -147,48 +479,40 @@ class Interpreter:
             return self.expression_to_string(expression, env)
 
     def expression_to_string(self, expression, variable_values={}):
-        if expression['type'] == 'Number':
-            if expression['value'] % 1 == 0:
-                return str(int(expression['value']))
-            return str(expression['value'])
-        elif expression['type'] == 'Variable':
-            return str(variable_values.get(expression['value'], expression['value']))
-        elif expression['type'] == 'BinaryExpression':
-            left = self.expression_to_string(expression['left'], variable_values)
-            right = self.expression_to_string(expression['right'], variable_values)
-            return f"{left} {expression['operator']} {right}"
-        elif expression['type'] == 'MathFunction':
-            if expression['function'] == 'log':
-                base = self.expression_to_string(expression['base'], variable_values)
-                arg = self.expression_to_string(expression['argument'], variable_values)
+        return fold(expression, lambda node, children: self.node_to_string(node, children, variable_values))
+
+    def node_to_string(self, expression, children, variable_values):
+        """Text of a node, given the text of its children in the order of `child_nodes`."""
+        if expression.type == 'Number':
+            if expression.value % 1 == 0:
+                return str(int(expression.value))
+            return str(expression.value)
+        elif expression.type == 'Variable':
+            return str(variable_values.get(expression.value, expression.value))
+        elif expression.type == 'BinaryExpression':
+            left, right = children
+            return f"{left} {expression.operator} {right}"
+        elif expression.type == 'MathFunction':
+            if expression.function == 'log':
+                arg, base = children
                 return f"log({base}, {arg})"
-            elif expression['function'] in MATH_FUNCTIONS_MAP or expression['function'] in TRIG_FUNCTIONS_MAP:
-                arg = self.expression_to_string(expression['argument'], variable_values)
-                return f"{expression['function']}({arg})"
-        elif expression['type'] == 'Derivative':
-            function = expression['function']
-            args = ', '.join(self.expression_to_string(a, variable_values) for a in expression['arguments'])
-            return f"{function}'({args})"
-        elif expression['type'] == 'FunctionCall':
-            args = ', '.join(self.expression_to_string(a, variable_values) for a in expression['arguments'])
-            return f"{expression['name']}({args})"
-        elif expression['type'] == 'Factorial':
-            operand = self.expression_to_string(expression['operand'], variable_values)
-            return f"{operand}!"
-        elif expression['type'] == 'Matrix':
-            rows = []
-            for row in expression['elements']:
-                row_str = ', '.join(self.expression_to_string(e, variable_values) for e in row)
-                rows.append(f"[{row_str}]")
+            elif expression.function in self.function_map:
+                return f"{expression.function}({children[0]})"
+        elif expression.type == 'Derivative':
+            function = expression.function
+            if expression.variables is not None:
+                function += '[' + ''.join(expression.variables) + ']'
+            return f"{function}'({', '.join(children)})"
+        elif expression.type == 'FunctionCall':
+            return f"{expression.name}({', '.join(children)})"
+        elif expression.type == 'Factorial':
+            return f"{children[0]}!"
+        elif expression.type == 'Matrix':
+            entries = iter(children)
+            rows = ['[' + ', '.join(next(entries) for _ in row) + ']' for row in expression.elements]
             return '[' + ', '.join(rows) + ']'
-
-    def matrix_subtract(self, a, b):
-        if isinstance(a, list):
-            return [self.matrix_subtract(x, y) for x, y in zip(a, b)]
-        return a - b
-
-    def matrix_scalar_divide(self, a, scalar):
-        if isinstance(a, list):
-            return [self.matrix_scalar_divide(x, scalar) for x in a]
-        return a / scalar
-
+        elif expression.type == 'SparseMatrix':
+            rows = [['0'] * expression.shape[1] for _ in range(expression.shape[0])]
+            for i, j, entry in zip(expression.rows, expression.columns, children):
+                rows[i][j] = entry
+            return '[' + ', '.join('[' + ', '.join(row) + ']' for row in rows) + ']'
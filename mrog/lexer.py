@@ -4,141 +4,98 @@ from .symbols import TRIG_FUNCTIONS, MATH_FUNCTIONS, BUILTIN_FUNCTIONS, SYMBOLS
 from .token import Token, TokenType
 from .exceptions import UnknownSymbolError
 
+# One master pattern for every token kind. Leading whitespace is consumed by the
+# same match, and any other character falls through to the error group.
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+          (?P<number>\d+(?:\.\d*)?)
+        | (?P<alpha>[^\W\d_]+)
+        | (?P<symbol>[""" + ''.join(re.escape(symbol) for symbol in SYMBOLS) + r"""])
+        | (?P<comment>\#[^\n]*)
+        | (?P<error>.)
+    )
+""", re.VERBOSE)
+NUMBER, ALPHA, SYMBOL, COMMENT, ERROR = range(1, 6)
+
+# Token types of the reserved words, anything else alphabetic is an identifier
+KEYWORDS = {
+    **{name: TokenType.TRIG_FUNCTION for name in TRIG_FUNCTIONS},
+    **{name: TokenType.MATH_FUNCTION for name in MATH_FUNCTIONS},
+    **BUILTIN_FUNCTIONS,
+}
+
 class Lexer:
-    """Lexer class for tokenizing input text."""
-    def __init__(self, text):
-        # Input text
-        self.text = text
+    """Lexer class for tokenizing input text.
+
+    The input is either a string or an iterable of lines, such as an open file,
+    which is then scanned one line at a time without being read into memory.
+    """
+    def __init__(self, text, number=float):
+        # Value of a number literal from its text, float unless running exact arithmetic
+        self.number = number
+        if isinstance(text, str):
+            # Input text
+            self.text = text
+            self.lines = None
+        else:
+            # Line being scanned, taken from the remaining lines as the tokens are consumed
+            self.text = ''
+            self.lines = text
         # Current position in the input text
         self.pos = 0
-        # Current character in the input text
-        self.current_char = self.text[self.pos] if self.text else None
+        # Token stream consumed by get_next_token
+        self.tokens = None
 
+    @property
+    def current_char(self):
+        """Current character in the input text."""
+        return self.text[self.pos] if self.pos < len(self.text) else None
 
     def error(self):
         """Raise an error if an unknown character is encountered."""
         raise UnknownSymbolError(self.current_char)
-    
-
-    def advance(self):
-        """Advance the 'pos' pointer and set 'current_char'."""
-        self.pos += 1
-        if self.pos < len(self.text):
-            # Set the current character to the next character in the input text
-            self.current_char = self.text[self.pos]
-        else:
-            # End of input text
-            self.current_char = None
-
-    """ UNUSED CODE
-    def peek(self):
-        # Peek at the next character without advancing the pointer
-        peek_pos = self.pos + 1
-        if peek_pos < len(self.text):
-            # Return the next character in the input text
-            return self.text[peek_pos]
-        else:
-            return None
-    """
-    
-    def skip_whitespace(self):
-        """Skip whitespace characters in the input text."""
-        while self.current_char is not None and self.current_char.isspace():
-            self.advance()
-
-    def number(self):
-        """Return a number token."""
-        result = ''
 
-        # Parse the integer part of the number
-        while self.current_char is not None and self.current_char.isdigit():
-            result += self.current_char
-            self.advance()
-        
-        # Check if the number has a fractional part
-        if self.current_char == '.':
-            result += self.current_char
-            self.advance()
+    def tokenize(self):
+        """Generate the tokens from the current position up to and including EOF.
 
-            # Parse the fractional part of the number
-            while self.current_char is not None and self.current_char.isdigit():
-                result += self.current_char
-                self.advance()
-
-        # Return the number token
-        return Token(TokenType.NUMBER, float(result))
-    
-
-    def variable(self):
-        """Return a variable token."""
-        token_type = TokenType.VARIABLE
-        char = self.current_char
-        self.advance()
-        return Token(token_type, char)
-    
-    def symbol(self):
-        """Return a symbol token."""
-        
-        # Map the current character to its corresponding symbol in the symbol table.
-        token_type = SYMBOLS[self.current_char]
-        char = self.current_char
-        self.advance()
-        return Token(token_type, char)
-
-    def alpha(self):
-        """Handle identifiers, trigonometric functions, and variables."""
-        result = ''
-
-        # Parse the identifiers
-        while self.current_char is not None and self.current_char.isalpha():
-            result += self.current_char
-            self.advance()
-        
-        # Check the type of identifier and return the token from the respective table
-        # a trigonometric function
-        if result in TRIG_FUNCTIONS:
-            return Token(TokenType.TRIG_FUNCTION, result)
-        # a math function
-        elif result in MATH_FUNCTIONS:
-            return Token(TokenType.MATH_FUNCTION, result)
-        # a built-in function
-        elif result in BUILTIN_FUNCTIONS:
-            return Token(BUILTIN_FUNCTIONS[result], result)
-        # neither of the above, so it is an identifier
+        The input is scanned with a single compiled pattern, so a token costs one
+        regular expression match instead of a method call per character.
+        """
+        # Word and symbol tokens are never modified, so each distinct one is built once
+        cache = {value: Token(token_type, value) for value, token_type in SYMBOLS.items()}
+        if self.lines is None:
+            yield from self.scan(cache)
         else:
-            return Token(TokenType.IDENTIFIER, result)
-    
+            # No token spans a line break, so every line is scanned on its own
+            for line in self.lines:
+                self.text = line
+                self.pos = 0
+                yield from self.scan(cache)
+        # End of file reached, return the EOF token
+        yield Token(TokenType.EOF, None)
+
+    def scan(self, cache):
+        """Generate the tokens of the text from the current position."""
+        number, identifier, convert = TokenType.NUMBER, TokenType.IDENTIFIER, self.number
+        for m in TOKEN_PATTERN.finditer(self.text, self.pos):
+            kind = m.lastindex
+            self.pos = m.end()
+            if kind == NUMBER:
+                yield Token(number, convert(m.group(NUMBER)))
+            elif kind == ALPHA or kind == SYMBOL:
+                value = m.group(kind)
+                token = cache.get(value)
+                if token is None:
+                    token = cache[value] = Token(KEYWORDS.get(value, identifier), value)
+                yield token
+            elif kind == ERROR:
+                self.pos = m.start(ERROR)
+                self.error()
+        self.pos = len(self.text)
 
     def get_next_token(self):
         """Lexical analyzer (also known as scanner or tokenizer)."""
-
-        # Loop through the input text until the end is reached
-        while self.current_char is not None:
-            # Skip whitespace characters
-            if self.current_char.isspace():
-                self.skip_whitespace()
-                continue
-
-            # Check if the current character is a digit
-            if self.current_char.isdigit():
-                return self.number()
-            
-            # Check if the current character is a letter
-            if self.current_char.isalpha():
-                return self.alpha()
-            
-            # Check if the current character is a symbol (operator, parenthesis, etc.)
-            if self.current_char in SYMBOLS:
-                return self.symbol()
-            
-            # Check if the current character is a variable
-            if self.current_char == '#':
-                self.advance()
-                while self.current_char is not None and self.current_char != '\n':
-                    self.advance()
-                continue
-
-            self.error()
-        # End of file reached, return the EOF token
-        return Token(TokenType.EOF, None)
-
+        if self.tokens is None:
+            self.tokens = self.tokenize()
+        # Keep returning EOF once the input is exhausted
+        return next(self.tokens, None) or Token(TokenType.EOF, None)
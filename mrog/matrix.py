@@ -0,0 +1,361 @@
+import math
+
+import numpy as np
+
+from .exceptions import InvalidMatrixOperationError
+
+
+class MatrixValue:
+    """The value of a matrix, with its entries in a contiguous ndarray.
+
+    The array has shape (rows, columns), followed by the shape of the points
+    when the vectorized backend evaluates a matrix at many points at once.
+    `*` is the matrix product of two matrices and scales a matrix by a scalar;
+    `+`, `-`, `/` and `^` apply entry by entry, broadcasting scalars. Entries
+    that are not numbers, such as dual numbers, are kept in an object array.
+    """
+    __slots__ = ('array',)
+
+    def __init__(self, array):
+        self.array = array
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a matrix from a list of rows of entries."""
+        try:
+            return cls(np.array(rows, dtype=float))
+        except (TypeError, ValueError):
+            pass
+        entries = [e for row in rows for e in row]
+        if all(isinstance(e, (int, float, np.ndarray)) for e in entries):
+            # Entries evaluated at many points are stacked in front of the point axes
+            entries = np.broadcast_arrays(*[np.asarray(e, dtype=float) for e in entries])
+            return cls(np.stack(entries).reshape((len(rows), len(rows[0])) + entries[0].shape))
+        array = np.empty((len(rows), len(rows[0])), dtype=object)
+        for i, row in enumerate(rows):
+            for j, entry in enumerate(row):
+                array[i, j] = entry
+        return cls(array)
+
+    @classmethod
+    def wrap(cls, array):
+        """Wrap the result of an operation, as floats whenever every entry is a number."""
+        if array.dtype == object:
+            try:
+                array = array.astype(float)
+            except (TypeError, ValueError):
+                pass
+        return cls(array)
+
+    @property
+    def shape(self):
+        return self.array.shape[:2]
+
+    def tolist(self):
+        return self.array.tolist()
+
+    def __str__(self):
+        return str(self.tolist())
+
+    __repr__ = __str__
+
+    def __eq__(self, other):
+        if isinstance(other, MatrixValue):
+            other = other.tolist()
+        return self.tolist() == other
+
+    __hash__ = None
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array if dtype is None else self.array.astype(dtype)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        """Apply NumPy ufuncs entry by entry, so NumPy arrays of points broadcast like scalars."""
+        if method != '__call__' or 'out' in kwargs:
+            return NotImplemented
+        arrays = [i.array if isinstance(i, MatrixValue) else i for i in inputs]
+        return MatrixValue.wrap(ufunc(*arrays, **kwargs))
+
+    def elementwise(self, operation, other, symbol):
+        other = other.array if isinstance(other, MatrixValue) else other
+        try:
+            return MatrixValue.wrap(operation(self.array, other))
+        except ValueError:
+            raise InvalidMatrixOperationError(f"cannot apply {symbol} to shapes {self.array.shape} "
+                                              f"and {np.shape(other)}")
+
+    def __add__(self, other):
+        return self.elementwise(np.add, other, '+')
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self.elementwise(np.subtract, other, '-')
+
+    def __rsub__(self, other):
+        return self.elementwise(lambda a, b: np.subtract(b, a), other, '-')
+
+    def __mul__(self, other):
+        if isinstance(other, MatrixValue):
+            return self.matmul(other)
+        return self.elementwise(np.multiply, other, '*')
+
+    def __rmul__(self, other):
+        return self.elementwise(np.multiply, other, '*')
+
+    def __truediv__(self, other):
+        return self.elementwise(np.true_divide, other, '/')
+
+    def __rtruediv__(self, other):
+        return self.elementwise(lambda a, b: np.true_divide(b, a), other, '/')
+
+    def __pow__(self, other):
+        return self.elementwise(np.power, other, '^')
+
+    def __rpow__(self, other):
+        return self.elementwise(lambda a, b: np.power(b, a), other, '^')
+
+    def __neg__(self):
+        return MatrixValue(-self.array)
+
+    def multiply(self, other):
+        """Entry-by-entry product, as used by derivatives of entry-by-entry operations."""
+        return self.elementwise(np.multiply, other, '*')
+
+    def matmul(self, other):
+        """Matrix product, taken separately at every point when the matrices carry point axes."""
+        if isinstance(other, SparseMatrixValue):
+            return other.rmatmul(self)
+        a, b = self.array, other.array
+        if a.shape[1] != b.shape[0]:
+            raise InvalidMatrixOperationError(f"cannot multiply a {a.shape[0]}x{a.shape[1]} matrix "
+                                              f"by a {b.shape[0]}x{b.shape[1]} matrix")
+        if a.ndim == 2 and b.ndim == 2:
+            return MatrixValue.wrap(a @ b)
+        # Move the point axes in front, where np.matmul broadcasts over them
+        a = np.moveaxis(a, (0, 1), (-2, -1)) if a.ndim > 2 else a
+        b = np.moveaxis(b, (0, 1), (-2, -1)) if b.ndim > 2 else b
+        return MatrixValue.wrap(np.moveaxis(np.matmul(a, b), (-2, -1), (0, 1)))
+
+    def apply(self, function, ufunc=None):
+        """Apply a scalar function to every entry, through its ufunc when the entries are numbers."""
+        if ufunc is not None and self.array.dtype != object:
+            with np.errstate(divide='raise', invalid='raise', over='raise'):
+                return MatrixValue(ufunc(self.array))
+        return MatrixValue.wrap(np.frompyfunc(function, 1, 1)(self.array))
+
+
+def keeps_zero(value):
+    """Check whether multiplying 0 by a scalar, or by every entry of an array of them, gives 0."""
+    if isinstance(value, (int, float)):
+        return math.isfinite(value)
+    return isinstance(value, np.ndarray) and value.dtype != object and bool(np.isfinite(value).all())
+
+
+def point_axes(array, entry_axes, count):
+    """Pad the point axes of an array, after its first `entry_axes` axes, to `count` axes aligned on the right."""
+    shape = array.shape
+    return array.reshape(shape[:entry_axes] + (1,) * (count - len(shape) + entry_axes) + shape[entry_axes:])
+
+
+class SparseMatrixValue(MatrixValue):
+    """The value of a matrix of mostly 0 entries, storing only the others in coordinate (COO) form.
+
+    Stored entry k is `data[k]`, at row `rows[k]` and column `columns[k]`,
+    every position being stored once, and `data` has the shape of the points
+    after its first axis when the vectorized backend evaluates a matrix at
+    many points at once. Products with matrices and scalars, sums of sparse
+    matrices, entry-by-entry products and functions that map 0 to 0 only
+    compute the stored entries. Every other operation, and printing, uses
+    `array`, the dense entries, built when first needed.
+    """
+    __slots__ = ('dimensions', 'rows', 'columns', 'data', 'dense')
+
+    def __init__(self, dimensions, rows, columns, data):
+        self.dimensions = dimensions
+        self.rows = rows
+        self.columns = columns
+        self.data = data
+        self.dense = None
+
+    def __reduce__(self):
+        # Pickle the stored entries only, since `array` is built from them
+        return SparseMatrixValue, (self.dimensions, self.rows, self.columns, self.data)
+
+    @classmethod
+    def from_entries(cls, shape, rows, columns, entries):
+        """Build a matrix of a shape from the values of its stored entries and their positions."""
+        try:
+            data = np.array(entries, dtype=float)
+        except (TypeError, ValueError):
+            if all(isinstance(e, (int, float, np.ndarray)) for e in entries):
+                # Entries evaluated at many points are stacked in front of the point axes
+                data = np.stack(np.broadcast_arrays(*[np.asarray(e, dtype=float) for e in entries]))
+            else:
+                data = np.empty(len(entries), dtype=object)
+                for k, entry in enumerate(entries):
+                    data[k] = entry
+        return cls(tuple(shape), np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp), data)
+
+    def with_data(self, data):
+        """Return a matrix with the same stored positions and other values, as floats whenever they are numbers."""
+        if data.dtype == object:
+            try:
+                data = data.astype(float)
+            except (TypeError, ValueError):
+                pass
+        return SparseMatrixValue(self.dimensions, self.rows, self.columns, data)
+
+    @property
+    def array(self):
+        if self.dense is None:
+            if self.data.dtype == object:
+                dense = np.full(self.dimensions + self.data.shape[1:], 0.0, dtype=object)
+            else:
+                dense = np.zeros(self.dimensions + self.data.shape[1:], dtype=self.data.dtype)
+            dense[self.rows, self.columns] = self.data
+            self.dense = dense
+        return self.dense
+
+    @property
+    def shape(self):
+        return self.dimensions
+
+    def scales(self, other):
+        """Check whether an operation with a scalar, or an array of points, may apply to the stored entries only."""
+        # The dense entries broadcast with an array like the stored ones when it has at most as many axes as the points
+        return keeps_zero(other) and np.ndim(other) < self.data.ndim
+
+    def __add__(self, other):
+        if isinstance(other, SparseMatrixValue) and other.dimensions == self.dimensions:
+            return self.combine(other.data, other.rows, other.columns)
+        return super().__add__(other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, SparseMatrixValue) and other.dimensions == self.dimensions:
+            return self.combine(0.0 - other.data, other.rows, other.columns)
+        return super().__sub__(other)
+
+    def combine(self, data, rows, columns):
+        """Sum with the stored entries of another matrix of the same shape, adding those stored at the same position."""
+        count = max(self.data.ndim, data.ndim) - 1
+        left, right = point_axes(self.data, 1, count), point_axes(data, 1, count)
+        points = np.broadcast_shapes(left.shape[1:], right.shape[1:])
+        data = np.concatenate([np.broadcast_to(left, left.shape[:1] + points),
+                               np.broadcast_to(right, right.shape[:1] + points)])
+        keys = np.concatenate([self.rows, rows]) * self.dimensions[1] + np.concatenate([self.columns, columns])
+        keys, positions = np.unique(keys, return_inverse=True)
+        summed = np.zeros((len(keys),) + points, dtype=data.dtype)
+        np.add.at(summed, positions, data)
+        return SparseMatrixValue(self.dimensions, keys // self.dimensions[1], keys % self.dimensions[1], summed)
+
+    def __mul__(self, other):
+        if isinstance(other, MatrixValue):
+            return self.matmul(other)
+        if self.scales(other):
+            return self.with_data(self.data * other)
+        return super().__mul__(other)
+
+    def __rmul__(self, other):
+        # Python tries this before the product of a dense matrix, the subclass being on the right
+        if isinstance(other, MatrixValue):
+            return self.rmatmul(other)
+        if self.scales(other):
+            return self.with_data(other * self.data)
+        return super().__rmul__(other)
+
+    def __truediv__(self, other):
+        if self.scales(other) and np.all(np.asarray(other) != 0):
+            return self.with_data(self.data / other)
+        return super().__truediv__(other)
+
+    def __neg__(self):
+        return self.with_data(-self.data)
+
+    def multiply(self, other):
+        """Entry-by-entry product, reading the entries of the other matrix at the stored positions only."""
+        if not isinstance(other, MatrixValue):
+            return self * other
+        b = other.array
+        if b.shape[:2] == self.dimensions and b.ndim - 1 == self.data.ndim and keeps_zero(b):
+            return self.with_data(self.data * b[self.rows, self.columns])
+        return super().multiply(other)
+
+    def matmul(self, other):
+        """Matrix product, summing the products of the stored entries by the rows of the other matrix."""
+        (rows, inner), (other_inner, columns) = self.dimensions, other.shape
+        if inner != other_inner:
+            raise InvalidMatrixOperationError(f"cannot multiply a {rows}x{inner} matrix "
+                                              f"by a {other_inner}x{columns} matrix")
+        b = other.array
+        count = max(self.data.ndim - 1, b.ndim - 2)
+        products = point_axes(self.data[:, None], 2, count) * point_axes(b[self.columns], 2, count)
+        result = np.zeros((rows, columns) + products.shape[2:], dtype=products.dtype)
+        np.add.at(result, self.rows, products)
+        return MatrixValue.wrap(result)
+
+    def rmatmul(self, other):
+        """Matrix product of another matrix by this one, summing the products of its columns by the stored entries."""
+        (rows, inner), (other_inner, columns) = other.shape, self.dimensions
+        if inner != other_inner:
+            raise InvalidMatrixOperationError(f"cannot multiply a {rows}x{inner} matrix "
+                                              f"by a {other_inner}x{columns} matrix")
+        a = other.array
+        count = max(a.ndim - 2, self.data.ndim - 1)
+        products = point_axes(a[:, self.rows], 2, count) * point_axes(self.data[None], 2, count)
+        result = np.zeros((rows, columns) + products.shape[2:], dtype=products.dtype)
+        np.add.at(result, (slice(None), self.columns), products)
+        return MatrixValue.wrap(result)
+
+    def apply(self, function, ufunc=None):
+        """Apply a scalar function to every entry, computing the stored entries only when it maps 0 to 0."""
+        try:
+            zero = function(0.0)
+        except (ArithmeticError, ValueError, TypeError):
+            zero = None
+        if zero is None or zero != 0:
+            return super().apply(function, ufunc)
+        if ufunc is not None and self.data.dtype != object:
+            with np.errstate(divide='raise', invalid='raise', over='raise'):
+                return SparseMatrixValue(self.dimensions, self.rows, self.columns, ufunc(self.data))
+        return self.with_data(np.frompyfunc(function, 1, 1)(self.data))
+
+
+def elementwise(function, ufunc=None):
+    """Extend a scalar function to apply to every entry of a matrix argument."""
+    def apply(argument):
+        try:
+            return function(argument)
+        except TypeError:
+            if isinstance(argument, MatrixValue):
+                return argument.apply(function, ufunc)
+            raise
+    apply.__name__ = getattr(function, '__name__', 'apply')
+    # Used directly where the argument is known not to be a matrix
+    apply.scalar = function
+    return apply
+
+
+def multiply(left, right):
+    """Entry-by-entry product of matrices, or the ordinary product of scalars."""
+    if isinstance(right, SparseMatrixValue):
+        return right.multiply(left)
+    if isinstance(left, MatrixValue):
+        return left.multiply(right)
+    if isinstance(right, MatrixValue):
+        return right.multiply(left)
+    return left * right
+
+
+_ln = elementwise(math.log, np.log)
+
+
+def log(argument, base):
+    """Logarithm in a given base, matching `math.log(argument, base)` entry by entry."""
+    if isinstance(argument, MatrixValue) or isinstance(base, MatrixValue):
+        return _ln(argument) / _ln(base)
+    return math.log(argument, base)
+
+log.scalar = math.log
@@ -1,18 +1,94 @@
 # mrog/mrog.py
 import argparse
+import contextlib
+import sys
+
+import numpy as np
 
 from mrog.lexer import Lexer
 from mrog.parser import Parser
 from mrog.semantic import SemanticAnalyzer
-from mrog.interpreter import Interpreter
+from mrog.interpreter import Interpreter, DERIVATIVE_STRATEGIES
+from mrog.parallel import ParallelExecutor
+from mrog import programcache
+from mrog.profiler import Profiler
+from mrog.optimizer import INLINE_THRESHOLD
+from mrog.numeric import NUMERIC_MODES, DEFAULT_PRECISION
+from mrog.session import STATEMENT_ERRORS
+from mrog import approximation
 from mrog.exceptions import *
 
-def main():
-    parser = argparse.ArgumentParser(description="Process .mg files with the mrog lexer.")
-    parser.add_argument("filename", help="The .mg file to process")
-    
-    args = parser.parse_args()
-    
+def evaluate_grid(interpreter, function_name, grid_specifications, output):
+    """Evaluate a function over a grid of points and print or save the results."""
+    from mrog.vectorize import VectorizedEvaluator, parse_grid, write_grid
+
+    if function_name not in interpreter.functions:
+        print(f"Error: Function {function_name} is not defined.")
+        return
+    function_variables, _ = interpreter.functions[function_name]
+    mesh, values = VectorizedEvaluator(interpreter).evaluate_grid(function_name, parse_grid(grid_specifications))
+    if output and output.endswith('.npy'):
+        np.save(output, values)
+    elif output:
+        with open(output, 'w') as file:
+            write_grid(file, function_name, function_variables, mesh, values)
+    else:
+        write_grid(sys.stdout, function_name, function_variables, mesh, values)
+
+def print_disassembly(interpreter, function_name):
+    """Print the bytecode listing of a function, assembling it if it is not run as bytecode."""
+    from mrog.bytecode import BytecodeCompiler
+
+    if function_name not in interpreter.functions:
+        print(f"Error: Function {function_name} is not defined.")
+        return
+    function_variables, expression = interpreter.functions[function_name]
+    compiler = interpreter.compiler
+    if not isinstance(compiler, BytecodeCompiler):
+        compiler = BytecodeCompiler(interpreter, compiler.function_map)
+    try:
+        print(compiler.assemble(function_name, function_variables, expression).disassemble())
+    except CompilationError as e:
+        print(e)
+
+def load_program(filename, source, cache=True, profiler=None, number=float):
+    """Return the analyzer of a program, served from its __mrogcache__ entry when caching.
+
+    Only programs read with float literals are cached.
+    """
+    if cache and number is float:
+        return programcache.analyze(filename, source, profiler)
+    analyzer = SemanticAnalyzer(Parser(Lexer(source, number)))
+    return profiler.instrument(analyzer) if profiler else analyzer
+
+def report_profile(args, profiler):
+    """Print the profile to stderr and write it as JSON to --profile-output."""
+    if args.profile:
+        print(profiler.format_report(), file=sys.stderr)
+    if args.profile_output:
+        with open(args.profile_output, 'w') as file:
+            file.write(profiler.to_json() + '\n')
+
+def batch(argv):
+    """Evaluate a function of a .mg file at every point of a CSV or .npy input file."""
+    from mrog.batch import evaluate_file, DEFAULT_CHUNK_SIZE
+
+    parser = argparse.ArgumentParser(prog="mrog batch",
+                                     description="Evaluate a function over the points of a CSV or .npy file.")
+    parser.add_argument("filename", help="The .mg file defining the function")
+    parser.add_argument("function", help="The function to evaluate")
+    parser.add_argument("input", help="CSV file with one point per row, optionally with a header naming "
+                                      "the variables, or .npy file of shape (points, variables)")
+    parser.add_argument("-o", "--output",
+                        help="Write the results to a .csv or .npy file instead of printing them as CSV")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Number of points read and evaluated at a time (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--derivative", choices=DERIVATIVE_STRATEGIES, default='symbolic',
+                        help="How f'(...) is evaluated (default: symbolic)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Neither read nor write the parsed program in {programcache.CACHE_DIRECTORY}")
+    args = parser.parse_args(argv)
+
     try:
         with open(args.filename, 'r') as file:
             input_text = file.read()
@@ -20,24 +96,318 @@ def main():
         print(f"Error: File {args.filename} not found.")
         return
 
+    try:
+        interpreter = Interpreter(load_program(args.filename, input_text, not args.no_cache),
+                                  derivative_strategy=args.derivative)
+        # Output of the script itself must not mix with the results
+        with contextlib.redirect_stdout(sys.stderr):
+            interpreter.interpret()
+        if args.function not in interpreter.functions:
+            print(f"Error: Function {args.function} is not defined.")
+            return
+        evaluate_file(interpreter, args.function, args.input, args.output or sys.stdout, args.chunk_size)
+    except FileNotFoundError as e:
+        print(f"Error: File {e.filename} not found.")
+    except (*STATEMENT_ERRORS, InvalidInputError) as e:
+        print(e)
+
+def sample(argv):
+    """Sample a function of a .mg file adaptively, with more points where linear interpolation needs them."""
+    from mrog.sampling import AdaptiveSampler, write_samples, DEFAULT_TOLERANCE, MAX_POINTS, MAX_DEPTH
+    from mrog.vectorize import parse_grid
+
+    parser = argparse.ArgumentParser(prog="mrog sample",
+                                     description="Sample a function of one or two variables adaptively.")
+    parser.add_argument("filename", help="The .mg file defining the function")
+    parser.add_argument("function", help="The function to sample")
+    parser.add_argument("--grid", action="append", default=[], required=True, metavar="VAR=START:STOP:NUM",
+                        help="Range of a variable and number of initial points, repeated for f(x, y)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Largest error of linear interpolation between the samples, relative to the range "
+                             f"of the function when it exceeds 1 (default: {DEFAULT_TOLERANCE})")
+    parser.add_argument("--max-points", type=int, default=MAX_POINTS,
+                        help=f"Most points sampled (default: {MAX_POINTS})")
+    parser.add_argument("--max-depth", type=int, default=MAX_DEPTH,
+                        help=f"Times an initial interval or cell may be halved (default: {MAX_DEPTH})")
+    parser.add_argument("--no-curvature", action="store_true",
+                        help="Refine only where the measured interpolation error is high, "
+                             "without evaluating second derivatives")
+    parser.add_argument("-o", "--output",
+                        help="Write the samples to a .csv or .npy file instead of printing them as CSV")
+    parser.add_argument("--stats", action="store_true",
+                        help="Report the evaluations made and the points of a uniform grid as fine on stderr")
+    parser.add_argument("--derivative", choices=DERIVATIVE_STRATEGIES, default='symbolic',
+                        help="How second derivatives are evaluated (default: symbolic)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Neither read nor write the parsed program in {programcache.CACHE_DIRECTORY}")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.filename, 'r') as file:
+            input_text = file.read()
+    except FileNotFoundError:
+        print(f"Error: File {args.filename} not found.")
+        return
 
+    try:
+        interpreter = Interpreter(load_program(args.filename, input_text, not args.no_cache),
+                                  derivative_strategy=args.derivative)
+        # Output of the script itself must not mix with the samples
+        with contextlib.redirect_stdout(sys.stderr):
+            interpreter.interpret()
+        if args.function not in interpreter.functions:
+            print(f"Error: Function {args.function} is not defined.")
+            return
+        sampler = AdaptiveSampler(interpreter, args.function, args.tolerance, args.max_points, args.max_depth,
+                                  curvature=not args.no_curvature)
+        points, values = sampler.sample(parse_grid(args.grid))
+        function_variables, _ = interpreter.functions[args.function]
+        write_samples(args.output or sys.stdout, args.function, function_variables, points, values)
+        if args.stats:
+            stats = sampler.stats
+            print(f"{len(values)} points: {stats['evaluations']} evaluations, {stats['derivative_evaluations']} "
+                  f"derivative evaluations in {stats['rounds']} rounds, {stats['uniform_points']} points "
+                  f"on a uniform grid as fine", file=sys.stderr)
+    except (*STATEMENT_ERRORS, InvalidGridError) as e:
+        print(e)
+
+def serve(argv):
+    """Answer define and evaluate requests on a local socket, keeping the functions compiled between them."""
+    import asyncio
+    from mrog.session import Session
+    from mrog.server import EvaluationServer, DEFAULT_PORT, DEFAULT_OFFLOAD_POINTS
+
+    parser = argparse.ArgumentParser(prog="mrog serve",
+                                     description="Serve evaluation requests sent as lines of JSON.")
+    parser.add_argument("filename", nargs='?', help="A .mg file whose functions are defined before serving")
+    parser.add_argument("--socket", metavar="PATH", help="Listen on a Unix socket instead of a TCP port")
+    parser.add_argument("--host", default='127.0.0.1', help="Address listened on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Processes evaluating large batches, 0 for one per core (default: 0)")
+    parser.add_argument("--offload-points", type=int, default=DEFAULT_OFFLOAD_POINTS, metavar="POINTS",
+                        help="Evaluate batches of at least POINTS points in the worker processes "
+                             f"(default: {DEFAULT_OFFLOAD_POINTS})")
+    parser.add_argument("--no-compile", action="store_true",
+                        help="Evaluate functions by walking the expression tree instead of compiling them")
+    parser.add_argument("--derivative", choices=DERIVATIVE_STRATEGIES, default='symbolic',
+                        help="How f'(...) is evaluated (default: symbolic)")
+    parser.add_argument("--numeric", choices=NUMERIC_MODES, default='float',
+                        help="Number type of the session (default: float)")
+    parser.add_argument("--precision", type=int, metavar="DIGITS",
+                        help=f"Significant digits of --numeric decimal (default: {DEFAULT_PRECISION})")
+    parser.add_argument("-O", "--optimize", action="store_true",
+                        help="Fold constants, share common subexpressions and inline small functions")
+    parser.add_argument("--memoize", action="append", default=[], metavar="FUNCTION",
+                        help="Cache results of FUNCTION by argument values, repeatable, '*' for every function")
+    parser.add_argument("--memo-size", type=int, default=1024,
+                        help="Maximum number of cached results per function (default: 1024)")
+    args = parser.parse_args(argv)
+
+    session = Session(compile=not args.no_compile, derivative_strategy=args.derivative,
+                      optimize=args.optimize, numeric=args.numeric, precision=args.precision)
+    for function_name in args.memoize:
+        session.interpreter.memoize(None if function_name == '*' else function_name, args.memo_size)
+    if args.filename:
+        try:
+            with open(args.filename, 'r') as file:
+                for line in session.execute(file.read()):
+                    print(line, file=sys.stderr)
+        except FileNotFoundError:
+            print(f"Error: File {args.filename} not found.")
+            return
+        except STATEMENT_ERRORS as e:
+            print(e)
+            return
+
+    server = EvaluationServer(session, args.workers or None, args.offload_points)
+    address = args.socket or f"{args.host}:{args.port}"
+    try:
+        asyncio.run(server.serve(args.socket, args.host, args.port,
+                                 ready=lambda listener: print(f"Serving on {address}", file=sys.stderr)))
+    except KeyboardInterrupt:
+        pass
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['batch']:
+        return batch(argv[1:])
+    if argv[:1] == ['sample']:
+        return sample(argv[1:])
+    if argv[:1] == ['serve']:
+        return serve(argv[1:])
+
+    parser = argparse.ArgumentParser(description="Process .mg files with the mrog lexer.",
+                                     epilog="Run 'mrog batch --help' to evaluate a function over a file of points, "
+                                            "'mrog sample --help' to sample a function adaptively "
+                                            "and 'mrog serve --help' to answer evaluation requests on a socket.")
+    parser.add_argument("filename", nargs='?', help="The .mg file to process, omitted to start an interactive session")
+    parser.add_argument("-i", "--interactive", action="store_true",
+                        help="Read statements from the terminal after running the file, keeping its functions")
+    parser.add_argument("--no-compile", action="store_true",
+                        help="Evaluate functions by walking the expression tree instead of compiling them")
+    parser.add_argument("--bytecode", action="store_true",
+                        help="Compile functions to mrog bytecode run by its virtual machine instead of Python")
+    parser.add_argument("--disassemble", action="append", default=[], metavar="FUNCTION",
+                        help="Print the bytecode of FUNCTION after running the file, repeatable")
+    parser.add_argument("--derivative", choices=DERIVATIVE_STRATEGIES, default='symbolic',
+                        help="How f'(...) is evaluated (default: symbolic)")
+    parser.add_argument("--numeric", choices=NUMERIC_MODES, default='float',
+                        help="Number type of the run: floats, exact integers, exact fractions or decimals "
+                             "(default: float)")
+    parser.add_argument("--precision", type=int, metavar="DIGITS",
+                        help=f"Significant digits of --numeric decimal (default: {DEFAULT_PRECISION})")
+    parser.add_argument("-O", "--optimize", action="store_true",
+                        help="Fold constants and share common subexpressions before interpreting")
+    parser.add_argument("--inline-threshold", type=int, default=INLINE_THRESHOLD, metavar="NODES",
+                        help="With -O, inline called functions whose body has at most NODES nodes, "
+                             f"0 to keep every call (default: {INLINE_THRESHOLD})")
+    parser.add_argument("--optimize-report", action="store_true",
+                        help="Optimize and report how many AST nodes were removed")
+    parser.add_argument("--memoize", action="append", default=[], metavar="FUNCTION",
+                        help="Cache results of FUNCTION by argument values, repeatable, '*' for every function")
+    parser.add_argument("--memo-size", type=int, default=1024,
+                        help="Maximum number of cached results per function (default: 1024)")
+    parser.add_argument("--memo-stats", action="store_true",
+                        help="Report result cache hits and misses")
+    parser.add_argument("--analysis-stats", action="store_true",
+                        help="Report the evaluations made by each integrate and solve statement")
+    parser.add_argument("--approximate", action="append", default=[], metavar="FUNCTION=START:STOP",
+                        help="Evaluate FUNCTION of one variable on [START, STOP) by a piecewise polynomial, "
+                             "repeatable")
+    parser.add_argument("--approximation-tolerance", type=float, default=approximation.DEFAULT_TOLERANCE,
+                        metavar="ERROR", help="Largest absolute error of --approximate "
+                                              f"(default: {approximation.DEFAULT_TOLERANCE})")
+    parser.add_argument("--approximation-degree", type=int, default=approximation.DEFAULT_DEGREE,
+                        metavar="DEGREE", help="Degree of the polynomial on each piece of --approximate, higher "
+                                               "for fewer pieces and a single Chebyshev approximation "
+                                               f"(default: {approximation.DEFAULT_DEGREE})")
+    parser.add_argument("--approximation-report", action="store_true",
+                        help="Report the pieces, measured error and speedup of each --approximate function "
+                             "(functions approximated by --workers processes are not reported)")
+    parser.add_argument("--evaluate", metavar="FUNCTION",
+                        help="Evaluate FUNCTION over the --grid points with the vectorized NumPy backend")
+    parser.add_argument("--grid", action="append", default=[], metavar="VAR=START:STOP:NUM",
+                        help="Range of a variable for --evaluate, repeated for multi-variable functions")
+    parser.add_argument("--output", help="Write --evaluate results to a .csv or .npy file instead of printing them")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read, check and run one statement at a time instead of the whole file at once")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Evaluate print statements in this many processes, 0 for one per core (default: 1)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Neither read nor write the parsed program in {programcache.CACHE_DIRECTORY}")
+    parser.add_argument("--profile", action="store_true",
+                        help="Report time per stage, calls and time per function and evaluated nodes on stderr "
+                             "(functions evaluated by --workers processes are not counted)")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="Write the --profile report to FILE as JSON, implies --profile measurements")
+    
+    args = parser.parse_args(argv)
+    if args.bytecode and args.numeric != 'float':
+        parser.error("--bytecode only runs --numeric float")
+    if args.approximate and args.numeric != 'float':
+        parser.error("--approximate only runs --numeric float")
+    if args.interactive or args.filename is None:
+        return interactive(args)
+
+    try:
+        file = open(args.filename, 'r')
+    except FileNotFoundError:
+        print(f"Error: File {args.filename} not found.")
+        return
+    with file:
+        interpret_file(args, file)
+
+def interactive(args):
+    """Run the file, if any, in a Session and then read statements from the terminal."""
+    from mrog.session import Session, repl, REPL_ERRORS
+
+    session = Session(compile=not args.no_compile, derivative_strategy=args.derivative,
+                      optimize=args.optimize, bytecode=args.bytecode, inline_threshold=args.inline_threshold,
+                      numeric=args.numeric, precision=args.precision)
+    for function_name in args.memoize:
+        session.interpreter.memoize(None if function_name == '*' else function_name, args.memo_size)
+    if args.filename:
+        try:
+            with open(args.filename, 'r') as file:
+                for line in session.execute(file.read()):
+                    print(line)
+        except FileNotFoundError:
+            print(f"Error: File {args.filename} not found.")
+            return
+        except REPL_ERRORS as e:
+            print(e)
+    repl(session)
+
+def interpret_file(args, file):
+    """Interpret an open .mg file according to the command line options."""
     functions = {}
     ast = None
+    profiler = Profiler() if args.profile or args.profile_output else None
     try:
-        lexer = Lexer(input_text)
-        parser = Parser(lexer)
-        semantic_analyzer = SemanticAnalyzer(parser)
-        interpreter = Interpreter(semantic_analyzer)
-        result = interpreter.interpret()
+        interpreter = Interpreter(None, compile=not args.no_compile,
+                                  derivative_strategy=args.derivative,
+                                  optimize=args.optimize or args.optimize_report,
+                                  stream=args.stream, profiler=profiler, bytecode=args.bytecode,
+                                  inline_threshold=args.inline_threshold, numeric=args.numeric,
+                                  precision=args.precision)
+        # Number literals are read as the numeric mode of the run
+        number = interpreter.numeric.number
+        # A streamed file is lexed line by line as the statements are executed, so it is never cached
+        if args.stream:
+            semantic_analyzer = SemanticAnalyzer(Parser(Lexer(file, number)))
+            if profiler:
+                profiler.instrument(semantic_analyzer)
+        else:
+            semantic_analyzer = load_program(args.filename, file.read(), not args.no_cache, profiler, number)
+        interpreter.semantic_analyzer = semantic_analyzer
+        for function_name in args.memoize:
+            interpreter.memoize(None if function_name == '*' else function_name, args.memo_size)
+        for specification in args.approximate:
+            function_name, lower, upper = approximation.parse_interval(specification)
+            interpreter.approximate(function_name, lower, upper, args.approximation_tolerance,
+                                    args.approximation_degree)
+        if args.workers == 1:
+            result = profiler.run(interpreter) if profiler else interpreter.interpret()
+        else:
+            with ParallelExecutor(interpreter, args.workers or None) as executor:
+                result = profiler.run(executor) if profiler else executor.interpret()
         print(result)
 
+        if profiler:
+            report_profile(args, profiler)
 
-    except (InvalidVariableError, InvalidIdentifierError, \
-            InvalidExpressionVariableError, InvalidArgumentError, \
-            InvalidSyntaxError, UnknownSymbolError, UndefinedFunctionError, \
-            InvalidPrintArgumentError, 
-            
-            ) as e:
+        if args.optimize_report:
+            report = interpreter.optimizer.report()
+            print(f"Optimizer removed {report['removed']} of {report['nodes_before']} nodes "
+                  f"({report['folded']} folded, {report['simplified']} simplified, "
+                  f"{report['inlined']} calls inlined)", file=sys.stderr)
+
+        if args.memo_stats:
+            for function_name, stats in interpreter.memo_stats().items():
+                print(f"{function_name}: {stats['hits']} hits, {stats['misses']} misses, "
+                      f"{stats['bypassed']} bypassed, {stats['size']}/{stats['maxsize']} cached", file=sys.stderr)
+
+        if args.approximation_report:
+            for function_name, approximated in interpreter.approximations.items():
+                timings = approximated.benchmark()
+                print(f"{function_name} on [{approximated.lower}, {approximated.upper}): {approximated.pieces} pieces "
+                      f"of degree {approximated.degree}, max error {approximated.max_error:.3g}, "
+                      f"{timings['scalar_speedup']:.2f}x faster per call, "
+                      f"{timings['vectorized_speedup']:.2f}x faster over arrays", file=sys.stderr)
+
+        if args.analysis_stats:
+            for label, stats in interpreter.analysis_stats:
+                print(f"{label}: " + ", ".join(f"{value} {key.replace('_', ' ')}" for key, value in stats.items()), file=sys.stderr)
+
+        for function_name in args.disassemble:
+            print_disassembly(interpreter, function_name)
+
+        if args.evaluate:
+            evaluate_grid(interpreter, args.evaluate, args.grid, args.output)
+
+
+    except (*STATEMENT_ERRORS, InvalidGridError) as e:
         print(e)
         
     if ast:
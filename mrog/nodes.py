@@ -0,0 +1,180 @@
+class Node:
+    """Base class of the nodes built by the Parser.
+
+    Every node kind stores its fields in `__slots__`, so a node is a small fixed
+    layout instead of a dict, and `type` is the node kind as a class attribute.
+    Nodes compare equal when they are of the same kind with equal fields.
+    """
+    __slots__ = ()
+    type = None
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in self.__slots__)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # Pickle as a constructor call, much cheaper to load than the default slot state
+        return type(self), tuple(getattr(self, f) for f in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f"{f}={getattr(self, f)!r}" for f in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Number(Node):
+    __slots__ = ('value',)
+    type = 'Number'
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Variable(Node):
+    __slots__ = ('value',)
+    type = 'Variable'
+
+    def __init__(self, value):
+        self.value = value
+
+
+class BinaryExpression(Node):
+    __slots__ = ('left', 'operator', 'right')
+    type = 'BinaryExpression'
+
+    def __init__(self, left, operator, right):
+        self.left = left
+        self.operator = operator
+        self.right = right
+
+
+class MathFunction(Node):
+    """A built-in function applied to an argument; `base` is only set for log."""
+    __slots__ = ('function', 'argument', 'base')
+    type = 'MathFunction'
+
+    def __init__(self, function, argument, base=None):
+        self.function = function
+        self.argument = argument
+        self.base = base
+
+
+class Matrix(Node):
+    """A matrix literal, with `elements` as a list of rows."""
+    __slots__ = ('elements',)
+    type = 'Matrix'
+
+    def __init__(self, elements):
+        self.elements = elements
+
+
+class SparseMatrix(Node):
+    """A matrix literal of mostly constant 0 entries, storing only the others in coordinate (COO) form.
+
+    Entry k of `entries` is at row `rows[k]` and column `columns[k]` of a
+    matrix of `shape` (rows, columns), and every other entry is 0.
+    """
+    __slots__ = ('shape', 'rows', 'columns', 'entries')
+    type = 'SparseMatrix'
+
+    def __init__(self, shape, rows, columns, entries):
+        self.shape = shape
+        self.rows = rows
+        self.columns = columns
+        self.entries = entries
+
+
+class FunctionCall(Node):
+    __slots__ = ('name', 'arguments')
+    type = 'FunctionCall'
+
+    def __init__(self, name, arguments):
+        self.name = name
+        self.arguments = arguments
+
+
+class Derivative(Node):
+    """f'(...) as written, or the partial derivative along `variables` when they are given."""
+    __slots__ = ('function', 'arguments', 'variables')
+    type = 'Derivative'
+
+    def __init__(self, function, arguments, variables=None):
+        self.function = function
+        self.arguments = arguments
+        self.variables = variables
+
+
+class Factorial(Node):
+    __slots__ = ('operand',)
+    type = 'Factorial'
+
+    def __init__(self, operand):
+        self.operand = operand
+
+
+class FunctionDefinition(Node):
+    __slots__ = ('name', 'function_variables', 'expression')
+    type = 'FunctionDefinition'
+
+    def __init__(self, name, function_variables, expression):
+        self.name = name
+        self.function_variables = function_variables
+        self.expression = expression
+
+
+class PrintStatement(Node):
+    __slots__ = ('argument',)
+    type = 'PrintStatement'
+
+    def __init__(self, argument):
+        self.argument = argument
+
+
+class IntegrateStatement(Node):
+    __slots__ = ('function', 'lower', 'upper', 'tolerance')
+    type = 'IntegrateStatement'
+
+    def __init__(self, function, lower, upper, tolerance=None):
+        self.function = function
+        self.lower = lower
+        self.upper = upper
+        self.tolerance = tolerance
+
+
+class SolveStatement(Node):
+    __slots__ = ('function', 'start', 'tolerance')
+    type = 'SolveStatement'
+
+    def __init__(self, function, start, tolerance=None):
+        self.function = function
+        self.start = start
+        self.tolerance = tolerance
+
+
+# Matrix literals of at least this many entries are sparse when at least this fraction of them is the constant 0
+SPARSE_MIN_ENTRIES = 16
+SPARSE_MIN_ZEROS = 0.5
+
+
+def is_zero(node):
+    return node.type == 'Number' and node.value == 0
+
+
+def sparse_matrix(shape, entries):
+    """Return a SparseMatrix from (row, column, node) entries, leaving out those that are the constant 0."""
+    entries = [entry for entry in entries if not is_zero(entry[2])]
+    return SparseMatrix(shape, tuple(i for i, _, _ in entries), tuple(j for _, j, _ in entries),
+                        [e for _, _, e in entries])
+
+
+def matrix_literal(rows):
+    """Return the node of a matrix literal given as a list of rows, sparse when it is large and mostly 0."""
+    count = sum(len(row) for row in rows)
+    if count < SPARSE_MIN_ENTRIES or any(len(row) != len(rows[0]) for row in rows):
+        return Matrix(rows)
+    if sum(1 for row in rows for e in row if is_zero(e)) < SPARSE_MIN_ZEROS * count:
+        return Matrix(rows)
+    return sparse_matrix((len(rows), len(rows[0])), ((i, j, e) for i, row in enumerate(rows)
+                                                     for j, e in enumerate(row)))
@@ -0,0 +1,156 @@
+import math
+from decimal import Decimal, Context, setcontext
+from fractions import Fraction
+
+from .exceptions import InvalidOperandError
+from .compiler import factorial as truncated_factorial, fold, replace_children
+from .matrix import elementwise, log as float_log
+from .nodes import Number
+from .vectorize import TRIG_UFUNCS_MAP, MATH_UFUNCS_MAP
+
+# Numeric modes a program can be run in
+NUMERIC_MODES = ('float', 'integer', 'fraction', 'decimal')
+
+# Significant digits of decimal arithmetic unless given
+DEFAULT_PRECISION = 50
+
+
+class NumericBackend:
+    """Number type a program is run with.
+
+    A backend tells how number literals are read, which callables evaluate
+    the built-in functions, log and factorial, and which values count as
+    numbers rather than symbolic text. The modes are:
+    - float: floating point, as always. Nothing is converted or wrapped.
+    - integer: integer literals are read as Python integers, so +, -, * and
+      ^ with a natural exponent are exact however large the result.
+    - fraction: literals are read as exact rationals, so +, -, * and / are
+      exact, as well as ^ with an integer exponent.
+    - decimal: literals are read as decimals and arithmetic is rounded to a
+      given number of significant digits.
+
+    In the exact modes the factorial of an integral value is exact and fails
+    on other values instead of truncating them. Built-in functions with an
+    irrational result are evaluated in floating point, except exp, sqrt and ln
+    in decimal mode, which use the decimal precision.
+    """
+    def __init__(self, name, number, function_map, log, factorial, number_types, step, context=None):
+        self.name = name
+        # Value of a number literal from its text
+        self.number = number
+        self.function_map = function_map
+        self.log = log
+        self.factorial = factorial
+        self.number_types = number_types
+        # Step of finite differences
+        self.step = step
+        # Decimal context with the precision of the run
+        self.context = context
+
+    @property
+    def exact(self):
+        return self.name != 'float'
+
+    @property
+    def precision(self):
+        return None if self.context is None else self.context.prec
+
+    def activate(self):
+        """Make the arithmetic of the current thread use this backend's decimal precision."""
+        if self.context is not None:
+            setcontext(self.context)
+
+    def convert(self, value):
+        """Return a float computed by the interpreter itself, such as a derivative constant, as a backend number."""
+        if not isinstance(value, float) or not math.isfinite(value):
+            return value
+        if self.name == 'integer':
+            return int(value) if value.is_integer() else float(value)
+        return self.number(repr(float(value)))
+
+    def convert_tree(self, tree):
+        """Convert the float constants of an expression, or list of expressions, built by the interpreter."""
+        if isinstance(tree, list):
+            return [self.convert_tree(t) for t in tree]
+        def convert(node, children):
+            if node.type == 'Number':
+                value = self.convert(node.value)
+                return node if value is node.value else Number(value)
+            return replace_children(node, children)
+        return fold(tree, convert)
+
+
+def integer_or_float(text):
+    return float(text) if '.' in text else int(text)
+
+
+def exact_factorial(operand):
+    """Factorial of an integral value, as an exact integer."""
+    if operand != int(operand):
+        raise InvalidOperandError(f"factorial of non-integral value {operand}")
+    return math.factorial(int(operand))
+
+
+def fraction_sqrt(argument):
+    """Exact square root of a rational whose numerator and denominator are squares, else a float."""
+    argument = Fraction(argument)
+    if argument >= 0:
+        numerator, denominator = math.isqrt(argument.numerator), math.isqrt(argument.denominator)
+        if numerator * numerator == argument.numerator and denominator * denominator == argument.denominator:
+            return Fraction(numerator, denominator)
+    return math.sqrt(argument)
+
+
+def decimal_function(function):
+    """Evaluate a function in floating point and return the result as a decimal."""
+    def evaluate(argument):
+        return Decimal(repr(function(argument)))
+    evaluate.__name__ = function.__name__
+    return evaluate
+
+
+def decimal_log(argument, base):
+    if isinstance(argument, (int, Decimal)) and isinstance(base, (int, Decimal)):
+        return Decimal(argument).ln() / Decimal(base).ln()
+    return float_log(argument, base)
+
+decimal_log.scalar = decimal_log
+
+# Functions with exact, or decimal precision, versions in each exact mode
+EXACT_FUNCTIONS = {
+    'fraction': {'sqrt': fraction_sqrt, 'abs': abs},
+    'decimal': {
+        'exp': lambda x: Decimal(x).exp(),
+        'sqrt': lambda x: Decimal(x).sqrt(),
+        'ln': lambda x: Decimal(x).ln(),
+        'abs': abs,
+    },
+}
+
+
+def numeric_backend(name, function_map, precision=None):
+    """Return the backend of a numeric mode, given the floating point built-in functions."""
+    if name == 'float':
+        return NumericBackend('float', float, function_map, float_log, truncated_factorial, (int, float), 1e-6)
+    if name == 'integer':
+        return NumericBackend('integer', integer_or_float, function_map, float_log, exact_factorial,
+                              (int, float), 1e-6)
+    if name not in NUMERIC_MODES:
+        raise ValueError(f"unknown numeric mode {name}")
+
+    ufuncs = {**MATH_UFUNCS_MAP, **TRIG_UFUNCS_MAP}
+    exact_functions = EXACT_FUNCTIONS[name]
+    exact_map = {}
+    for function_name, function in function_map.items():
+        scalar = getattr(function, 'scalar', function)
+        if function_name in exact_functions:
+            scalar = exact_functions[function_name]
+        elif name == 'decimal':
+            scalar = decimal_function(scalar)
+        exact_map[function_name] = elementwise(scalar, ufuncs.get(function_name))
+    if name == 'fraction':
+        return NumericBackend('fraction', Fraction, exact_map, float_log, exact_factorial,
+                              (int, float, Fraction), Fraction(1, 10 ** 6))
+    context = Context(prec=precision or DEFAULT_PRECISION)
+    return NumericBackend('decimal', Decimal, exact_map, decimal_log, exact_factorial,
+                          (int, Decimal), Decimal('1e-6'), context)
@@ -0,0 +1,250 @@
+import math
+import operator
+
+from .compiler import child_nodes, replace_children, fold, fold_shared, dependents, factorial
+from .nodes import *
+from .exceptions import InvalidOperandError
+
+BINARY_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '^': operator.pow,
+    '.*': operator.mul,
+}
+
+# Largest body, counted as a tree, inlined into its callers
+INLINE_THRESHOLD = 40
+
+
+class Optimizer:
+    """Optimization pass over the analyzed AST, run before interpretation.
+
+    Constant subtrees are folded, the identities x*1, x+0, x-0, x/1 and x^1 are
+    removed, and identical subtrees are hash-consed so that every distinct
+    subexpression is a single shared node. The result is a DAG that the compiler
+    evaluates with one temporary per shared node.
+
+    Given the defined functions, calls in function definitions are inlined:
+    the body of a small enough callee replaces the call, with the argument
+    expressions substituted for its variables, and is folded again. Callees
+    are stored already inlined, so calls nested through any number of
+    functions collapse into one expression. A function is never inlined into
+    itself, since calls are resolved by name and a definition calling its own
+    name calls the new definition.
+    """
+    def __init__(self, function_map, functions=None, inline_threshold=INLINE_THRESHOLD, numeric=None):
+        # Built-in functions used to fold calls on constants, and the numbers they may fold to
+        self.function_map = function_map
+        if numeric is None:
+            self.log, self.factorial, self.number_types = math.log, factorial, (int, float)
+        else:
+            self.log, self.factorial, self.number_types = numeric.log, numeric.factorial, numeric.number_types
+        # In the exact modes, x * 1.0 is a float and x * 1.00 a decimal of two places, so identities are kept
+        self.remove_identities = numeric is None or not numeric.exact
+        # Variables and bodies of the defined functions, or None not to inline
+        self.functions = functions
+        self.inline_threshold = inline_threshold
+        # Definitions as given, the functions inlined into each of them and the reverse
+        self.definitions = {}
+        self.inlined = {}
+        self.inlined_into = {}
+        # Name of the function whose definition is being optimized
+        self.defining = None
+        # Size as a tree of each function body, with the body it was measured on
+        self.sizes = {}
+        # Canonical node for every distinct subexpression seen so far
+        self.table = {}
+        self.nodes_before = 0
+        self.folded = 0
+        self.simplified = 0
+        self.inlined_calls = 0
+        self.seen = set()
+
+    @property
+    def nodes_after(self):
+        return len(self.seen)
+
+    @property
+    def removed(self):
+        return self.nodes_before - self.nodes_after
+
+    def report(self):
+        """Return statistics about the nodes removed so far."""
+        return {
+            'nodes_before': self.nodes_before,
+            'nodes_after': self.nodes_after,
+            'removed': self.removed,
+            'folded': self.folded,
+            'simplified': self.simplified,
+            'inlined': self.inlined_calls,
+        }
+
+    def optimize(self, ast):
+        """Optimize every statement of a program."""
+        return [self.optimize_statement(statement) for statement in ast]
+
+    def optimize_statement(self, statement):
+        if statement.type == 'FunctionDefinition':
+            return self.optimize_definition(statement)
+        if statement.type == 'PrintStatement':
+            return PrintStatement(self.optimize_expression(statement.argument))
+        return statement
+
+    def optimize_definition(self, statement):
+        """Optimize a function definition, inlining the functions it calls when they are known."""
+        name = statement.name
+        self.definitions[name] = statement
+        for callee in self.inlined.pop(name, ()):
+            self.inlined_into[callee].discard(name)
+        self.inlined[name] = set()
+        self.defining = name
+        try:
+            expression = self.optimize_expression(statement.expression)
+        finally:
+            self.defining = None
+        return FunctionDefinition(name, statement.function_variables, expression)
+
+    def stale_definitions(self, function_name):
+        """Optimize again the definitions holding an inlined copy of a redefined function.
+
+        They are generated with every function after those inlined into it, and
+        each of them must be installed before the next one is optimized.
+        """
+        for caller in dependents(self.inlined_into, function_name):
+            yield self.optimize_definition(self.definitions[caller])
+
+    def optimize_expression(self, node):
+        """Return the canonical, folded and simplified form of an expression."""
+        node = self.rewrite(node)
+        self.count(node)
+        return node
+
+    def count(self, node):
+        """Record the distinct nodes of an optimized expression."""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if id(node) not in self.seen:
+                self.seen.add(id(node))
+                stack.extend(child_nodes(node))
+
+    def rewrite(self, node):
+        return fold(node, self.rewrite_node)
+
+    def rewrite_node(self, node, children):
+        """Rebuild a node from its rewritten children, inlining calls in function definitions."""
+        self.nodes_before += 1
+        if node.type == 'FunctionCall' and self.defining is not None:
+            inlined = self.inline(node.name, children)
+            if inlined is not None:
+                return inlined
+        return self.rebuild(node, children)
+
+    def rebuild(self, node, children):
+        """Rebuild a node from its rewritten children, then simplify, fold and intern it."""
+        node = replace_children(node, children)
+        if node.type == 'BinaryExpression':
+            node = self.simplify(node)
+        elif node.type == 'Matrix':
+            # Entries folded to 0 may make a matrix sparse, or leave out stored entries
+            node = matrix_literal(node.elements)
+        elif node.type == 'SparseMatrix':
+            node = sparse_matrix(node.shape, zip(node.rows, node.columns, node.entries))
+        return self.intern(self.fold(node))
+
+    def inline(self, function_name, arguments):
+        """Return the body of a called function with the arguments substituted, or None to keep the call."""
+        if self.functions is None or function_name == self.defining or function_name not in self.functions:
+            return None
+        variables, body = self.functions[function_name]
+        if len(variables) != len(arguments) or self.size(function_name, body) > self.inline_threshold:
+            return None
+        values = dict(zip(variables, arguments))
+        def substitute(node, children):
+            if node.type == 'Variable':
+                return values.get(node.value, node)
+            return self.rebuild(node, children)
+        self.inlined_calls += 1
+        self.inlined[self.defining].add(function_name)
+        self.inlined_into.setdefault(function_name, set()).add(self.defining)
+        return fold_shared(body, substitute)
+
+    def size(self, function_name, body):
+        """Return the number of nodes of a function body counted as a tree, as the tree-walker evaluates it."""
+        measured = self.sizes.get(function_name)
+        if measured is None or measured[0] is not body:
+            measured = self.sizes[function_name] = (body, fold_shared(body, lambda node, sizes: 1 + sum(sizes)))
+        return measured[1]
+
+    def simplify(self, node):
+        """Remove the additive and multiplicative identities of a binary expression, unless the mode is exact."""
+        if not self.remove_identities:
+            return node
+        left, right, operator = node.left, node.right, node.operator
+        if self.is_number(right, 0 if operator in ('+', '-') else 1):
+            self.simplified += 1
+            return left
+        if (operator == '+' and self.is_number(left, 0)) or (operator in ('*', '.*') and self.is_number(left, 1)):
+            self.simplified += 1
+            return right
+        return node
+
+    def fold(self, node):
+        """Replace an operation on constants by its value, unless evaluating it fails."""
+        if node.type == 'BinaryExpression':
+            operands = [node.left, node.right]
+            function = BINARY_OPERATORS[node.operator]
+        elif node.type == 'MathFunction':
+            if node.function == 'log':
+                operands = [node.argument, node.base]
+                function = self.log
+            else:
+                operands = [node.argument]
+                function = self.function_map[node.function]
+        elif node.type == 'Factorial':
+            operands = [node.operand]
+            function = self.factorial
+        else:
+            return node
+
+        if not all(self.is_number(o) for o in operands):
+            return node
+        try:
+            value = function(*(o.value for o in operands))
+        except (ArithmeticError, ValueError, InvalidOperandError):
+            return node
+        if not isinstance(value, self.number_types):
+            return node
+        self.folded += 1
+        return Number(value)
+
+    def intern(self, node):
+        """Return the canonical node for an expression whose children are canonical."""
+        if node.type == 'Number':
+            key = ('Number', type(node.value), repr(node.value))
+        elif node.type == 'Variable':
+            key = ('Variable', node.value)
+        elif node.type == 'BinaryExpression':
+            key = ('BinaryExpression', node.operator, id(node.left), id(node.right))
+        elif node.type == 'MathFunction':
+            key = ('MathFunction', node.function, id(node.argument), id(node.base))
+        elif node.type == 'Matrix':
+            key = ('Matrix', tuple(tuple(id(e) for e in row) for row in node.elements))
+        elif node.type == 'SparseMatrix':
+            key = ('SparseMatrix', node.shape, node.rows, node.columns, tuple(id(e) for e in node.entries))
+        elif node.type == 'FunctionCall':
+            key = ('FunctionCall', node.name, tuple(id(a) for a in node.arguments))
+        elif node.type == 'Derivative':
+            key = ('Derivative', node.function, tuple(node.variables or ()),
+                   tuple(id(a) for a in node.arguments))
+        elif node.type == 'Factorial':
+            key = ('Factorial', id(node.operand))
+        else:
+            return node
+        return self.table.setdefault(key, node)
+
+    def is_number(self, node, value=None):
+        return node.type == 'Number' and (value is None or node.value == value)
+
@@ -0,0 +1,139 @@
+import os
+import pickle
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from .interpreter import Interpreter
+
+# Print statements held back at most before they are sent to the workers
+DEFAULT_BATCH_SIZE = 4096
+
+# Interpreter rebuilt from the latest function snapshot seen by a worker process
+_worker_interpreter = {}
+
+
+def _interpreter(snapshot_id, snapshot):
+    """Return the worker's interpreter for a snapshot, rebuilding it when the snapshot changes."""
+    if snapshot_id not in _worker_interpreter:
+        options, memoize_sizes, approximation_options, functions, definitions = pickle.loads(snapshot)
+        interpreter = Interpreter(None, **options)
+        interpreter.memoize_sizes = memoize_sizes
+        interpreter.approximation_options = approximation_options
+        interpreter.functions = functions
+        interpreter.definitions = definitions
+        _worker_interpreter.clear()
+        _worker_interpreter[snapshot_id] = interpreter
+    return _worker_interpreter[snapshot_id]
+
+
+def _format_print_statements(snapshot_id, snapshot, statements):
+    interpreter = _interpreter(snapshot_id, snapshot)
+    return [interpreter.format_print_statement(statement) for statement in statements]
+
+
+def _call_function(snapshot_id, snapshot, function_name, points):
+    interpreter = _interpreter(snapshot_id, snapshot)
+    return [interpreter.call_function(function_name, list(point)) for point in points]
+
+
+def split(items, parts):
+    """Split a list into at most the given number of contiguous chunks of similar size."""
+    size = -(-len(items) // parts) if items else 1
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class ParallelExecutor:
+    """Run independent work of an interpreter across a pool of processes.
+
+    Print statements only depend on the functions defined before them, so the
+    prints between two definitions are sent to the workers together with a
+    snapshot of `Interpreter.functions` and their lines are printed in program
+    order. Each worker rebuilds an interpreter once per snapshot, so compiled
+    functions and result caches are reused across the chunks it receives.
+    """
+    def __init__(self, interpreter, workers=None, batch_size=DEFAULT_BATCH_SIZE, chunks_per_worker=4):
+        self.interpreter = interpreter
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.chunks_per_worker = chunks_per_worker
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.snapshot_id = None
+        self.snapshot = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+
+    def take_snapshot(self):
+        """Serialize the functions and options the workers need, once per set of definitions."""
+        if self.snapshot_id is None:
+            interpreter = self.interpreter
+            options = {'compile': interpreter.compile, 'derivative_strategy': interpreter.derivative_strategy,
+                       'bytecode': interpreter.bytecode, 'numeric': interpreter.numeric.name,
+                       'precision': interpreter.numeric.precision}
+            self.snapshot = pickle.dumps((options, interpreter.memoize_sizes, interpreter.approximation_options,
+                                          interpreter.functions, interpreter.definitions))
+            self.snapshot_id = uuid.uuid4().hex
+        return self.snapshot_id, self.snapshot
+
+    def interpret(self):
+        """Interpret the program, evaluating print statements in the worker processes."""
+        pending = []
+        for node in self.interpreter.statements():
+            if node.type == 'FunctionDefinition':
+                self.flush(pending)
+                self.interpreter.handle_function_definition(node)
+                self.snapshot_id = None
+            elif node.type == 'PrintStatement':
+                pending.append(node)
+                if len(pending) >= self.batch_size:
+                    self.flush(pending)
+            else:
+                # Integrals and roots are computed here, between the lines printed before and after them
+                self.flush(pending)
+                print(self.interpreter.format_statement(node))
+        self.flush(pending)
+
+    def flush(self, pending):
+        """Print the lines of the pending print statements in order and clear them.
+
+        The lines of every chunk are printed as soon as it is done. A chunk
+        that fails is evaluated again here, printing its lines up to the
+        statement that fails and raising its error, as a serial run would.
+        """
+        if pending:
+            snapshot_id, snapshot = self.take_snapshot()
+            chunks = split(pending, self.workers * self.chunks_per_worker)
+            futures = [self.pool.submit(_format_print_statements, snapshot_id, snapshot, chunk) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                try:
+                    lines = future.result()
+                except Exception:
+                    lines = ()
+                    for statement in chunk:
+                        print(self.interpreter.format_print_statement(statement))
+                for line in lines:
+                    print(line)
+        pending.clear()
+
+    def map_points(self, function_name, points):
+        """Evaluate a function at every point of a sweep, one chunk of points per task."""
+        # Functions may have been defined since the last snapshot
+        self.snapshot_id = None
+        return [value for future in self.submit_points(function_name, points) for value in future.result()]
+
+    def submit_points(self, function_name, points):
+        """Start evaluating a function at every point with the current snapshot, returning a future per chunk.
+
+        The caller resets `snapshot_id` when functions are defined, so the
+        snapshot is only serialized again after a change.
+        """
+        points = [tuple(point) for point in points]
+        snapshot_id, snapshot = self.take_snapshot()
+        return [self.pool.submit(_call_function, snapshot_id, snapshot, function_name, chunk)
+                for chunk in split(points, self.workers * self.chunks_per_worker)]
@@ -2,6 +2,16 @@ from .lexer import Lexer
 from .token import TokenType, Token
 from .exceptions import *
 from .symbols import VARIABLES
+from .nodes import *
+
+# Precedence and right associativity of the binary operators
+BINARY_OPERATORS = {
+    TokenType.PLUS: (1, False),
+    TokenType.MINUS: (1, False),
+    TokenType.MUL: (2, False),
+    TokenType.DIV: (2, False),
+    TokenType.POW: (3, True),
+}
 
 class Parser:
 
@@ -33,6 +43,21 @@ class Parser:
             self.current_line += 1
 
         return statements
+
+    def parse_statements(self):
+        """Generate the statements one at a time as the input is read.
+
+        The variables and functions recorded for a line are dropped once the
+        next statement is requested, so memory does not grow with the input.
+        """
+        while self.current_token.type != TokenType.EOF:
+            line = self.current_line
+            self.used_variables[line] = set()
+            self.functions_called[line] = set()
+            yield self.parse_statement()
+            del self.used_variables[line]
+            del self.functions_called[line]
+            self.current_line += 1
     
 
     def parse_statement(self):
@@ -47,8 +72,14 @@ class Parser:
         if self.current_token.type == TokenType.PRINT:
             # Parse the print statement
             return self.parse_print_statement()
+
+        if self.current_token.type == TokenType.INTEGRATE:
+            return self.parse_integrate_statement()
+
+        if self.current_token.type == TokenType.SOLVE:
+            return self.parse_solve_statement()
         
-        raise InvalidSyntaxError(self.current_line, received=self.current_token.value, expected="function definition or print statement")
+        raise InvalidSyntaxError(self.current_line, received=self.current_token.value, expected="function definition, print, integrate or solve statement")
         
     def parse_print_statement(self):
         # Allow print(f) or print(f(x)) or print(f(expression))
@@ -59,7 +90,40 @@ class Parser:
         
         self.eat(TokenType.RPAREN)
         
-        return {'type': 'PrintStatement', 'argument': argument}
+        return PrintStatement(argument)
+
+    def parse_integrate_statement(self):
+        # integrate(f, lower, upper) or integrate(f, lower, upper, tolerance)
+        self.eat(TokenType.INTEGRATE)
+        self.eat(TokenType.LPAREN)
+        function_name = self.current_token.value
+        self.eat(TokenType.IDENTIFIER)
+        self.eat(TokenType.COMMA)
+        lower = self.parse_expression()
+        self.eat(TokenType.COMMA)
+        upper = self.parse_expression()
+        tolerance = self.parse_tolerance()
+        self.eat(TokenType.RPAREN)
+        return IntegrateStatement(function_name, lower, upper, tolerance)
+
+    def parse_solve_statement(self):
+        # solve(f, start) or solve(f, start, tolerance)
+        self.eat(TokenType.SOLVE)
+        self.eat(TokenType.LPAREN)
+        function_name = self.current_token.value
+        self.eat(TokenType.IDENTIFIER)
+        self.eat(TokenType.COMMA)
+        start = self.parse_expression()
+        tolerance = self.parse_tolerance()
+        self.eat(TokenType.RPAREN)
+        return SolveStatement(function_name, start, tolerance)
+
+    def parse_tolerance(self):
+        """Parse the optional last argument of integrate and solve."""
+        if self.current_token.type != TokenType.COMMA:
+            return None
+        self.eat(TokenType.COMMA)
+        return self.parse_expression()
 
     def parse_function_definition(self):
         function_name = self.current_token.value
@@ -81,74 +145,146 @@ class Parser:
 
         expression = self.parse_expression()
 
-        return {'type': 'FunctionDefinition', 'name': function_name, 'function_variables': function_variables, 'expression': expression}
+        return FunctionDefinition(function_name, function_variables, expression)
 
     def parse_expression(self):
-        term = self.parse_term()
-        return self.parse_rest_expression(term)
-
-    def parse_rest_expression(self, initial_term):
-        while self.current_token.type in (TokenType.PLUS, TokenType.MINUS):
-            operator = self.current_token
-            if operator.type == TokenType.PLUS:
-                self.eat(TokenType.PLUS)
-            else:
-                self.eat(TokenType.MINUS)
-            next_term = self.parse_term()
-            initial_term = {'type': 'BinaryExpression', 'left': initial_term, 'operator': operator.value, 'right': next_term}
-        return initial_term
-
-    def parse_term(self):
-        factor = self.parse_factor()
-        return self.parse_rest_term(factor)
-
-    def parse_rest_term(self, initial_factor):
-        while self.current_token.type in (TokenType.MUL, TokenType.DIV):
-            operator = self.current_token
-            if operator.type == TokenType.MUL:
-                self.eat(TokenType.MUL)
-            else:
-                self.eat(TokenType.DIV)
-            next_factor = self.parse_factor()
-            initial_factor = {'type': 'BinaryExpression', 'left': initial_factor, 'operator': operator.value, 'right': next_factor}
-        return initial_factor
-
-    def parse_factor(self):
-        primary = self.parse_primary()
-        return self.parse_rest_factor(primary)
-
-    def parse_rest_factor(self, initial_primary):
-        if self.current_token.type == TokenType.POW:
-            operator = self.current_token
-            self.eat(TokenType.POW)
-            next_primary = self.parse_primary()
-            next_primary = self.parse_rest_factor(next_primary)  # Recursively handle right-associative power
-            initial_primary = {'type': 'BinaryExpression', 'left': initial_primary, 'operator': operator.value, 'right': next_primary}
-        return initial_primary
-
-
-    def parse_primary(self):
+        """Parse an expression without recursion, so nesting depth is only limited by memory.
+
+        Binary operators are reduced by precedence on an operator stack. Every
+        construct holding expressions (parentheses, function arguments, log
+        arguments and matrix entries) pushes a frame that is completed once the
+        expression inside it ends. Tokens are consumed in the same order as by a
+        recursive descent parser, so syntax errors are reported the same way.
+        """
+        operands = []
+        operators = []
+        # Open constructs as [kind, data, operator stack height when opened]
+        frames = []
+        base = 0
+        while True:
+            node = self.parse_operand(frames, operators)
+            if node is None:
+                base = len(operators)
+                continue
+            while True:
+                operands.append(node)
+                token = self.current_token
+                if token.type in BINARY_OPERATORS:
+                    precedence, right_associative = BINARY_OPERATORS[token.type]
+                    while len(operators) > base and (operators[-1][0] > precedence or
+                                                     operators[-1][0] == precedence and not right_associative):
+                        self.reduce(operands, operators)
+                    operators.append((precedence, token.value))
+                    self.advance()
+                    break
+                # The expression of the innermost frame ends here
+                while len(operators) > base:
+                    self.reduce(operands, operators)
+                expression = operands.pop()
+                if not frames:
+                    return expression
+                node = self.close_frame(frames, expression)
+                if node is None:
+                    # Another expression follows in the same frame
+                    break
+                frames.pop()
+                base = frames[-1][2] if frames else 0
+
+    def parse_operand(self, frames, operators):
+        """Parse an operand, or open the frame of a construct and return None."""
         token = self.current_token
-
         if token.type == TokenType.NUMBER:
             self.eat(TokenType.NUMBER)
-            return self.parse_postfix({'type': 'Number', 'value': token.value})
+            return self.parse_postfix(Number(token.value))
         elif token.type in (TokenType.MATH_FUNCTION, TokenType.TRIG_FUNCTION):
-            return self.parse_math_function(token)
+            self.eat(token.type)
+            self.eat(TokenType.LPAREN)
+            if token.value == 'log':
+                frames.append(['log base', None, len(operators)])
+            elif token.value == 'matrix':
+                self.eat(TokenType.LBRACKET)
+                self.eat(TokenType.LBRACKET)
+                frames.append(['matrix', [[]], len(operators)])
+            else:
+                frames.append(['function', token.value, len(operators)])
+            return None
         elif token.type == TokenType.IDENTIFIER:
-            return self.parse_postfix(self.parse_identifier())
+            identifier = token.value
+            self.eat(TokenType.IDENTIFIER)
+            derivative = False
+            if self.current_token.type == TokenType.PRIME:
+                derivative = True
+                self.eat(TokenType.PRIME)
+            if self.current_token.type != TokenType.LPAREN:
+                self.used_variables[self.current_line].add(identifier)
+                return self.parse_postfix(Variable(identifier))
+            self.functions_called[self.current_line].add(identifier)
+            self.eat(TokenType.LPAREN)
+            if self.current_token.type != TokenType.RPAREN:
+                frames.append(['call', (identifier, derivative, []), len(operators)])
+                return None
+            self.eat(TokenType.RPAREN)
+            return self.parse_postfix(Derivative(identifier, []) if derivative else FunctionCall(identifier, []))
         elif token.type == TokenType.LPAREN:
             self.eat(TokenType.LPAREN)
-            expr = self.parse_expression()
+            frames.append(['paren', None, len(operators)])
+            return None
+        raise InvalidSyntaxError(self.current_line, received=token.value, expected="number, math function, trigonometric function, identifier, or left parenthesis")
+
+    def close_frame(self, frames, expression):
+        """Take the expression ending in the innermost frame.
+
+        Returns the node of the construct once it is complete, or None when
+        another expression of the same construct follows.
+        """
+        frame = frames[-1]
+        kind, data = frame[0], frame[1]
+        if kind == 'paren':
             self.eat(TokenType.RPAREN)
-            return self.parse_postfix(expr)
-        else:  
-            raise InvalidSyntaxError(self.current_line, received=token.value, expected="number, math function, trigonometric function, identifier, or left parenthesis")
+            return self.parse_postfix(expression)
+        elif kind == 'function':
+            self.eat(TokenType.RPAREN)
+            return MathFunction(data, expression)
+        elif kind == 'log base':
+            self.eat(TokenType.COMMA)
+            frame[0], frame[1] = 'log argument', expression
+            return None
+        elif kind == 'log argument':
+            self.eat(TokenType.RPAREN)
+            return MathFunction('log', expression, data)
+        elif kind == 'call':
+            identifier, derivative, args = data
+            args.append(expression)
+            if self.current_token.type == TokenType.COMMA:
+                self.eat(TokenType.COMMA)
+                return None
+            self.eat(TokenType.RPAREN)
+            return self.parse_postfix(Derivative(identifier, args) if derivative else FunctionCall(identifier, args))
+        # Matrix entry
+        rows = data
+        rows[-1].append(expression)
+        if self.current_token.type == TokenType.COMMA:
+            self.eat(TokenType.COMMA)
+            return None
+        self.eat(TokenType.RBRACKET)
+        if self.current_token.type == TokenType.COMMA:
+            self.eat(TokenType.COMMA)
+            self.eat(TokenType.LBRACKET)
+            rows.append([])
+            return None
+        self.eat(TokenType.RBRACKET)
+        self.eat(TokenType.RPAREN)
+        return matrix_literal(rows)
+
+    def reduce(self, operands, operators):
+        """Combine the two topmost operands with the topmost operator."""
+        right = operands.pop()
+        operands[-1] = BinaryExpression(operands[-1], operators.pop()[1], right)
 
     def parse_postfix(self, node):
         if self.current_token.type == TokenType.FACTORIAL:
             self.eat(TokenType.FACTORIAL)
-            node = {'type': 'Factorial', 'operand': node}
+            node = Factorial(node)
             
         return node
 
@@ -184,57 +320,12 @@ class Parser:
             self.eat(TokenType.RPAREN)
 
             if derivative:
-                return {'type': 'Derivative', 'function': identifier, 'arguments': args}
+                return Derivative(identifier, args)
 
             # Return function call node
-            return {'type': 'FunctionCall', 'name': identifier, 'arguments': args}
+            return FunctionCall(identifier, args)
         else:
 
             self.used_variables[self.current_line].add(identifier)
             # Return variable node
-            return {'type': 'Variable', 'value': identifier}
-
-        
-
-    def parse_math_function(self, token):
-        self.eat(token.type)
-
-        if token.value == 'log':
-            return self.parse_logarithm(token)
-        if token.value == 'matrix':
-            self.eat(TokenType.LPAREN)
-            matrix = self.parse_matrix_literal()
-            self.eat(TokenType.RPAREN)
-            return {'type': 'Matrix', 'elements': matrix}
-
-        self.eat(TokenType.LPAREN)
-        argument = self.parse_expression()
-        self.eat(TokenType.RPAREN)
-        return {'type': 'MathFunction', 'function': token.value, 'argument': argument}
-
-
-    def parse_logarithm(self, token):
-        self.eat(TokenType.LPAREN)
-        base = self.parse_expression()
-        self.eat(TokenType.COMMA)
-        argument = self.parse_expression()
-        self.eat(TokenType.RPAREN)
-        return {'type': 'MathFunction', 'function': token.value, 'base': base, 'argument': argument}
-
-    def parse_matrix_literal(self):
-        matrix = []
-        self.eat(TokenType.LBRACKET)
-        while True:
-            self.eat(TokenType.LBRACKET)
-            row = [self.parse_expression()]
-            while self.current_token.type == TokenType.COMMA:
-                self.eat(TokenType.COMMA)
-                row.append(self.parse_expression())
-            self.eat(TokenType.RBRACKET)
-            matrix.append(row)
-            if self.current_token.type == TokenType.COMMA:
-                self.eat(TokenType.COMMA)
-            else:
-                break
-        self.eat(TokenType.RBRACKET)
-        return matrix
+            return Variable(identifier)
@@ -0,0 +1,214 @@
+import json
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+
+from .compiler import child_nodes
+
+# Stages of running a program, in pipeline order
+STAGES = ('cache', 'lexer', 'parser', 'analyzer', 'interpreter')
+
+
+def node_types(tree):
+    """Count the nodes of an expression, or list of expressions, by type, counting shared nodes once."""
+    counts = Counter()
+    seen = set()
+    stack = list(tree) if isinstance(tree, list) else [tree]
+    while stack:
+        node = stack.pop()
+        if id(node) not in seen:
+            seen.add(id(node))
+            counts[node.type] += 1
+            stack.extend(child_nodes(node))
+    return counts
+
+
+class Profiler:
+    """Opt-in instrumentation of where a program spends its time.
+
+    It records three things:
+    - Stage times, exclusive of nested stages. The lexer runs inside the
+      parser, which runs inside the analyzer, and all of them run inside the
+      interpreter when the statements are streamed.
+    - Call counts and times of every user function and derivative.
+    - Counts of the expression nodes evaluated.
+
+    Compiled functions count the nodes of their body once per call, since the
+    generated code evaluates each of them once, shared subexpressions included.
+    Nothing is instrumented unless a Profiler is given to the Interpreter, so
+    the cost when profiling is disabled is nil.
+    """
+    def __init__(self):
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.stage_stack = []
+        self.stage_started = None
+        self.functions = {}
+        # Time spent in the functions called by each function being timed
+        self.children = []
+        self.node_evaluations = Counter()
+        # Number of calls and node counts of every compiled body
+        self.compiled = []
+
+    def enter(self, stage):
+        now = perf_counter()
+        if self.stage_stack:
+            self.stages[self.stage_stack[-1]] += now - self.stage_started
+        self.stage_stack.append(stage)
+        self.stage_started = now
+
+    def exit(self):
+        now = perf_counter()
+        self.stages[self.stage_stack.pop()] += now - self.stage_started
+        self.stage_started = now
+
+    @contextmanager
+    def stage(self, name):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def timed(self, stage, function):
+        """Wrap a callable so the time spent in it counts towards a stage."""
+        def timed(*arguments):
+            self.enter(stage)
+            try:
+                return function(*arguments)
+            finally:
+                self.exit()
+        return timed
+
+    def timed_iterator(self, stage, function):
+        """Wrap a generator function so the time spent producing each item counts towards a stage."""
+        def timed(*arguments):
+            iterator = function(*arguments)
+            while True:
+                self.enter(stage)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.exit()
+                yield item
+        return timed
+
+    def instrument(self, analyzer):
+        """Time the stages of a SemanticAnalyzer and the Parser and Lexer it reads from."""
+        analyzer.analyze = self.timed('analyzer', analyzer.analyze)
+        analyzer.analyze_statements = self.timed_iterator('analyzer', analyzer.analyze_statements)
+        parser = analyzer.parser
+        parser.parse = self.timed('parser', parser.parse)
+        parser.parse_statements = self.timed_iterator('parser', parser.parse_statements)
+        parser.lexer.get_next_token = self.timed('lexer', parser.lexer.get_next_token)
+        return analyzer
+
+    def run(self, interpreter):
+        """Interpret a program, with an Interpreter or ParallelExecutor, in the interpreter stage."""
+        with self.stage('interpreter'):
+            return interpreter.interpret()
+
+    def time_function(self, name, function):
+        """Wrap a function to count its calls and time them, in total and excluding nested calls."""
+        entry = self.functions.setdefault(name, {'calls': 0, 'cumulative': 0.0, 'own': 0.0})
+        children = self.children
+        def timed(*arguments):
+            entry['calls'] += 1
+            children.append(0.0)
+            start = perf_counter()
+            try:
+                return function(*arguments)
+            finally:
+                elapsed = perf_counter() - start
+                entry['cumulative'] += elapsed
+                entry['own'] += elapsed - children.pop()
+                if children:
+                    children[-1] += elapsed
+        return timed
+
+    def time_derivative(self, evaluate_derivative):
+        """Wrap Interpreter.evaluate_derivative to time gradients as f'."""
+        timers = {}
+        def timed(func_name, arguments):
+            if func_name not in timers:
+                timers[func_name] = self.time_function(f"{func_name}'", evaluate_derivative)
+            return timers[func_name](func_name, arguments)
+        return timed
+
+    def time_partial(self, evaluate_partial):
+        """Wrap Interpreter.evaluate_partial to time partial derivatives as f[xy]'."""
+        timers = {}
+        def timed(func_name, variables, arguments):
+            if (func_name, variables) not in timers:
+                name = f"{func_name}[{''.join(variables)}]'"
+                timers[func_name, variables] = self.time_function(name, evaluate_partial)
+            return timers[func_name, variables](func_name, variables, arguments)
+        return timed
+
+    def count_evaluations(self, evaluate_postorder):
+        """Wrap the tree-walker, which evaluates lists of nodes, to count the nodes it evaluates."""
+        counts = self.node_evaluations
+        def counted(nodes, variable_values):
+            counts.update(node.type for node in nodes)
+            return evaluate_postorder(nodes, variable_values)
+        return counted
+
+    def count_nodes(self, tree, function):
+        """Wrap a compiled body to count the nodes it evaluates on every call."""
+        record = [0, node_types(tree)]
+        self.compiled.append(record)
+        def counted(*arguments):
+            record[0] += 1
+            return function(*arguments)
+        return counted
+
+    def report(self):
+        """Return the measurements as a dict of plain values, ready for json.dumps."""
+        nodes = Counter(self.node_evaluations)
+        for calls, counts in self.compiled:
+            for node_type, count in counts.items():
+                nodes[node_type] += calls * count
+        functions = sorted(self.functions.items(), key=lambda item: item[1]['cumulative'], reverse=True)
+        return {
+            'total': sum(self.stages.values()),
+            'stages': dict(self.stages),
+            'functions': {name: dict(entry) for name, entry in functions if entry['calls']},
+            'nodes': dict(nodes.most_common()),
+        }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.report(), indent=indent)
+
+    def format_report(self):
+        """Return the report as text tables."""
+        report = self.report()
+        lines = [f"{'stage':<24}{'seconds':>12}"]
+        lines += [f"{stage:<24}{seconds:>12.6f}" for stage, seconds in report['stages'].items()]
+        lines.append(f"{'total':<24}{report['total']:>12.6f}")
+        if report['functions']:
+            lines += ['', f"{'function':<24}{'calls':>12}{'cumulative':>12}{'own':>12}"]
+            lines += [f"{name:<24}{entry['calls']:>12}{entry['cumulative']:>12.6f}{entry['own']:>12.6f}"
+                      for name, entry in report['functions'].items()]
+        if report['nodes']:
+            lines += ['', f"{'node':<24}{'evaluations':>12}"]
+            lines += [f"{node_type:<24}{count:>12}" for node_type, count in report['nodes'].items()]
+        return '\n'.join(lines)
+
+
+def profile(source, **options):
+    """Run a program with a Profiler attached and return its report.
+
+    Options are passed on to the Interpreter. The program prints as usual.
+    """
+    from .lexer import Lexer
+    from .parser import Parser
+    from .semantic import SemanticAnalyzer
+    from .interpreter import Interpreter
+
+    profiler = Profiler()
+    interpreter = Interpreter(None, profiler=profiler, **options)
+    analyzer = SemanticAnalyzer(Parser(Lexer(source, interpreter.numeric.number)))
+    interpreter.semantic_analyzer = profiler.instrument(analyzer)
+    profiler.run(interpreter)
+    return profiler.report()
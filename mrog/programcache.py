@@ -0,0 +1,121 @@
+import gc
+import hashlib
+import os
+import pickle
+import tempfile
+from contextlib import nullcontext
+
+from . import __version__
+from .lexer import Lexer
+from .parser import Parser
+from .semantic import SemanticAnalyzer
+
+# Directory created next to a .mg file to hold its cache entry, like __pycache__
+CACHE_DIRECTORY = '__mrogcache__'
+
+MAGIC = b'MROG'
+# Layout of the pickled statements, bumped whenever a node class changes its fields
+# (2: sparse matrix literals)
+CACHE_FORMAT = 2
+DIGEST_SIZE = 32
+
+
+def cache_path(path):
+    """Return the cache file of a .mg file, tagged with the mrog version and cache format like a .pyc file."""
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIRECTORY, f"{name}.mrog-{__version__}-{CACHE_FORMAT}.pickle")
+
+
+def source_key(source):
+    """Hash of a program and the mrog version and cache format that analyzed it."""
+    return hashlib.sha256(f"{__version__}\0{CACHE_FORMAT}\0{source}".encode()).digest()
+
+
+def load(path, source):
+    """Return the cached statements of a program, or None if the entry is missing, stale or corrupt.
+
+    An entry is the magic number, the hash of the source it was built from,
+    the hash of the pickled statements and the pickled statements. Statements
+    that cannot be unpickled, such as nodes of classes since renamed, are a
+    miss like a stale entry.
+    """
+    try:
+        with open(cache_path(path), 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+    header_size = len(MAGIC) + 2 * DIGEST_SIZE
+    if len(data) < header_size or not data.startswith(MAGIC):
+        return None
+    key = data[len(MAGIC):len(MAGIC) + DIGEST_SIZE]
+    digest = data[len(MAGIC) + DIGEST_SIZE:header_size]
+    payload = data[header_size:]
+    if key != source_key(source) or digest != hashlib.sha256(payload).digest():
+        return None
+    # The collector would otherwise rescan the growing tree many times while it is loaded
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        statements = pickle.loads(payload)
+    except Exception:
+        return None
+    finally:
+        if enabled:
+            gc.enable()
+    return statements if isinstance(statements, list) else None
+
+
+def store(path, source, statements):
+    """Write the cache entry of a program, returning whether it could be written."""
+    try:
+        payload = pickle.dumps(statements, protocol=pickle.HIGHEST_PROTOCOL)
+    except RecursionError:
+        return False
+    data = MAGIC + source_key(source) + hashlib.sha256(payload).digest() + payload
+    target = cache_path(path)
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Readers never see a partly written entry
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, target)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+    except OSError:
+        return False
+    return True
+
+
+class CachedProgram:
+    """Analyzed statements of a program, in place of the SemanticAnalyzer given to an Interpreter."""
+    def __init__(self, statements):
+        self.statements = statements
+
+    def analyze(self):
+        return self.statements
+
+    def analyze_statements(self):
+        return iter(self.statements)
+
+
+def analyze(path, source, profiler=None):
+    """Return the analyzed program of a .mg file, from its cache entry when it is up to date.
+
+    On a miss the program is lexed, parsed and analyzed as usual and the
+    entry is rewritten. Programs with errors raise before anything is cached.
+    A Profiler times reading and writing the entry as the cache stage.
+    """
+    stage = profiler.stage if profiler else lambda name: nullcontext()
+    with stage('cache'):
+        statements = load(path, source)
+    if statements is None:
+        analyzer = SemanticAnalyzer(Parser(Lexer(source)))
+        if profiler:
+            profiler.instrument(analyzer)
+        statements = analyzer.analyze()
+        with stage('cache'):
+            store(path, source, statements)
+    return CachedProgram(statements)
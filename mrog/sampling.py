@@ -0,0 +1,215 @@
+import numpy as np
+
+from .batch import CSVWriter, NpyWriter, DEFAULT_CHUNK_SIZE
+from .exceptions import InvalidGridError
+
+# Error of linear interpolation between the samples, relative to the range of the function when it exceeds 1
+DEFAULT_TOLERANCE = 1e-4
+
+# Most points sampled, and times the cells of the initial grid may be halved
+MAX_POINTS = 1000000
+MAX_DEPTH = 20
+
+
+class AdaptiveSampler:
+    """Sample a function of one or two variables where linear interpolation needs it.
+
+    Sampling starts from a uniform grid and halves, in rounds, the intervals
+    or rectangular cells whose interpolation error may exceed the tolerance.
+    The error of a cell is estimated in two ways: from the second derivatives
+    at its corners, given by the derivative strategy of the interpreter, and
+    from the error actually measured at the points added when its parent was
+    split, or along the lines of the initial grid. Every round evaluates the
+    new points of all cells, and their second derivatives, in one call of the
+    vectorized functions, so flat regions keep the initial spacing while the
+    points gather where the function bends or breaks.
+    """
+    def __init__(self, interpreter, function_name, tolerance=DEFAULT_TOLERANCE, max_points=MAX_POINTS,
+                 max_depth=MAX_DEPTH, curvature=True):
+        self.evaluator = interpreter.vectorized_evaluator()
+        self.function_name = function_name
+        self.function_variables, _ = interpreter.functions[function_name]
+        if len(self.function_variables) not in (1, 2):
+            raise InvalidGridError(f"only functions of one or two variables can be sampled but "
+                                   f"{function_name} has {len(self.function_variables)}")
+        self.tolerance = tolerance
+        self.max_points = max_points
+        self.max_depth = max_depth
+        self.curvature = curvature
+        self.stats = {'evaluations': 0, 'derivative_evaluations': 0, 'rounds': 0, 'uniform_points': 0}
+
+    def sample(self, grid):
+        """Return the points, of shape (points, variables), and the values sampled over a grid.
+
+        The grid, as returned by `parse_grid`, gives the range and the number
+        of initial points of each variable. Points are ordered by their first
+        coordinate, then their second.
+        """
+        missing = [v for v in self.function_variables if v not in grid]
+        if missing:
+            raise InvalidGridError(f"no range given for variable {', '.join(missing)} of {self.function_name}")
+        axes = [grid[v] for v in self.function_variables]
+        if any(len(axis) < 2 or axis[0] == axis[-1] for axis in axes):
+            raise InvalidGridError("sampling needs a range of at least 2 initial points for every variable")
+        with np.errstate(all='ignore'):
+            if len(axes) == 1:
+                return self.sample_interval(*axes)
+            return self.sample_rectangle(*axes)
+
+    def values(self, *coordinates):
+        values = self.evaluator.evaluate(self.function_name, *coordinates)
+        if values.shape != np.shape(coordinates[0]):
+            raise InvalidGridError(f"{self.function_name} does not return a number and cannot be sampled")
+        self.stats['evaluations'] += values.size
+        return values
+
+    def second_derivatives(self, *coordinates):
+        """Return the absolute second derivative along each variable at every point, zero without curvature."""
+        shape = np.shape(coordinates[0])
+        if not self.curvature:
+            return [np.zeros(shape) for _ in self.function_variables]
+        derivatives = []
+        with np.errstate(all='ignore'):
+            for variable in self.function_variables:
+                value = self.evaluator.compiler.partial(self.function_name, (variable, variable), coordinates)
+                derivatives.append(np.abs(np.broadcast_to(np.asarray(value, dtype=float), shape)))
+        self.stats['derivative_evaluations'] += int(np.prod(shape))
+        return derivatives
+
+    def scaled_tolerance(self, values):
+        finite = values[np.isfinite(values)]
+        spread = finite.max() - finite.min() if finite.size else 0.0
+        return self.tolerance * max(1.0, spread)
+
+    def budget(self, cells, errors, points, points_per_cell):
+        """Keep the cells with the largest errors that can be split without exceeding the maximum points."""
+        room = max(0, (self.max_points - points) // points_per_cell)
+        if len(cells) <= room:
+            return cells
+        order = np.argsort(-np.nan_to_num(errors[cells], nan=np.inf))
+        return np.sort(cells[order[:room]])
+
+    def sample_interval(self, axis):
+        xs = np.linspace(axis[0], axis[-1], len(axis))
+        ys = self.values(xs)
+        (curvatures,) = self.second_derivatives(xs)
+        tolerance = self.scaled_tolerance(ys)
+        # Error measured along the initial grid at each point, from the line through its neighbours
+        deviation = np.zeros(len(xs))
+        deviation[1:-1] = np.abs(ys[1:-1] - (ys[:-2] + ys[2:]) / 2)
+        measured = np.fmax(deviation[:-1], deviation[1:]) / 4
+        smallest = abs(xs[1] - xs[0]) / 2 ** self.max_depth
+        while True:
+            widths = np.abs(np.diff(xs))
+            errors = np.fmax(widths ** 2 / 8 * np.fmax(curvatures[:-1], curvatures[1:]), measured)
+            split = np.flatnonzero(~(errors <= tolerance) & (widths > 1.5 * smallest))
+            split = self.budget(split, errors, len(xs), 1)
+            if not len(split):
+                break
+            self.stats['rounds'] += 1
+            middles = (xs[split] + xs[split + 1]) / 2
+            values = self.values(middles)
+            (middle_curvatures,) = self.second_derivatives(middles)
+            # Each half keeps a quarter of the error measured at the middle, as with a smooth function
+            error = np.abs(values - (ys[split] + ys[split + 1]) / 2) / 4
+            measured[split] = error
+            measured = np.insert(measured, split + 1, error)
+            xs = np.insert(xs, split + 1, middles)
+            ys = np.insert(ys, split + 1, values)
+            curvatures = np.insert(curvatures, split + 1, middle_curvatures)
+        self.stats['uniform_points'] = int(round(abs(xs[-1] - xs[0]) / np.abs(np.diff(xs)).min())) + 1
+        return xs[:, None], ys
+
+    def sample_rectangle(self, x_axis, y_axis):
+        """Sample over a rectangle, splitting cells in four on a lattice of the smallest spacing."""
+        unit = 2 ** self.max_depth
+        x0, y0 = x_axis[0], y_axis[0]
+        dx = (x_axis[-1] - x0) / ((len(x_axis) - 1) * unit)
+        dy = (y_axis[-1] - y0) / ((len(y_axis) - 1) * unit)
+        # Points are identified by their lattice coordinates i and j through the key i * stride + j
+        stride = (len(y_axis) - 1) * unit + 1
+        i, j = (a.ravel() for a in np.meshgrid(np.arange(len(x_axis)) * unit, np.arange(len(y_axis)) * unit,
+                                                  indexing='ij'))
+        keys = i * stride + j
+        values = self.values(x0 + i * dx, y0 + j * dy)
+        fxx, fyy = self.second_derivatives(x0 + i * dx, y0 + j * dy)
+        tolerance = self.scaled_tolerance(values)
+
+        # Error measured along the lines of the initial grid, and the cells of the initial grid
+        grid = values.reshape(len(x_axis), len(y_axis))
+        deviation = np.zeros(grid.shape)
+        deviation[1:-1, :] = np.abs(grid[1:-1, :] - (grid[:-2, :] + grid[2:, :]) / 2)
+        deviation[:, 1:-1] = np.fmax(deviation[:, 1:-1], np.abs(grid[:, 1:-1] - (grid[:, :-2] + grid[:, 2:]) / 2))
+        measured = np.fmax.reduce([deviation[:-1, :-1], deviation[1:, :-1], deviation[:-1, 1:],
+                                   deviation[1:, 1:]]).ravel() / 4
+        cell_i = i.reshape(grid.shape)[:-1, :-1].ravel()
+        cell_j = j.reshape(grid.shape)[:-1, :-1].ravel()
+        size = unit
+        # Cells of one round all have the same size, being halved together
+        while len(cell_i):
+            corners = [np.searchsorted(keys, (cell_i + di) * stride + cell_j + dj)
+                       for di, dj in ((0, 0), (size, 0), (0, size), (size, size))]
+            curvature = ((size * dx) ** 2 * np.fmax.reduce([fxx[c] for c in corners])
+                         + (size * dy) ** 2 * np.fmax.reduce([fyy[c] for c in corners])) / 8
+            errors = np.fmax(curvature, measured)
+            split = np.flatnonzero(~(errors <= tolerance)) if size > 1 else np.array([], dtype=int)
+            split = self.budget(split, errors, len(keys), 5)
+            if not len(split):
+                break
+            self.stats['rounds'] += 1
+            half = size // 2
+            corners = [c[split] for c in corners]
+            cell_i, cell_j = cell_i[split], cell_j[split]
+            # The middle of the cell and of its four sides, with the corners they are interpolated from
+            middles = [((half, half), (0, 1, 2, 3)), ((half, 0), (0, 1)), ((0, half), (0, 2)),
+                       ((size, half), (1, 3)), ((half, size), (2, 3))]
+            new_keys = np.concatenate([(cell_i + di) * stride + cell_j + dj for (di, dj), _ in middles])
+            new_keys = np.setdiff1d(new_keys, keys)
+            new_i, new_j = new_keys // stride, new_keys % stride
+            new_values = self.values(x0 + new_i * dx, y0 + new_j * dy)
+            new_fxx, new_fyy = self.second_derivatives(x0 + new_i * dx, y0 + new_j * dy)
+            keys = np.concatenate([keys, new_keys])
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+            values = np.concatenate([values, new_values])[order]
+            fxx = np.concatenate([fxx, new_fxx])[order]
+            fyy = np.concatenate([fyy, new_fyy])[order]
+            corner_values = [values[np.searchsorted(keys, (cell_i + di) * stride + cell_j + dj)]
+                             for di, dj in ((0, 0), (size, 0), (0, size), (size, size))]
+            # Each quarter keeps a quarter of the largest error measured at the new points, as with a smooth function
+            error = np.zeros(len(split))
+            for (di, dj), ends in middles:
+                value = values[np.searchsorted(keys, (cell_i + di) * stride + cell_j + dj)]
+                interpolated = sum(corner_values[k] for k in ends) / len(ends)
+                error = np.fmax(error, np.abs(value - interpolated) / 4)
+            cell_i = np.concatenate([cell_i, cell_i + half, cell_i, cell_i + half])
+            cell_j = np.concatenate([cell_j, cell_j, cell_j + half, cell_j + half])
+            measured = np.tile(error, 4)
+            size = half
+        self.stats['uniform_points'] = ((len(x_axis) - 1) * unit // size + 1) * ((len(y_axis) - 1) * unit // size + 1)
+        points = np.column_stack([x0 + keys // stride * dx, y0 + keys % stride * dy])
+        return points, values
+
+
+def write_samples(output, function_name, function_variables, points, values, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write samples a chunk at a time, as CSV rows of the point and its value or as a .npy array of those rows.
+
+    The output is a file name ending in .npy, any other file name for CSV, or
+    an open text file for CSV.
+    """
+    if not isinstance(output, str):
+        writer = CSVWriter(output, function_name, function_variables)
+    elif output.endswith('.npy'):
+        writer = NpyWriter(output, len(values))
+    else:
+        with open(output, 'w') as file:
+            return write_samples(file, function_name, function_variables, points, values, chunk_size)
+    try:
+        for start in range(0, len(values), chunk_size):
+            chunk_points, chunk_values = points[start:start + chunk_size], values[start:start + chunk_size]
+            if isinstance(writer, NpyWriter):
+                # Rows hold the coordinates too, since the points are not on a grid
+                chunk_values = np.column_stack([chunk_points, chunk_values])
+            writer.write(chunk_points, chunk_values)
+    finally:
+        writer.close()
@@ -16,20 +16,32 @@ class SemanticAnalyzer:
 
         return ast
 
+    def analyze_statements(self):
+        """Generate the analyzed statements one at a time as they are parsed."""
+        for statement in self.parser.parse_statements():
+            self.analyze_statement(statement)
+            yield statement
+            self.current_line += 1
+
     def analyze_statement(self, statement):
-        statement_type = statement['type']
+        statement_type = statement.type
         method_name = 'analyze_' + statement_type
         analyzer = getattr(self, method_name, self.generic_analyze)
         return analyzer(statement)
     
     def generic_analyze(self, statement):
-        raise Exception(f'No analyze method defined for statement type {statement["type"]}')
+        raise Exception(f'No analyze method defined for statement type {statement.type}')
     
     def analyze_FunctionDefinition(self, statement):
+        self.check_definition(statement, self.parser.used_variables[self.current_line],
+                              self.parser.functions_called[self.current_line])
+
+    def check_definition(self, statement, used_variables, functions_called):
+        """Check a function definition given the variables and functions the parser saw in its line."""
         # Get function details
-        function_name = statement['name']
-        function_variables = statement['function_variables']
-        expression = statement['expression']
+        function_name = statement.name
+        function_variables = statement.function_variables
+        expression = statement.expression
 
         # Check if the function variables are valid
         for var in function_variables:
@@ -39,11 +51,11 @@ class SemanticAnalyzer:
         # Check if the function expression variables match the function variables
         non_function_variables = VARIABLES.difference(set(function_variables))
         for var in non_function_variables:
-            if var in self.parser.used_variables[self.current_line]:
+            if var in used_variables:
                 raise InvalidExpressionVariableError(self.current_line, function_name, var, function_variables)
             
         # Check if any of the functions that are called in the current function expressions dont exist
-        for function in self.parser.functions_called[self.current_line]:
+        for function in functions_called:
             if function not in self.functions.keys():
                 raise UndefinedFunctionError(self.current_line, function)
 
@@ -52,21 +64,43 @@ class SemanticAnalyzer:
         self.functions[function_name] = function
 
 
+    def analyze_IntegrateStatement(self, statement):
+        self.check_analysis_function('integrate', statement.function)
+
+    def analyze_SolveStatement(self, statement):
+        self.check_analysis_function('solve', statement.function)
+
+    def check_analysis_function(self, statement, function_name):
+        """Check that integrate or solve is given a function of one variable and constant numbers."""
+        if function_name not in self.functions.keys():
+            raise UndefinedFunctionError(self.current_line, function_name)
+        function_variables, _ = self.functions[function_name]
+        if len(function_variables) != 1:
+            raise InvalidAnalysisArgumentError(self.current_line, statement,
+                                               f"{function_name} must be a function of one variable")
+        used_variables = self.parser.used_variables[self.current_line]
+        if used_variables:
+            raise InvalidAnalysisArgumentError(self.current_line, statement, "bounds, starting points and "
+                                               f"tolerances cannot use variable {min(used_variables)}")
+        for function in self.parser.functions_called[self.current_line]:
+            if function not in self.functions.keys():
+                raise UndefinedFunctionError(self.current_line, function)
+
     def analyze_PrintStatement(self, statement):
         # Extract the argument of the print call
-        print_arg = statement['argument']
+        print_arg = statement.argument
 
         # Check if the argument is a function call
-        if print_arg['type'] == 'FunctionCall':
+        if print_arg.type == 'FunctionCall':
             # Get the function name
-            function_name = print_arg['name']
+            function_name = print_arg.name
             # Check if the function is defined
             if function_name not in self.functions.keys():
                 raise UndefinedFunctionError(self.current_line, function_name)
             
         # Check if the argument is a function call by function name only. ie. print(f)
-        if print_arg['type'] == 'Variable':
-            if print_arg['value'] not in self.functions.keys():
-                raise UndefinedFunctionError(self.current_line, print_arg['value'])
+        if print_arg.type == 'Variable':
+            if print_arg.value not in self.functions.keys():
+                raise UndefinedFunctionError(self.current_line, print_arg.value)
 
 
@@ -0,0 +1,240 @@
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from decimal import Decimal
+from fractions import Fraction
+
+from .session import Session, STATEMENT_ERRORS
+from .parallel import ParallelExecutor
+from .exceptions import *
+
+# Port listened on unless given, on the local host only
+DEFAULT_PORT = 7340
+
+# Smallest batch evaluated in the worker processes rather than by the server itself
+DEFAULT_OFFLOAD_POINTS = 2048
+
+# Longest request line, which bounds the points of a batch
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+# Latest latencies of each operation kept for the percentiles of the stats request
+LATENCY_WINDOW = 4096
+
+# Errors answered with an error response instead of closing the connection
+REQUEST_ERRORS = (*STATEMENT_ERRORS, InvalidRequestError, ArithmeticError, ValueError)
+
+
+def json_value(value):
+    """Return a result as a JSON value, exact and non-finite numbers as text and matrices as lists of rows."""
+    if isinstance(value, (Fraction, Decimal)):
+        return str(value)
+    # JSON has no infinities or NaN: "inf", "-inf" and "nan" are read back as numbers
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    if hasattr(value, 'tolist'):
+        return json_value(value.tolist())
+    if isinstance(value, list):
+        return [json_value(v) for v in value]
+    return value
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class EvaluationServer:
+    """Long-running evaluator answering requests sent as lines of JSON.
+
+    Every request is an object with an "op" and an optional "id" echoed in
+    its response:
+    - {"op": "define", "source": "f(x) = x^2\\n"} runs statements in the
+      server's session, answering with the lines they print.
+    - {"op": "evaluate", "function": "f", "arguments": [2]} answers with the
+      "value" of a call.
+    - {"op": "batch", "function": "f", "points": [[1], [2]]} answers with the
+      "values" at every point.
+    - {"op": "stats"} answers with request counts and latency percentiles.
+
+    Functions stay defined and compiled between requests and connections, so
+    a request costs its evaluation only. Batches of at least `offload_points`
+    points are evaluated in a pool of worker processes, with the functions
+    sent once per set of definitions, while the event loop keeps serving
+    other connections. Requests of one connection are answered in order, so
+    a client may send many without waiting. Numbers may be given as text to
+    be read exactly in the numeric mode of the session, and infinite or NaN
+    results are answered as "inf", "-inf" or "nan". Every response has
+    "ok", an "error" message when it is false, and "metrics" with the time
+    from receiving the request to answering it and the time spent evaluating.
+    """
+    def __init__(self, session=None, workers=None, offload_points=DEFAULT_OFFLOAD_POINTS, **options):
+        self.session = session or Session(**options)
+        self.interpreter = self.session.interpreter
+        self.workers = workers
+        self.offload_points = offload_points
+        # Worker processes, started with the first offloaded batch
+        self.executor = None
+        self.operations = {'define': self.define, 'evaluate': self.evaluate, 'batch': self.batch,
+                           'stats': self.stats}
+        self.requests = dict.fromkeys(self.operations, 0)
+        self.latencies = {operation: deque(maxlen=LATENCY_WINDOW) for operation in self.operations}
+        self.errors = 0
+        self.offloaded = 0
+        self.started = time.perf_counter()
+
+    def close(self):
+        if self.executor:
+            self.executor.close()
+            self.executor = None
+
+    async def start(self, path=None, host='127.0.0.1', port=DEFAULT_PORT):
+        """Listen on a Unix socket if a path is given, else on a TCP port, and return the asyncio server."""
+        if path:
+            return await asyncio.start_unix_server(self.handle, path, limit=MAX_REQUEST_BYTES)
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_REQUEST_BYTES)
+
+    async def serve(self, path=None, host='127.0.0.1', port=DEFAULT_PORT, ready=None):
+        """Serve requests until cancelled, calling `ready` with the asyncio server once listening."""
+        listener = await self.start(path, host, port)
+        try:
+            async with listener:
+                if ready:
+                    ready(listener)
+                await listener.serve_forever()
+        finally:
+            self.close()
+
+    async def handle(self, reader, writer):
+        """Answer the requests of a connection in order until it is closed."""
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(self.encode({'id': None, 'ok': False, 'error': InvalidRequestError(
+                        f"requests are limited to {MAX_REQUEST_BYTES} bytes").message}))
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    writer.write(self.encode(await self.respond(line)))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def encode(self, response):
+        return json.dumps(response, allow_nan=False).encode() + b'\n'
+
+    async def respond(self, line):
+        """Return the response to one request line."""
+        received = time.perf_counter()
+        request_id = operation = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                raise InvalidRequestError("expected a JSON object per line")
+            if not isinstance(request, dict):
+                raise InvalidRequestError("expected a JSON object per line")
+            request_id, operation = request.get('id'), request.get('op')
+            if operation not in self.operations:
+                raise InvalidRequestError(f"unknown operation {json.dumps(operation)}, "
+                                          f"expected one of {', '.join(self.operations)}")
+            response = {'id': request_id, 'ok': True}
+            metrics = await self.operations[operation](request, response)
+        except REQUEST_ERRORS as e:
+            response = {'id': request_id, 'ok': False, 'error': getattr(e, 'message', str(e))}
+            metrics = {}
+            self.errors += 1
+        latency = time.perf_counter() - received
+        if operation in self.operations:
+            self.requests[operation] += 1
+            self.latencies[operation].append(latency)
+        response['metrics'] = {'latency_ms': latency * 1000, **metrics}
+        return response
+
+    async def define(self, request, response):
+        source = self.field(request, 'source', str)
+        started = time.perf_counter()
+        try:
+            response['output'] = self.session.execute(source if source.endswith('\n') else source + '\n')
+        finally:
+            # Statements before an error keep their effect, so the workers need new functions either way
+            if self.executor:
+                self.executor.snapshot_id = None
+        return {'compute_ms': (time.perf_counter() - started) * 1000}
+
+    async def evaluate(self, request, response):
+        function_name = self.function(request)
+        arguments = self.point(function_name, self.field(request, 'arguments', list))
+        started = time.perf_counter()
+        response['value'] = json_value(self.interpreter.call_function(function_name, arguments))
+        return {'compute_ms': (time.perf_counter() - started) * 1000}
+
+    async def batch(self, request, response):
+        function_name = self.function(request)
+        points = self.field(request, 'points', list)
+        points = [self.point(function_name, point) for point in points]
+        started = time.perf_counter()
+        offloaded = len(points) >= self.offload_points
+        if offloaded:
+            if self.executor is None:
+                self.executor = ParallelExecutor(self.interpreter, self.workers)
+            chunks = await asyncio.gather(*map(asyncio.wrap_future,
+                                               self.executor.submit_points(function_name, points)))
+            values = [value for chunk in chunks for value in chunk]
+            self.offloaded += 1
+        else:
+            values = [self.interpreter.call_function(function_name, point) for point in points]
+        response['values'] = [json_value(value) for value in values]
+        return {'compute_ms': (time.perf_counter() - started) * 1000, 'points': len(points),
+                'offloaded': offloaded}
+
+    async def stats(self, request, response):
+        response['uptime_s'] = time.perf_counter() - self.started
+        response['functions'] = len(self.interpreter.functions)
+        response['errors'] = self.errors
+        response['offloaded_batches'] = self.offloaded
+        response['requests'] = {}
+        for operation, count in self.requests.items():
+            latencies = self.latencies[operation]
+            entry = {'count': count}
+            if latencies:
+                entry.update({f"{name}_ms": percentile(latencies, fraction) * 1000
+                              for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1))})
+            response['requests'][operation] = entry
+        return {}
+
+    def field(self, request, name, kind):
+        if not isinstance(request.get(name), kind):
+            raise InvalidRequestError(f"{request['op']} needs a \"{name}\" {kind.__name__}")
+        return request[name]
+
+    def function(self, request):
+        function_name = self.field(request, 'function', str)
+        if function_name not in self.interpreter.functions:
+            raise InvalidRequestError(f"function {function_name} is not defined")
+        return function_name
+
+    def point(self, function_name, values):
+        """Return the arguments of a call as numbers of the session, checking their count."""
+        function_variables, _ = self.interpreter.functions[function_name]
+        if not isinstance(values, list) or len(values) != len(function_variables):
+            raise InvalidRequestError(f"{function_name} takes {len(function_variables)} arguments "
+                                      f"but got {json.dumps(values)}")
+        return [self.number(value) for value in values]
+
+    def number(self, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise InvalidRequestError(f"expected a number but got {json.dumps(value)}")
+        numeric = self.interpreter.numeric
+        try:
+            if numeric.name == 'float':
+                return float(value)
+            return numeric.number(value if isinstance(value, str) else repr(value))
+        except (ArithmeticError, ValueError):
+            raise InvalidRequestError(f"expected a number but got {json.dumps(value)}")
@@ -0,0 +1,107 @@
+import sys
+
+from .lexer import Lexer
+from .parser import Parser
+from .semantic import SemanticAnalyzer
+from .interpreter import Interpreter
+from .compiler import dependents
+from .exceptions import *
+
+# Errors reported for a statement without ending the session
+STATEMENT_ERRORS = (InvalidVariableError, InvalidIdentifierError, InvalidExpressionVariableError,
+                    InvalidArgumentError, InvalidSyntaxError, UnknownSymbolError, UndefinedFunctionError,
+                    InvalidPrintArgumentError, InvalidAnalysisArgumentError, AnalysisError, InvalidOperandError,
+                    NotDifferentiableError, InvalidMatrixOperationError)
+
+# Errors reported at the prompt, which include those of evaluating a statement with floats
+REPL_ERRORS = (*STATEMENT_ERRORS, ArithmeticError, ValueError)
+
+
+class Session:
+    """Interpreter that accepts statements a few at a time and keeps its state between them.
+
+    A call graph built from `Parser.functions_called` records which functions
+    each definition calls. When a function is redefined, only the functions
+    calling it, directly or not, are analyzed again and lose their compiled
+    forms, derivative trees and cached results. Every other function stays
+    compiled and keeps its caches, so editing one function of a large library
+    does not cost more than the functions that use it.
+    """
+    def __init__(self, **options):
+        self.interpreter = Interpreter(None, **options)
+        self.analyzer = SemanticAnalyzer(None)
+        # Each definition as written, with the variables and functions the parser saw in its line
+        self.definitions = {}
+        # Functions called by each function, and functions calling each function
+        self.calls = {}
+        self.callers = {}
+        # Line of the next statement, counted over the whole session
+        self.line = 1
+
+    def execute(self, text):
+        """Run the statements of a text and return the lines printed by its print statements.
+
+        Statements run as they are read, so those before an error keep their
+        effect, as when a file is streamed.
+        """
+        parser = Parser(Lexer(text, self.interpreter.numeric.number))
+        parser.current_line = self.line
+        self.analyzer.parser = parser
+        output = []
+        for statement in parser.parse_statements():
+            self.analyzer.current_line = self.line
+            if statement.type == 'FunctionDefinition':
+                self.define(statement, parser.used_variables[self.line], parser.functions_called[self.line])
+            else:
+                self.analyzer.analyze_statement(statement)
+                if self.interpreter.optimizer:
+                    statement = self.interpreter.optimizer.optimize_statement(statement)
+                output.append(self.interpreter.format_statement(statement))
+            self.line += 1
+        return output
+
+    def define(self, statement, used_variables, functions_called):
+        """Check and install a definition, then analyze again every function depending on it.
+
+        The callers are checked with the variables and functions recorded when
+        they were read, so their lines are not parsed again, and compiled
+        again when next called.
+        """
+        name = statement.name
+        self.analyzer.check_definition(statement, used_variables, functions_called)
+        dependents = self.dependents(name) if name in self.definitions else []
+        self.definitions[name] = (statement, set(used_variables), set(functions_called))
+        for callee in self.calls.get(name, ()):
+            self.callers[callee].discard(name)
+        self.calls[name] = set(functions_called)
+        for callee in functions_called:
+            self.callers.setdefault(callee, set()).add(name)
+        if self.interpreter.optimizer:
+            statement = self.interpreter.optimizer.optimize_statement(statement)
+        # The interpreter optimizes again the callers that inlined the previous definition
+        self.interpreter.handle_function_definition(statement, dependents)
+        for dependent in dependents:
+            statement, used_variables, functions_called = self.definitions[dependent]
+            self.analyzer.check_definition(statement, used_variables, functions_called)
+            self.interpreter.invalidate(dependent, [])
+
+    def dependents(self, function_name):
+        """Return the functions calling a function, directly or not, each after the functions it calls."""
+        return dependents(self.callers, function_name)
+
+def repl(session, input=input, output=sys.stdout):
+    """Read statements from the user and print their results until the end of the input."""
+    while True:
+        try:
+            line = input(f"[{session.line}] ")
+        except (EOFError, KeyboardInterrupt):
+            print(file=output)
+            return
+        if not line.strip():
+            continue
+        try:
+            for printed in session.execute(line + '\n'):
+                print(printed, file=output)
+        except REPL_ERRORS as e:
+            # The statements before the error keep their effect and the session goes on
+            print(e, file=output)
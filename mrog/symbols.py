@@ -31,5 +31,7 @@ SYMBOLS = {
 
 
 BUILTIN_FUNCTIONS = {
-    'print': TokenType.PRINT
+    'print': TokenType.PRINT,
+    'integrate': TokenType.INTEGRATE,
+    'solve': TokenType.SOLVE,
 }
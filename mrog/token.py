@@ -17,6 +17,8 @@ class TokenType(Enum):
 
     # Built-in functions
     PRINT = auto()
+    INTEGRATE = auto()
+    SOLVE = auto()
 
     # Unary operators
     FACTORIAL = auto()
@@ -37,6 +39,8 @@ class TokenType(Enum):
     EOF = auto()     # End of File
 
 class Token:
+    __slots__ = ('type', 'value')
+
     def __init__(self, type, value):
         self.type = type
         self.value = value
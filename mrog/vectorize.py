@@ -0,0 +1,195 @@
+import math
+from decimal import Decimal
+from fractions import Fraction
+
+import numpy as np
+
+from .compiler import Compiler
+from .exceptions import InvalidGridError, NotDifferentiableError, CompilationError
+
+# Mapping of function names to their corresponding NumPy ufuncs
+TRIG_UFUNCS_MAP = {
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+    'csc': lambda x: 1 / np.sin(x),
+    'sec': lambda x: 1 / np.cos(x),
+    'cot': lambda x: 1 / np.tan(x),
+    'sinh': np.sinh,
+    'cosh': np.cosh,
+    'tanh': np.tanh,
+    'csch': lambda x: 1 / np.sinh(x),
+    'sech': lambda x: 1 / np.cosh(x),
+    'coth': lambda x: 1 / np.tanh(x),
+    'asin': np.arcsin,
+    'acos': np.arccos,
+    'atan': np.arctan,
+    'acsc': lambda x: np.arcsin(1 / x),
+    'asec': lambda x: np.arccos(1 / x),
+    'acot': lambda x: np.arctan(1 / x),
+    'asinh': np.arcsinh,
+    'acosh': np.arccosh,
+    'atanh': np.arctanh,
+    'acsch': lambda x: np.arcsinh(1 / x),
+    'asech': lambda x: np.arccosh(1 / x),
+    'acoth': lambda x: np.arctanh(1 / x),
+}
+
+MATH_UFUNCS_MAP = {
+    'exp': np.exp,
+    'sqrt': np.sqrt,
+    'ln': np.log,
+    'abs': np.abs,
+}
+
+def _scalar_factorial(operand):
+    try:
+        return float(math.factorial(int(operand)))
+    except OverflowError:
+        return math.inf
+    except ValueError:
+        return math.nan
+
+_factorial_ufunc = np.frompyfunc(_scalar_factorial, 1, 1)
+
+
+def log(argument, base):
+    """Logarithm of an array in an array base, matching `math.log(argument, base)`."""
+    return np.log(argument) / np.log(base)
+
+
+def factorial(operand):
+    """Factorial of every element, truncating to integers like the scalar interpreter."""
+    return np.asarray(_factorial_ufunc(operand), dtype=float)
+
+
+class VectorizedCompiler(Compiler):
+    """Compiler producing callables that take NumPy arrays for x, y and z."""
+    def __init__(self, interpreter):
+        super().__init__(interpreter, {**MATH_UFUNCS_MAP, **TRIG_UFUNCS_MAP}, log=log, factorial=factorial,
+                         derivative=self.derivative, partial=self.partial)
+        # Vectorized exact partial derivatives per function, keyed by the tuple of variables
+        self.derivative_functions = {}
+
+    def fallback(self, function_name):
+        """Apply the scalar interpreter element by element when a body cannot be compiled."""
+        interpreter = self.interpreter
+        function_variables, _ = interpreter.functions[function_name]
+        def scalar(*arguments):
+            return interpreter.call_function(function_name, list(arguments))
+        if interpreter.numeric.exact:
+            # Entries of the arrays are read as numbers of the run
+            convert = interpreter.numeric.convert
+            def scalar(*arguments):
+                return interpreter.call_function(function_name, [convert(a) for a in arguments])
+        ufunc = np.frompyfunc(scalar, len(function_variables), 1)
+        def elementwise(*arguments):
+            return np.asarray(ufunc(*arguments[:len(function_variables)]), dtype=float)
+        elementwise.__name__ = function_name
+        return elementwise
+
+    def constant(self, value):
+        """Return a Python expression for a constant, as a float like the entries of the arrays."""
+        if isinstance(value, (Fraction, Decimal)):
+            value = float(value)
+        return super().constant(value)
+
+    def derivative(self, func_name, arguments):
+        """Gradient of a function over arrays of points."""
+        function_variables, _ = self.interpreter.functions[func_name]
+        if len(function_variables) == 1:
+            return self.partial(func_name, tuple(function_variables), arguments)
+        return [self.partial(func_name, (var,), arguments) for var in function_variables]
+
+    def partial(self, func_name, variables, arguments):
+        """Partial derivative over arrays of points, exact unless it cannot be derived."""
+        if self.interpreter.derivative_strategy == 'symbolic':
+            functions = self.derivative_functions.setdefault(func_name, {})
+            if variables not in functions:
+                try:
+                    tree = self.interpreter.differentiator.partial(func_name, variables)
+                    function_variables, _ = self.interpreter.functions[func_name]
+                    functions[variables] = self.compile_definition(func_name, function_variables, tree)
+                except (NotDifferentiableError, CompilationError):
+                    functions[variables] = None
+            if functions[variables] is not None:
+                return functions[variables](*arguments)
+        return self.finite_difference(func_name, variables, arguments)
+
+    def finite_difference(self, func_name, variables, arguments, h=1e-6):
+        """Central-difference partial derivative over arrays of points."""
+        if not variables:
+            return self.registry[func_name](*arguments)
+        function_variables, _ = self.interpreter.functions[func_name]
+        i = function_variables.index(variables[-1])
+        plus_args = list(arguments)
+        minus_args = list(arguments)
+        plus_args[i] = plus_args[i] + h
+        minus_args[i] = minus_args[i] - h
+        plus = self.finite_difference(func_name, variables[:-1], plus_args, h)
+        minus = self.finite_difference(func_name, variables[:-1], minus_args, h)
+        return (plus - minus) / (2*h)
+
+
+class VectorizedEvaluator:
+    """Evaluate user functions over NumPy arrays of points in a single call."""
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.compiler = VectorizedCompiler(interpreter)
+        self.compiled_functions = self.compiler.registry
+        interpreter.function_caches.extend([self.compiled_functions, self.compiler.derivative_functions])
+
+    def evaluate(self, function_name, *arguments):
+        """Evaluate a function with arrays as the values of its variables."""
+        arrays = [np.asarray(a, dtype=float) for a in arguments]
+        with np.errstate(all='ignore'):
+            result = np.asarray(self.compiled_functions[function_name](*arrays))
+        # Bodies that do not depend on every variable still return one value per point
+        shape = np.broadcast(*arrays).shape if arrays else ()
+        if result.shape[result.ndim - len(shape):] != shape:
+            result = np.broadcast_to(result[(...,) + (None,) * len(shape)], result.shape + shape)
+        return result
+
+    def evaluate_grid(self, function_name, grid):
+        """Evaluate a function on the Cartesian product of per-variable axes.
+
+        Returns the meshgrid arrays, one per function variable, and the values.
+        """
+        function_variables, _ = self.interpreter.functions[function_name]
+        missing = [v for v in function_variables if v not in grid]
+        if missing:
+            raise InvalidGridError(f"no range given for variable {', '.join(missing)} of {function_name}")
+        axes = [grid[v] for v in function_variables]
+        mesh = np.meshgrid(*axes, indexing='ij')
+        return mesh, self.evaluate(function_name, *mesh)
+
+
+def parse_grid(specifications):
+    """Parse grid specifications such as ``x=0:1:101`` into per-variable axes.
+
+    Each specification gives a variable, the start and stop of the range and
+    the number of points, which are spaced evenly with both ends included.
+    """
+    grid = {}
+    for specification in specifications:
+        variable, _, bounds = specification.partition('=')
+        parts = bounds.split(':')
+        if not variable or len(parts) != 3:
+            raise InvalidGridError(f"expected VAR=START:STOP:NUM but got {specification}")
+        try:
+            start, stop, num = float(parts[0]), float(parts[1]), int(parts[2])
+        except ValueError:
+            raise InvalidGridError(f"expected VAR=START:STOP:NUM but got {specification}")
+        grid[variable.strip()] = np.linspace(start, stop, num)
+    return grid
+
+
+def write_grid(file, function_name, function_variables, mesh, values):
+    """Write grid results as CSV, one row per point with matrix entries as extra columns."""
+    columns = [m.ravel() for m in mesh]
+    header = list(function_variables)
+    entry_shape = values.shape[:values.ndim - mesh[0].ndim] if mesh else values.shape
+    for index in np.ndindex(*entry_shape):
+        columns.append(values[index].ravel())
+        header.append(function_name + ''.join(f"[{i}]" for i in index))
+    np.savetxt(file, np.column_stack(columns), fmt='%.17g', delimiter=',', header=','.join(header), comments='')
@@ -3,8 +3,11 @@ from setuptools import setup, find_packages
 
 setup(
     name='mrog',
-    version='0.1',
+    version='0.1',  # keep in sync with mrog.__version__
     packages=find_packages(),
+    install_requires=[
+        'numpy',
+    ],
     entry_points={
         'console_scripts': [
             'mrog = mrog.mrog:main',
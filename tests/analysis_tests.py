@@ -0,0 +1,103 @@
+import contextlib
+import io
+import math
+import unittest
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter
+from mrog.session import Session
+from mrog.analysis import integrate, solve
+from mrog.exceptions import *
+
+
+def run(text, **options):
+    session = Session(**options)
+    return session, session.execute(text)
+
+
+class TestAnalysis(unittest.TestCase):
+
+    def test_parse(self):
+        """integrate and solve are statements with an optional tolerance."""
+        ast = Parser(Lexer("f(x) = x\nintegrate(f, 0, 1)\nsolve(f, 1, 0.001)\n")).parse()
+        self.assertEqual([s.type for s in ast], ['FunctionDefinition', 'IntegrateStatement', 'SolveStatement'])
+        self.assertIsNone(ast[1].tolerance)
+        self.assertEqual(ast[2].tolerance.value, 0.001)
+
+    def test_integrate(self):
+        """Integrals are computed in batches of 15 points per interval."""
+        session, output = run("f(x) = x^2\nintegrate(f, 0, 3)\n")
+        self.assertEqual(output, ["integrate(f, 0, 3) = 9.0"])
+        label, stats = session.interpreter.analysis_stats[0]
+        self.assertEqual(label, "integrate(f, 0, 3)")
+        self.assertEqual((stats['evaluations'], stats['batches'], stats['intervals']), (15, 1, 1))
+
+    def test_adaptive_integrate(self):
+        """Intervals are bisected until each is accurate enough, with all of them evaluated together."""
+        session, _ = run("f(x) = sqrt(x)\ng(x) = sin(x) * exp(0 - x)\nh(x) = sin(x)^2\n")
+        value, stats = integrate(session.interpreter, 'f', 0, 1)
+        self.assertAlmostEqual(value, 2 / 3, places=9)
+        self.assertGreater(stats['intervals'], 1)
+        self.assertEqual(stats['evaluations'] % 15, 0)
+        value, stats = integrate(session.interpreter, 'h', 0, 100)
+        self.assertAlmostEqual(value, 50 - math.sin(200) / 4, places=8)
+        self.assertLess(stats['batches'], stats['intervals'])
+        value, _ = integrate(session.interpreter, 'g', 0, 10, 1e-6)
+        self.assertAlmostEqual(value, (1 - math.exp(-10) * (math.sin(10) + math.cos(10))) / 2, places=6)
+        value, _ = integrate(session.interpreter, 'g', 10, 0)
+        self.assertLess(value, 0)
+
+    def test_integrate_limit(self):
+        session, _ = run("f(x) = 1 / x\n")
+        with self.assertRaises(AnalysisError):
+            integrate(session.interpreter, 'f', -1, 1, max_evaluations=1000)
+
+    def test_solve(self):
+        """Newton's method finds roots with derivatives from the strategy of the run."""
+        for strategy in ('symbolic', 'finite'):
+            session, output = run("f(x) = x^2 - 2\nsolve(f, 1)\n", derivative_strategy=strategy)
+            self.assertEqual(output, [f"solve(f, 1) = {math.sqrt(2)}"])
+            _, stats = session.interpreter.analysis_stats[0]
+            self.assertGreater(stats['iterations'], 1)
+            self.assertEqual(stats['derivative_evaluations'], stats['iterations'])
+        session, _ = run("g(x) = sin(x) * exp(0 - x)\n")
+        root, _ = solve(session.interpreter, 'g', 3)
+        self.assertAlmostEqual(root, math.pi)
+
+    def test_solve_failure(self):
+        """A function without a zero stops the iteration with an error."""
+        session, _ = run("f(x) = x^2 + 1\n")
+        with self.assertRaises(AnalysisError):
+            session.execute("solve(f, 1)\n")
+
+    def test_fraction(self):
+        """Functions are evaluated in the numbers of the run."""
+        session, output = run("f(x) = x^2 - 1/4\nsolve(f, 1)\nintegrate(f, 0, 1)\n", numeric='fraction')
+        self.assertAlmostEqual(float(output[0].split(' = ')[1]), 0.5)
+        self.assertAlmostEqual(float(output[1].split(' = ')[1]), 1 / 12)
+
+    def test_interpret(self):
+        """Statements are printed in order with the print statements of a program."""
+        program = "f(x) = 2 * x\nprint(f(1))\nintegrate(f, 0, 1)\nsolve(f, 1)\n"
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            Interpreter(SemanticAnalyzer(Parser(Lexer(program)))).interpret()
+        self.assertEqual(output.getvalue().splitlines(),
+                         ["f(1) = 2.0", "integrate(f, 0, 1) = 1.0", "solve(f, 1) = 0.0"])
+
+    def test_semantic_errors(self):
+        session = Session()
+        session.execute("f(x, y) = x * y\ng(x) = x\n")
+        with self.assertRaises(InvalidAnalysisArgumentError):
+            session.execute("integrate(f, 0, 1)\n")
+        with self.assertRaises(InvalidAnalysisArgumentError):
+            session.execute("solve(g, x)\n")
+        with self.assertRaises(UndefinedFunctionError):
+            session.execute("integrate(h, 0, 1)\n")
+        with self.assertRaises(UndefinedFunctionError):
+            session.execute("integrate(g, 0, h(1))\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+from tests.compiler_tests import run
+from mrog.nodes import FunctionDefinition, Variable
+from mrog.approximation import approximate, parse_interval
+from mrog.exceptions import AnalysisError, InvalidGridError
+
+PROGRAM = "f(x) = log(2, acosh(x)) * csch(x) + x\ng(x) = f(x) * 2\n"
+
+
+class TestApproximation(unittest.TestCase):
+
+    def test_error_bound(self):
+        """Piecewise and single Chebyshev approximations are within the tolerance, called with numbers or arrays."""
+        interpreter = run(PROGRAM)
+        exact = interpreter.compiler.compile_function('f')
+        vectorized = interpreter.vectorized_evaluator().compiler.compile_function('f')
+        x = np.random.default_rng(1).uniform(1.5, 6, 2000)
+        for degree in (3, 7, 12):
+            approximation = approximate('f', exact, vectorized, 1.5, 6, 1e-9, degree)
+            self.assertLessEqual(approximation.max_error, 1e-9)
+            self.assertLess(np.abs(approximation.evaluate(x) - vectorized(x)).max(), 2e-9)
+            self.assertLess(max(abs(approximation(v) - exact(v)) for v in x.tolist()), 2e-9)
+        # Away from the branch point of acosh a single Chebyshev approximation is enough
+        approximation = approximate('f', exact, vectorized, 3, 6, 1e-9, 12)
+        self.assertEqual(approximation.pieces, 1)
+        self.assertLess(max(abs(approximation(v) - exact(v)) for v in np.linspace(3, 6, 1000)), 2e-9)
+        self.assertIsInstance(approximation(2.0), float)
+        # Outside the interval the exact function is evaluated
+        self.assertEqual(approximation(7.0), exact(7.0))
+        with np.errstate(divide='ignore'):
+            expected = vectorized(np.array([1.0, 7.0]))
+        np.testing.assert_array_equal(approximation.evaluate(np.array([1.0, 7.0])), expected)
+        self.assertAlmostEqual(approximation(np.nextafter(6, 0)), exact(6.0), places=8)
+
+    def test_interpreter(self):
+        """Callers and the NumPy evaluator use the approximation until the function is redefined."""
+        interpreter = run(PROGRAM)
+        exact = interpreter.call_function('g', [2.5])
+        interpreter.approximate('f', 1.5, 6, 1e-12)
+        self.assertAlmostEqual(interpreter.call_function('g', [2.5]), exact, places=11)
+        self.assertIn('f', interpreter.approximations)
+        approximation = interpreter.approximations['f']
+        evaluator = interpreter.vectorized_evaluator()
+        self.assertIs(evaluator.compiled_functions['f'].__self__, approximation)
+        self.assertAlmostEqual(float(evaluator.evaluate('g', np.array([2.5]))[0]), exact, places=11)
+        interpreter.handle_function_definition(FunctionDefinition('f', ['x'], Variable('x')))
+        self.assertNotIn('f', interpreter.approximations)
+        self.assertEqual(interpreter.call_function('g', [2.5]), 5.0)
+        self.assertIsNot(interpreter.approximations['f'], approximation)
+
+    def test_failures(self):
+        interpreter = run(PROGRAM + "h(x, y) = x\n")
+        exact = interpreter.compiler.compile_function('f')
+        vectorized = interpreter.vectorized_evaluator().compiler.compile_function('f')
+        with self.assertRaises(AnalysisError):
+            approximate('f', exact, vectorized, 0, 2)
+        with self.assertRaises(AnalysisError):
+            approximate('f', exact, vectorized, 1.5, 6, 1e-15, max_pieces=4)
+        with self.assertRaises(AnalysisError):
+            approximate('f', exact, vectorized, 1.5, 6, 1e-15)
+        with self.assertRaises(AnalysisError):
+            approximate('f', exact, vectorized, 1.5, 6, degree=20)
+        interpreter.approximate('h', 0, 1)
+        with self.assertRaises(AnalysisError):
+            interpreter.call_function('h', [0.5, 1])
+
+    def test_parse_interval(self):
+        self.assertEqual(parse_interval("f=0:2.5"), ('f', 0.0, 2.5))
+        with self.assertRaises(InvalidGridError):
+            parse_interval("f=0:1:2")
+
+
+if __name__ == '__main__':
+    unittest.main()
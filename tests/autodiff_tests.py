@@ -0,0 +1,53 @@
+import unittest
+from tests.compiler_tests import run
+from mrog.autodiff import Dual
+from mrog.interpreter import TRIG_FUNCTIONS_MAP, MATH_FUNCTIONS_MAP
+
+
+def run_forward(program):
+    interpreter = run(program)
+    interpreter.derivative_strategy = 'forward'
+    return interpreter
+
+
+class TestForwardDifferentiation(unittest.TestCase):
+
+    def test_matches_symbolic(self):
+        """Dual numbers agree with the symbolic derivative for every built-in function."""
+        points = {'acosh': 1.7, 'asec': 1.7, 'acsc': 1.7, 'acoth': 1.7, 'asech': 0.4, 'atanh': 0.4}
+        for name in list(TRIG_FUNCTIONS_MAP) + list(MATH_FUNCTIONS_MAP):
+            with self.subTest(function=name):
+                program = f"f(x, y) = {name}(x*y/3) + log(y, x + 1)^x\n"
+                args = [2 * points.get(name, 0.6), 1.5]
+                expected = run(program).evaluate_derivative('f', args)
+                for a, b in zip(run_forward(program).evaluate_derivative('f', args), expected):
+                    self.assertAlmostEqual(a, b, places=10)
+
+    def test_matrix_jacobian(self):
+        """A matrix-valued function of three variables yields one matrix per variable."""
+        interpreter = run_forward("g(x) = x^2\nm(x, y, z) = matrix([[x*y*z, g(z)], [3!, y/x]])\n")
+        self.assertEqual(interpreter.evaluate_derivative('m', [1.0, 2.0, 3.0]),
+                         [[[6.0, 0.0], [0.0, -2.0]], [[3.0, 0.0], [0.0, 1.0]], [[2.0, 6.0], [0.0, 0.0]]])
+
+    def test_derivative_inside_body(self):
+        """f'(...) inside a body is differentiated through its symbolic tree."""
+        interpreter = run_forward("f(x) = sin(x)\ng(x) = f'(x^2)\n")
+        self.assertAlmostEqual(interpreter.evaluate_derivative('g', [0.5]), -2 * 0.5 * 0.24740395925452294)
+
+    def test_dual_arithmetic(self):
+        """Dual numbers follow the product, quotient and power rules."""
+        x = Dual(2.0, (1.0, 0.0))
+        y = Dual(3.0, (0.0, 1.0))
+        result = x * y / (x + 1) + 2 ** x - y ** 2
+        self.assertEqual(result.value, 2.0 + 4.0 - 9.0)
+        self.assertAlmostEqual(result.gradient[0], 3 / 9 + 4 * 0.6931471805599453)
+        self.assertAlmostEqual(result.gradient[1], 2 / 3 - 6)
+
+    def test_factorial_falls_back(self):
+        """Functions without a derivative fall back to finite differences."""
+        interpreter = run_forward("f(x) = x! + x\n")
+        self.assertAlmostEqual(interpreter.evaluate_derivative('f', [3.5]), 1.0, places=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+from tests.compiler_tests import run
+from mrog.batch import evaluate_file
+from mrog.exceptions import InvalidInputError
+
+PROGRAM = """
+f(x, y) = x*y + 1
+m(x) = matrix([[x, 1], [0, x^2]])
+"""
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.interpreter = run(PROGRAM)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_csv_header_and_chunks(self):
+        """Header columns are matched to variables and every chunk size gives the same rows."""
+        with open(self.path('points.csv'), 'w') as file:
+            file.write("y,x\n2,1\n3,4\n\n5,6\n")
+        outputs = []
+        for chunk_size in (1, 2, 100):
+            output = io.StringIO()
+            self.assertEqual(evaluate_file(self.interpreter, 'f', self.path('points.csv'), output, chunk_size), 3)
+            outputs.append(output.getvalue())
+        self.assertEqual(outputs, [outputs[0]] * 3)
+        self.assertEqual(outputs[0].splitlines(), ["x,y,f", "1,2,3", "4,3,13", "6,5,31"])
+
+    def test_npy_matrix_output(self):
+        """Memory-mapped .npy input gives a .npy file with one value per point."""
+        np.save(self.path('points.npy'), np.arange(10.0))
+        evaluate_file(self.interpreter, 'm', self.path('points.npy'), self.path('values.npy'), chunk_size=3)
+        values = np.load(self.path('values.npy'))
+        self.assertEqual(values.shape, (10, 2, 2))
+        np.testing.assert_array_equal(values[:, 1, 1], np.arange(10.0) ** 2)
+
+    def test_invalid_input(self):
+        """Inputs with the wrong columns are reported."""
+        np.save(self.path('points.npy'), np.zeros((4, 3)))
+        with open(self.path('points.csv'), 'w') as file:
+            file.write("x,z\n1,2\n")
+        for name in ('points.npy', 'points.csv'):
+            with self.assertRaises(InvalidInputError):
+                evaluate_file(self.interpreter, 'f', self.path(name), io.StringIO())
+
+
+if __name__ == '__main__':
+    unittest.main()
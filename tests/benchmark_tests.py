@@ -0,0 +1,36 @@
+import unittest
+from benchmarks.suite import run_workload, compare, regressions, best_time, STAGES, MIN_MEASURED_SECONDS
+from benchmarks.workloads import WORKLOADS
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_workloads_run(self):
+        """Every generated workload goes through the whole pipeline without errors."""
+        for name, generate in WORKLOADS.items():
+            with self.subTest(workload=name):
+                self.assertEqual(generate(1), generate(1))
+                result = run_workload(generate(1), repeat=1)
+                self.assertGreater(result['statements'], 0)
+                self.assertEqual(set(result['seconds']), set(STAGES))
+
+    def test_short_stages_repeated(self):
+        """Stages shorter than the minimum measurement are called several times per measurement."""
+        calls = []
+        seconds, result = best_time(lambda: calls.append(1) or len(calls), 3)
+        self.assertGreater(len(calls), 3)
+        self.assertEqual(result, len(calls))
+        self.assertLess(seconds, MIN_MEASURED_SECONDS)
+
+    def test_compare(self):
+        baseline = {'results': {'deep': {'seconds': {'lexer': 1.0, 'parser': 2.0, 'analyzer': 0.0}}}}
+        results = {'results': {'deep': {'seconds': {'lexer': 1.5, 'parser': 2.0, 'analyzer': 0.1}},
+                               'wide': {'seconds': {'lexer': 1.0}}}}
+        rows = compare(results, baseline)
+        self.assertEqual(rows, [('deep', 'lexer', 1.0, 1.5, 1.5), ('deep', 'parser', 2.0, 2.0, 1.0)])
+        self.assertEqual(regressions(rows, 0.25), rows[:1])
+        self.assertEqual(regressions(rows, 0.6), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import contextlib
+import io
+import unittest
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter, MATH_FUNCTIONS_MAP, TRIG_FUNCTIONS_MAP
+from mrog.bytecode import Code, execute, disassemble, LOAD, LOAD_CONST, ADD
+from mrog.optimizer import Optimizer
+from mrog.profiler import Profiler
+from mrog.nodes import *
+
+PROGRAM = """
+f(x) = 2*x
+g(x) = 4*f(x) + log(3, x^2)
+h(x, y) = sin(x)*csc(y) + sqrt(x^2 + y^2) - 3!/x
+m(x, y) = matrix([[x*y, f(x)], [acoth(y), f'(y)]])
+n(x, y) = m(x, y) * m(x, y) + h'(x, y)
+"""
+
+def run(text, **options):
+    interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(text))), **options)
+    interpreter.interpret()
+    return interpreter
+
+
+class TestBytecode(unittest.TestCase):
+
+    def setUp(self):
+        """Build one interpreter running bytecode and one walking trees for the same program."""
+        self.bytecode = run(PROGRAM, bytecode=True)
+        self.walked = run(PROGRAM, compile=False)
+
+    def define(self, name, variables, expression):
+        for interpreter in (self.bytecode, self.walked):
+            interpreter.handle_function_definition(FunctionDefinition(name, variables, expression))
+
+    def assertParity(self, name, arguments):
+        expected = self.walked.call_function(name, list(arguments))
+        actual = self.bytecode.call_function(name, list(arguments))
+        self.assertEqual(str(actual), str(expected), name)
+        self.assertTrue(hasattr(self.bytecode.compiled_functions[name], 'code'), name)
+
+    def test_matches_tree_walker(self):
+        """Bytecode functions return the same values as the tree-walker for every statement kind."""
+        cases = [('f', [3.0]), ('g', [2.0]), ('h', [1.5, 2.5]), ('m', [1.0, 2.0]), ('n', [1.0, 2.0])]
+        for name, arguments in cases:
+            self.assertParity(name, arguments)
+
+    def test_every_node_type(self):
+        """Every node kind, including those only built internally, evaluates as in the tree-walker."""
+        x, y = Variable('x'), Variable('y')
+        for operator in ('+', '-', '*', '/', '^', '.*'):
+            self.define('b', ['x', 'y'], BinaryExpression(x, operator, y))
+            self.assertParity('b', [1.5, 2.5])
+        for function in list(MATH_FUNCTIONS_MAP) + list(TRIG_FUNCTIONS_MAP):
+            # Inside the domain of every inverse function
+            argument = Number(2.5) if function in ('acosh', 'asec', 'acsc', 'acoth') else Number(0.5)
+            self.define('u', ['x'], MathFunction(function, BinaryExpression(argument, '*', x)))
+            self.assertParity('u', [1.0])
+        self.define('l', ['x', 'y'], MathFunction('log', x, y))
+        self.assertParity('l', [8.0, 2.0])
+        self.define('k', ['x'], Factorial(BinaryExpression(x, '+', Number(2.0))))
+        self.assertParity('k', [3.0])
+        self.define('c', [], Matrix([[Number(1.0), Number(2.0)], [Number(3.0), Number(4.0)]]))
+        self.define('p', ['x', 'y'], BinaryExpression(Derivative('h', [x, y], ['x']), '+',
+                                                      Derivative('h', [x, y], ['x', 'y'])))
+        self.define('z', ['x'], BinaryExpression(FunctionCall('c', []), '*', x))
+        self.assertParity('p', [1.5, 2.5])
+        self.assertParity('z', [2.0])
+
+    def test_shared_subexpressions(self):
+        """Subexpressions shared by several parents are computed once into a temporary."""
+        optimizer = Optimizer({**MATH_FUNCTIONS_MAP, **TRIG_FUNCTIONS_MAP})
+        expression = optimizer.optimize_expression(Parser(Lexer("f(x) = sin(x^2) * sin(x^2) + sin(x^2)")).parse()[0]
+                                                   .expression)
+        self.define('s', ['x'], expression)
+        self.assertParity('s', [0.7])
+        code = self.bytecode.compiled_functions['s'].code
+        self.assertEqual(code.temporaries, 1)
+        self.assertEqual(code.disassemble().count('sin'), 1)
+
+    def test_extended_arguments(self):
+        """Operands above 255 are encoded with EXTENDED_ARG prefixes."""
+        terms = [Number(float(i)) for i in range(600)]
+        expression = terms[0]
+        for term in terms[1:]:
+            expression = BinaryExpression(expression, '+', term)
+        self.define('e', ['x'], BinaryExpression(expression, '*', Variable('x')))
+        self.assertParity('e', [2.0])
+        code = self.bytecode.compiled_functions['e'].code
+        self.assertEqual(len(code.constants), 600)
+        self.assertIn('LOAD_CONST             599 (599.0)', code.disassemble())
+
+    def test_fallback(self):
+        """Bodies that cannot be assembled are walked instead."""
+        self.define('v', ['x'], BinaryExpression(Variable('x'), '+', Variable('y')))
+        function = self.bytecode.compiled_functions['v']
+        self.assertFalse(hasattr(function, 'code'))
+        self.assertEqual(function.__name__, 'v')
+
+    def test_redefinition_invalidates(self):
+        """Calls from bytecode are resolved through the registry, so they see redefinitions."""
+        self.assertEqual(self.bytecode.call_function('g', [1.0]), 8.0)
+        self.bytecode.handle_function_definition(FunctionDefinition('f', ['x'], Number(0.0)))
+        self.assertEqual(self.bytecode.call_function('g', [1.0]), 0.0)
+
+    def test_code(self):
+        """Code stores opcodes and float constants in arrays and runs on its own."""
+        code = Code('t', ['x'])
+        code.emit(LOAD, 0)
+        code.emit(LOAD_CONST, code.constant(-0.0))
+        code.emit(LOAD_CONST, code.constant(0.0))
+        code.emit(ADD)
+        code.emit(ADD)
+        self.assertEqual(code.instructions.typecode, 'B')
+        self.assertEqual(code.constants.typecode, 'd')
+        self.assertEqual(len(code.constants), 2)
+        self.assertEqual(execute(code, (1.5,), {}, None, None, None), 1.5)
+        with self.assertRaises(TypeError):
+            execute(code, (), {}, None, None, None)
+
+    def test_disassemble(self):
+        """The disassembler lists instructions with their operands spelled out."""
+        listing = disassemble(self.bytecode.compiled_functions['g'])
+        self.assertEqual(listing.splitlines()[1:], [
+            "     0 LOAD_CONST               0 (4.0)",
+            "     2 LOAD                     0 (x)",
+            "     4 CALL_FUNCTION            0 (f)",
+            "     6 MULTIPLY",
+            "     8 LOAD                     0 (x)",
+            "    10 LOAD_CONST               1 (2.0)",
+            "    12 POWER",
+            "    14 LOAD_CONST               2 (3.0)",
+            "    16 LOG                      1 (log)",
+            "    18 ADD",
+        ])
+        with self.assertRaises(TypeError):
+            disassemble(self.walked.compiled_functions['g'])
+
+    def test_profiler_counts_nodes(self):
+        """The profiler counts the nodes of bytecode bodies like those of compiled Python."""
+        profiler = Profiler()
+        interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer("f(x) = x + 1\nprint(f(2))\n"))),
+                                  bytecode=True, profiler=profiler)
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.interpret()
+        nodes = profiler.report()['nodes']
+        self.assertEqual((nodes['BinaryExpression'], nodes['Variable']), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from tests.compiler_tests import run
+from mrog.cache import LRUCache
+from mrog.nodes import FunctionDefinition, Variable
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_eviction_and_counters(self):
+        """The least recently used entry is evicted and hits, misses and bypasses are counted."""
+        calls = []
+        cache = LRUCache(maxsize=2)
+        square = cache.wrap(lambda x: calls.append(x) or x * x)
+        self.assertEqual([square(1), square(2), square(1), square(3), square(2)], [1, 4, 1, 9, 4])
+        self.assertEqual(calls, [1, 2, 3, 2])
+        self.assertEqual(list(cache.data), [(3,), (2,)])
+        self.assertEqual(cache.stats(),
+                         {'hits': 1, 'misses': 4, 'bypassed': 0, 'size': 2, 'maxsize': 2})
+
+    def test_unhashable_arguments_bypass(self):
+        """Matrix arguments are not cached."""
+        cache = LRUCache()
+        identity = cache.wrap(lambda x: x)
+        self.assertEqual(identity([[1.0]]), [[1.0]])
+        self.assertEqual((cache.bypassed, len(cache)), (1, 0))
+
+
+class TestMemoization(unittest.TestCase):
+
+    def test_nested_calls_and_redefinition(self):
+        """Nested calls hit the cache and redefining a callee invalidates its callers' results."""
+        for compile in (True, False):
+            interpreter = run("g(x) = x^2\nh(x) = g(2) + g(x)\n", compile=compile)
+            interpreter.memoize('g', maxsize=8)
+            interpreter.memoize('h', maxsize=8)
+            self.assertEqual(interpreter.call_function('h', [3.0]), 13.0)
+            self.assertEqual(interpreter.call_function('h', [3.0]), 13.0)
+            self.assertEqual(interpreter.memo_stats()['h']['hits'], 1)
+            self.assertEqual(interpreter.memo_stats()['g']['misses'], 2)
+            interpreter.handle_function_definition(FunctionDefinition('g', ['x'], Variable('x')))
+            self.assertEqual(interpreter.call_function('h', [3.0]), 5.0)
+            # A new function cannot change any cached result
+            interpreter.handle_function_definition(FunctionDefinition('k', ['x'], Variable('x')))
+            self.assertEqual(interpreter.call_function('h', [3.0]), 5.0)
+            self.assertEqual(interpreter.memo_stats()['h']['hits'], 2)
+
+    def test_opt_in(self):
+        """Functions are only cached when memoization is enabled for them."""
+        interpreter = run("g(x) = x^2\nh(x) = g(x)\n")
+        interpreter.memoize('g')
+        interpreter.call_function('h', [1.0])
+        self.assertEqual(list(interpreter.memo_stats()), ['g'])
+
+
+if __name__ == '__main__':
+    unittest.main()
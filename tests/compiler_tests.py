@@ -0,0 +1,52 @@
+import unittest
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter
+from mrog.nodes import FunctionDefinition, Number
+
+PROGRAM = """
+f(x) = 2*x
+g(x) = 4*f(x) + log(3, x^2)
+h(x, y) = sin(x)*csc(y) + sqrt(x^2 + y^2) - 3!/x
+m(x, y) = matrix([[x*y, f(x)], [acoth(y), f'(y)]])
+"""
+
+def run(text, compile=True):
+    interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(text))), compile=compile)
+    interpreter.interpret()
+    return interpreter
+
+
+class TestCompiler(unittest.TestCase):
+
+    def setUp(self):
+        """Build one compiling and one tree-walking interpreter for the same program."""
+        self.compiled = run(PROGRAM)
+        self.walked = run(PROGRAM, compile=False)
+
+    def test_compiled_matches_tree_walker(self):
+        """Compiled functions return the same values as the tree-walker."""
+        cases = [('f', [3.0]), ('g', [2.0]), ('h', [1.5, 2.5]), ('m', [1.0, 2.0])]
+        for name, args in cases:
+            self.assertEqual(self.compiled.call_function(name, args),
+                             self.walked.call_function(name, args))
+            self.assertTrue(hasattr(self.compiled.compiled_functions[name], 'source'))
+            self.assertFalse(hasattr(self.walked.compiled_functions[name], 'source'))
+
+    def test_redefinition_invalidates(self):
+        """Redefining a function drops its compiled form and nested calls see the new body."""
+        self.assertEqual(self.compiled.call_function('g', [1.0]), 8.0)
+        self.compiled.handle_function_definition(FunctionDefinition('f', ['x'], Number(0.0)))
+        self.assertNotIn('f', self.compiled.compiled_functions)
+        self.assertEqual(self.compiled.call_function('g', [1.0]), 0.0)
+
+    def test_uncompilable_function_falls_back(self):
+        """Functions referring to unbound names fall back to the tree-walker."""
+        interpreter = run("k(x) = x + w\n")
+        self.assertEqual(interpreter.call_function('k', ['x']), 'xw')
+        self.assertEqual(interpreter.compiled_functions['k']('x'), 'xw')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from tests.compiler_tests import run
+from mrog.interpreter import TRIG_FUNCTIONS_MAP, MATH_FUNCTIONS_MAP
+from mrog.nodes import FunctionDefinition, BinaryExpression, Number, Variable
+
+
+class TestDifferentiation(unittest.TestCase):
+
+    def assertGradientsClose(self, program, name, args, places=5):
+        symbolic = run(program).evaluate_derivative(name, args)
+        finite = run(program, compile=False)
+        finite.derivative_strategy = 'finite'
+        expected = finite.evaluate_derivative(name, args)
+        if not isinstance(expected, list):
+            symbolic, expected = [symbolic], [expected]
+        for s, e in zip(symbolic, expected):
+            self.assertAlmostEqual(s, e, places=places)
+
+    def test_builtin_functions(self):
+        """Every built-in function is differentiated through the chain rule."""
+        points = {'acosh': 1.7, 'asec': 1.7, 'acsc': 1.7, 'acoth': 1.7, 'asech': 0.4, 'atanh': 0.4}
+        for name in list(TRIG_FUNCTIONS_MAP) + list(MATH_FUNCTIONS_MAP):
+            with self.subTest(function=name):
+                self.assertGradientsClose(f"f(x) = {name}(x^2/2 + 0.1)\n", 'f', [points.get(name, 0.6)])
+
+    def test_rules(self):
+        """Sum, product, quotient, power and logarithm rules, including variable exponents and bases."""
+        program = "f(x, y) = x*y^3 - x/y + x^y + 2^x + log(y, x^2) + log(3, x*y)\n"
+        self.assertGradientsClose(program, 'f', [1.3, 2.1], places=4)
+
+    def test_exact_and_nested_calls(self):
+        """Derivatives through nested calls and f' inside bodies are exact."""
+        interpreter = run("f(x) = x^3\ng(x, y) = f(x*y) + f'(y)\n")
+        self.assertEqual(interpreter.evaluate_derivative('f', [3.0]), 27.0)
+        self.assertEqual(interpreter.evaluate_derivative('g', [1.0, 2.0]), [24.0, 12.0 + 12.0])
+
+    def test_matrix_valued(self):
+        """Matrix-valued functions give a matrix per variable."""
+        interpreter = run("m(x, y) = matrix([[x*y, sin(x)], [3!, y^2]])\n")
+        self.assertEqual(interpreter.evaluate_derivative('m', [0.0, 2.0]),
+                         [[[2.0, 1.0], [0.0, 0.0]], [[0.0, 0.0], [0.0, 4.0]]])
+
+    def test_cache_and_invalidation(self):
+        """Derivative trees are cached per function and dropped when it is redefined."""
+        interpreter = run("f(x) = x^2\ng(x) = f(x) + x\n")
+        self.assertEqual(interpreter.evaluate_derivative('g', [2.0]), 5.0)
+        self.assertIn(('x',), interpreter.differentiator.trees['g'])
+        interpreter.handle_function_definition(
+            FunctionDefinition('f', ['x'], BinaryExpression(Number(3.0), '*', Variable('x'))))
+        self.assertNotIn('f', interpreter.differentiator.trees)
+        self.assertEqual(interpreter.evaluate_derivative('g', [2.0]), 4.0)
+
+    def test_factorial_falls_back(self):
+        """Expressions without a symbolic derivative use finite differences."""
+        interpreter = run("f(x) = x! + x\n")
+        self.assertAlmostEqual(interpreter.evaluate_derivative('f', [3.5]), 1.0, places=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 from mrog.lexer import Lexer
 from mrog.token import Token, TokenType
+from mrog.exceptions import UnknownSymbolError
 
 class TestLexer(unittest.TestCase):
 
@@ -54,6 +55,39 @@ class TestLexer(unittest.TestCase):
             self.assertEqual(token.type, expected_token.type)
             self.assertEqual(token.value, expected_token.value)
 
+    def test_tokenize_statements(self):
+        """tokenize() yields every token of a program, skipping comments, and ends with EOF."""
+        input_text = "f(x, y) = 2.5*x^2 + sin(y)! # comment\nprint(f'(3., 1))"
+        tokens = [(t.type, t.value) for t in Lexer(input_text).tokenize()]
+
+        expected_tokens = [
+            (TokenType.IDENTIFIER, 'f'), (TokenType.LPAREN, '('), (TokenType.IDENTIFIER, 'x'),
+            (TokenType.COMMA, ','), (TokenType.IDENTIFIER, 'y'), (TokenType.RPAREN, ')'),
+            (TokenType.EQUAL, '='), (TokenType.NUMBER, 2.5), (TokenType.MUL, '*'),
+            (TokenType.IDENTIFIER, 'x'), (TokenType.POW, '^'), (TokenType.NUMBER, 2.0),
+            (TokenType.PLUS, '+'), (TokenType.TRIG_FUNCTION, 'sin'), (TokenType.LPAREN, '('),
+            (TokenType.IDENTIFIER, 'y'), (TokenType.RPAREN, ')'), (TokenType.FACTORIAL, '!'),
+            (TokenType.PRINT, 'print'), (TokenType.LPAREN, '('), (TokenType.IDENTIFIER, 'f'),
+            (TokenType.PRIME, "'"), (TokenType.LPAREN, '('), (TokenType.NUMBER, 3.0),
+            (TokenType.COMMA, ','), (TokenType.NUMBER, 1.0), (TokenType.RPAREN, ')'),
+            (TokenType.RPAREN, ')'), (TokenType.EOF, None)
+        ]
+        self.assertEqual(tokens, expected_tokens)
+
+    def test_eof_and_unknown_symbol(self):
+        """EOF repeats once the input is exhausted and unknown symbols raise an error."""
+        lexer = Lexer("x # trailing comment")
+        self.assertEqual(lexer.get_next_token().value, 'x')
+        self.assertEqual(lexer.get_next_token().type, TokenType.EOF)
+        self.assertEqual(lexer.get_next_token().type, TokenType.EOF)
+
+        lexer = Lexer("x + $")
+        lexer.get_next_token()
+        lexer.get_next_token()
+        with self.assertRaises(UnknownSymbolError) as context:
+            lexer.get_next_token()
+        self.assertEqual(context.exception.message, "Unknown symbol encountered: $")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,171 @@
+import io
+import os
+import pickle
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+import numpy as np
+from tests.compiler_tests import run
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter
+from mrog.matrix import MatrixValue, SparseMatrixValue
+from mrog.vectorize import VectorizedEvaluator
+from mrog.exceptions import InvalidMatrixOperationError
+from mrog.mrog import main
+
+PROGRAM = """
+a(x) = matrix([[1, 2], [3, 4]]) * matrix([[x], [1]])
+b(x) = 2 * matrix([[x, 1], [0, x]]) + 1
+c(x) = sin(matrix([[x, 2*x]])) / matrix([[x, 1]])
+p(x, y) = matrix([[x, y], [1, x*y]]) * matrix([[sin(x)], [y^2]])
+q(x, y) = exp(matrix([[x, 2*y]]))^2 * log(2, matrix([[x], [y]]))
+s(x) = matrix([[1, 2]]) * matrix([[x, 1]])
+"""
+
+
+def banded(zero, n=6):
+    """Program of a banded matrix literal, with its other entries written as `zero`."""
+    rows = []
+    for i in range(n):
+        row = [zero] * n
+        row[i] = f"x * y + {i}"
+        row[(i + 2) % n] = "sin(x)"
+        rows.append('[' + ', '.join(row) + ']')
+    column = 'matrix([' + ', '.join(f"[{k} * y]" for k in range(n)) + '])'
+    return f"""j(x, y) = matrix([{', '.join(rows)}])
+v(x, y) = j(x, y) * {column}
+w(x, y) = matrix([[{', '.join(str(k) for k in range(n))}]]) * j(x, y) * j(y, x)
+s(x, y) = j(x, y) + 2 * j(x, y) - j(y, x) / 2 - x * j(x, y) / y
+t(x, y) = sin(j(x, y)) + cos(j(x, y)) + j(x, y)^2 - 1
+"""
+
+
+def interpret(text, **options):
+    interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(text))), **options)
+    interpreter.interpret()
+    return interpreter
+
+
+class TestMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.interpreter = run(PROGRAM)
+
+    def test_semantics(self):
+        """* is the matrix product, scalars broadcast and functions apply entry by entry."""
+        call = self.interpreter.call_function
+        self.assertIsInstance(call('a', [5.0]), MatrixValue)
+        self.assertEqual(call('a', [5.0]), [[7.0], [19.0]])
+        self.assertEqual(call('b', [2.0]), [[5.0, 3.0], [1.0, 5.0]])
+        np.testing.assert_allclose(np.asarray(call('c', [2.0])), [[np.sin(2) / 2, np.sin(4)]])
+        with self.assertRaises(InvalidMatrixOperationError):
+            call('s', [1.0])
+
+    def test_same_in_every_mode(self):
+        """The tree-walker and the vectorized backend agree with compiled functions."""
+        walked = run(PROGRAM, compile=False)
+        evaluator = VectorizedEvaluator(self.interpreter)
+        xs, ys = np.linspace(0.5, 2, 4), np.linspace(1, 3, 4)
+        values = evaluator.evaluate('p', xs, ys)
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            expected = self.interpreter.call_function('p', [x, y])
+            self.assertEqual(walked.call_function('p', [x, y]), expected)
+            np.testing.assert_allclose(values[..., i], np.asarray(expected))
+
+    def test_derivatives(self):
+        """Derivatives of matrix products and entry-by-entry functions agree across strategies."""
+        gradients = {}
+        for strategy in ('symbolic', 'forward', 'finite'):
+            interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(PROGRAM))), derivative_strategy=strategy)
+            interpreter.interpret()
+            gradients[strategy] = [interpreter.evaluate_derivative(name, [1.5, 0.5]) for name in ('p', 'q')]
+        for strategy in ('forward', 'finite'):
+            for exact, other in zip(gradients['symbolic'], gradients[strategy]):
+                for e, o in zip(exact, other):
+                    np.testing.assert_allclose(np.asarray(o), np.asarray(e), rtol=1e-5)
+
+    def test_print(self):
+        """Matrices print as nested lists of their entries."""
+        output = io.StringIO()
+        with redirect_stdout(output):
+            run("m(x) = matrix([[x, 1], [2, x^2]])\nprint(m(3))\n")
+        self.assertEqual(output.getvalue(), "m(3) = [[3.0, 1.0], [2.0, 9.0]]\n")
+
+
+class TestSparseMatrix(unittest.TestCase):
+
+    def test_parse(self):
+        """Large literals of mostly constant 0 entries keep only the others."""
+        interpreter = interpret(banded('0') + "small(x) = matrix([[x, 0], [0, 0]])\n")
+        node = interpreter.functions['j'][1]
+        self.assertEqual(node.type, 'SparseMatrix')
+        self.assertEqual(node.shape, (6, 6))
+        self.assertEqual(len(node.entries), 12)
+        self.assertEqual(interpreter.functions['small'][1].type, 'Matrix')
+        self.assertIn('_sparse((6, 6)', interpreter.compiled_functions['j'].source)
+        value = interpreter.call_function('j', [1.0, 2.0])
+        self.assertIsInstance(value, SparseMatrixValue)
+        self.assertEqual(pickle.loads(pickle.dumps(value)), value)
+
+    def test_same_as_dense(self):
+        """Sparse matrices give the values of the same matrices stored densely, in every mode."""
+        for options in ({}, {'compile': False}, {'bytecode': True}, {'optimize': True}):
+            sparse, dense = interpret(banded('0'), **options), interpret(banded('0 * x'), **options)
+            for name in 'jvwst':
+                np.testing.assert_allclose(np.asarray(sparse.call_function(name, [1.5, 0.5])),
+                                           np.asarray(dense.call_function(name, [1.5, 0.5])))
+        sparse, dense = VectorizedEvaluator(sparse), VectorizedEvaluator(dense)
+        xs, ys = np.linspace(0.5, 2, 5), np.linspace(1, 3, 5)
+        for name in 'jvwst':
+            np.testing.assert_allclose(sparse.evaluate(name, xs, ys), dense.evaluate(name, xs, ys))
+            np.testing.assert_allclose(sparse.evaluate(name, xs, 2.0), dense.evaluate(name, xs, 2.0))
+
+    def test_derivatives(self):
+        """Derivatives of sparse matrices are sparse and agree with those of dense ones across strategies."""
+        for strategy in ('symbolic', 'forward', 'finite'):
+            sparse = interpret(banded('0'), derivative_strategy=strategy)
+            dense = interpret(banded('0 * x'), derivative_strategy=strategy)
+            for name in 'jvwst':
+                for s, d in zip(sparse.evaluate_derivative(name, [1.5, 0.5]),
+                                dense.evaluate_derivative(name, [1.5, 0.5])):
+                    np.testing.assert_allclose(np.asarray(s), np.asarray(d), rtol=1e-6)
+        derivative = sparse.differentiator.partial('j', ('y',))
+        self.assertEqual(derivative.type, 'SparseMatrix')
+        self.assertEqual(len(derivative.entries), 6)
+
+    def test_print(self):
+        """Sparse matrices and their derivatives print with all their entries."""
+        output = io.StringIO()
+        with redirect_stdout(output):
+            interpreter = run("m(x) = matrix([[x, 0, 0, 0], [0, x^2, 0, 0], [0, 0, 1, 0], [0, 0, 0, 0]])\n"
+                              "print(m(3))\n")
+        self.assertEqual(output.getvalue(), "m(3) = [[3.0, 0.0, 0.0, 0.0], [0.0, 9.0, 0.0, 0.0], "
+                                            "[0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 0.0]]\n")
+        derivative = interpreter.differentiator.partial('m', ('x',))
+        self.assertEqual(interpreter.expression_to_string(derivative),
+                         "[[1, 0, 0, 0], [0, 2 * x, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]")
+
+    def test_optimized_zeros(self):
+        """Entries folded to 0 by the optimizer are left out."""
+        rows = ', '.join('[' + ', '.join('x' if i == j else '1 - 1' for j in range(4)) + ']' for i in range(4))
+        interpreter = interpret(f"m(x) = matrix([{rows}])\n", optimize=True)
+        node = interpreter.functions['m'][1]
+        self.assertEqual((node.type, node.rows, node.columns), ('SparseMatrix', (0, 1, 2, 3), (0, 1, 2, 3)))
+        self.assertEqual(interpreter.call_function('m', [2.0]), (2 * np.eye(4)).tolist())
+
+    def test_command_line_errors(self):
+        """Shape errors are reported by the command line instead of ending it with a traceback."""
+        with tempfile.TemporaryDirectory() as directory:
+            program = os.path.join(directory, 'program.mg')
+            with open(program, 'w') as file:
+                file.write("k(x) = matrix([[1, 2]]) * matrix([[x, 2]])\nprint(k(1))\n")
+            output = io.StringIO()
+            with redirect_stdout(output):
+                main([program, '--no-cache'])
+        self.assertEqual(output.getvalue(), "Invalid matrix operation: cannot multiply a 1x2 matrix by a 1x2 matrix\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import io
+import sys
+import unittest
+from contextlib import redirect_stdout
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter
+
+# Deeper than the default recursion limit of Python
+DEPTH = 3 * sys.getrecursionlimit()
+
+
+def run(text, **options):
+    output = io.StringIO()
+    with redirect_stdout(output):
+        Interpreter(SemanticAnalyzer(Parser(Lexer(text))), **options).interpret()
+    return output.getvalue().splitlines()
+
+
+class TestNesting(unittest.TestCase):
+
+    def test_deep_sum(self):
+        """A sum with thousands of terms nests as deep, and evaluates in every mode."""
+        text = f"f(x) = {' + '.join(['x'] * DEPTH)}\nprint(f(2))\n"
+        for options in ({}, {'compile': False}, {'optimize': True}):
+            self.assertEqual(run(text, **options), [f"f(2) = {2.0 * DEPTH}"], options)
+
+    def test_deep_parentheses_and_functions(self):
+        """Nested parentheses and function applications evaluate without recursion."""
+        text = (f"f(x) = {'(1 + ' * DEPTH}x{')' * DEPTH}\n"
+                f"g(x) = {'abs(' * DEPTH}x{')' * DEPTH}\n"
+                f"print(f(1))\nprint(g(0 - 1))\n")
+        for options in ({}, {'compile': False}):
+            self.assertEqual(run(text, **options), [f"f(1) = {DEPTH + 1.0}", "g(-1) = 1.0"], options)
+
+    def test_deep_print_argument(self):
+        """Arguments of print statements are evaluated without recursion."""
+        text = f"f(x) = 2 * x\nprint(f({'(1 + ' * DEPTH}1{')' * DEPTH}))\n"
+        self.assertEqual(run(text), [f"f({DEPTH + 1}) = {2.0 * (DEPTH + 1)}"])
+
+    def test_compiled_source_is_flat(self):
+        """Generated Python is split into temporaries so it stays shallow enough to compile."""
+        interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(f"f(x) = {'sin(' * DEPTH}x{')' * DEPTH}\n"))))
+        interpreter.interpret()
+        function = interpreter.compiled_functions['f']
+        self.assertTrue(hasattr(function, 'source'))
+        self.assertTrue(all(line.count('(') < 100 for line in function.source.splitlines()))
+        self.assertAlmostEqual(function(0.5), interpreter.evaluate_expression(interpreter.functions['f'][1],
+                                                                             {'x': 0.5}))
+
+    def test_deep_derivative(self):
+        """Derivatives of deeply nested functions are still evaluated."""
+        text = f"f(x) = {' + '.join(['x'] * DEPTH)}\nprint(f'(1))\n"
+        value = float(run(text)[0])
+        self.assertAlmostEqual(value, DEPTH, delta=1e-3 * DEPTH)
+
+
+if __name__ == '__main__':
+    unittest.main()
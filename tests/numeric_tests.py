@@ -0,0 +1,105 @@
+import unittest
+from decimal import Decimal
+from fractions import Fraction
+from mrog.lexer import Lexer
+from mrog.token import TokenType
+from mrog.interpreter import Interpreter
+from mrog.session import Session
+from mrog.exceptions import InvalidOperandError, NotDifferentiableError
+
+
+def run(text, **options):
+    session = Session(**options)
+    return session, session.execute(text)
+
+
+class TestNumeric(unittest.TestCase):
+
+    def test_lexer_numbers(self):
+        """Number literals are floats unless the lexer is given another type."""
+        self.assertEqual(Lexer("1.5").get_next_token().value, 1.5)
+        token = Lexer("0.1", Fraction).get_next_token()
+        self.assertEqual((token.type, token.value), (TokenType.NUMBER, Fraction(1, 10)))
+
+    def test_fraction(self):
+        """Rational arithmetic is exact, compiled or walked, and printed as fractions."""
+        text = "f(x) = x^3/3 + 1/10\nprint(f(0.1))\n"
+        for compile in (True, False):
+            _, output = run(text, numeric='fraction', compile=compile)
+            self.assertEqual(output, ["f(1/10) = 301/3000"])
+        session, output = run("f(x) = sqrt(x) + abs(x)\nprint(f(9/4))\n", numeric='fraction')
+        self.assertEqual(output, ["f(9/4) = 15/4"])
+        self.assertIsInstance(session.interpreter.call_function('f', [Fraction(2)]), float)
+
+    def test_integer(self):
+        """Integer literals stay integers, so powers and factorials do not overflow."""
+        _, output = run("f(x) = 2^200 + x!\nprint(f(25))\n", numeric='integer')
+        self.assertEqual(output, [f"f(25) = {2 ** 200 + 15511210043330985984000000}"])
+        _, output = run("f(x) = x / 2\nprint(f(3))\n", numeric='integer')
+        self.assertEqual(output, ["f(3) = 1.5"])
+
+    def test_exact_factorial(self):
+        """Factorials of non-integers fail in the exact modes instead of truncating."""
+        session, _ = run("f(x) = x!\n", numeric='fraction')
+        self.assertEqual(session.interpreter.call_function('f', [Fraction(5)]), 120)
+        with self.assertRaises(InvalidOperandError):
+            session.interpreter.call_function('f', [Fraction(5, 2)])
+        with self.assertRaises(InvalidOperandError):
+            session.execute("print(f(2.5))\n")
+        # Finite differences need the factorial of non-integers too
+        with self.assertRaises(NotDifferentiableError):
+            session.execute("print(f'(3))\n")
+        session, _ = run("f(x) = x!\n")
+        self.assertEqual(session.interpreter.call_function('f', [5.5]), 120)
+
+    def test_decimal(self):
+        """Decimal arithmetic and exp, sqrt and ln use the precision of the run."""
+        session, output = run("f(x) = sqrt(x) + 1/3\nprint(f(2))\n", numeric='decimal', precision=30)
+        value = session.interpreter.call_function('f', [Decimal(2)])
+        self.assertEqual(value, Decimal(2).sqrt() + Decimal(1) / Decimal(3))
+        self.assertEqual(len(value.as_tuple().digits), 30)
+        self.assertEqual(output, [f"f(2) = {value}"])
+        # Other functions are evaluated in floating point and returned as decimals
+        session, _ = run("f(x) = sin(x) + log(2, x)\n", numeric='decimal')
+        self.assertIsInstance(session.interpreter.call_function('f', [Decimal(8)]), Decimal)
+
+    def test_derivatives(self):
+        """Exact derivatives keep the numeric type of their arguments."""
+        for strategy in ('symbolic', 'finite'):
+            session, _ = run("f(x) = x^3\n", numeric='fraction', derivative_strategy=strategy)
+            value = session.interpreter.evaluate_derivative('f', [Fraction(1, 3)])
+            if strategy == 'symbolic':
+                self.assertEqual(value, Fraction(1, 3))
+            else:
+                self.assertAlmostEqual(float(value), 1 / 3)
+        session, _ = run("f(x) = x^3\n", numeric='decimal')
+        self.assertEqual(session.interpreter.evaluate_derivative('f', [Decimal('0.5')]), Decimal('0.75'))
+
+    def test_print_gradient(self):
+        """Gradients print their numbers like single results in every mode."""
+        text = "f(x, y) = x^2 * y + y\nprint(f'(1/3, 1))\n"
+        self.assertEqual(run(text, numeric='fraction')[1], ["[2/3, 10/9]"])
+        self.assertEqual(run(text, numeric='decimal', precision=5)[1], ["[0.66666, 1.1111]"])
+        self.assertEqual(run(text)[1], ["[0.6666666666666666, 1.1111111111111112]"])
+
+    def test_folding(self):
+        """The optimizer folds constants in the numeric type of the run."""
+        session, _ = run("f(x) = x + 1/3 + 1/6\n", numeric='fraction', optimize=True)
+        _, body = session.interpreter.functions['f']
+        self.assertEqual(body.right.value, Fraction(1, 6))
+        self.assertEqual(session.interpreter.call_function('f', [Fraction(1, 2)]), 1)
+
+    def test_optimized_identities(self):
+        """Identities whose literal changes the type or the places of a result are kept in the exact modes."""
+        text = "f(x) = 1.0*x + 1.00*x\ng(x) = x / 1\nprint(f(2))\nprint(g(4))\n"
+        for numeric in ('integer', 'fraction', 'decimal'):
+            self.assertEqual(run(text, numeric=numeric, optimize=True)[1], run(text, numeric=numeric)[1])
+        self.assertEqual(run(text, numeric='decimal', optimize=True)[1], ["f(2) = 4.00", "g(4) = 4"])
+
+    def test_bytecode_is_float_only(self):
+        with self.assertRaises(ValueError):
+            Interpreter(None, numeric='fraction', bytecode=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
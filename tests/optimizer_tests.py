@@ -0,0 +1,110 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter, TRIG_FUNCTIONS_MAP, MATH_FUNCTIONS_MAP
+from mrog.optimizer import Optimizer
+from mrog.nodes import BinaryExpression, Number, Variable, FunctionCall, FunctionDefinition
+from mrog.compiler import postorder
+
+PROGRAM = """
+f(x) = 2*x*1 + 0
+g(x) = 4*f(x) + log(3, x^2) + 2*3^2 + log(3, x^2)*sin(log(3, x^2)) + 3!
+"""
+
+def optimize(text):
+    optimizer = Optimizer({**MATH_FUNCTIONS_MAP, **TRIG_FUNCTIONS_MAP})
+    ast = optimizer.optimize(SemanticAnalyzer(Parser(Lexer(text))).analyze())
+    return optimizer, {s.name: s.expression for s in ast if s.type == 'FunctionDefinition'}
+
+
+class TestOptimizer(unittest.TestCase):
+
+    def test_fold_and_simplify(self):
+        """Constant subtrees are folded and identities removed."""
+        optimizer, functions = optimize("f(x) = 2*x*1 + 0\nk(x) = x^1 + 2*3^2 - sqrt(4) + 3!\n")
+        self.assertEqual(functions['f'], BinaryExpression(Number(2.0), '*', Variable('x')))
+        self.assertEqual(functions['k'].right, Number(6))
+        self.assertEqual(functions['k'].left.right, Number(2.0))
+        self.assertEqual(functions['k'].left.left.right, Number(18.0))
+
+    def test_failing_fold_is_kept(self):
+        """Operations that fail on constants are left for the interpreter to report."""
+        _, functions = optimize("f(x) = x + 1/0\n")
+        self.assertEqual(functions['f'].right.operator, '/')
+
+    def test_hash_consing(self):
+        """Identical subtrees become one shared node and the report counts the removed nodes."""
+        optimizer, functions = optimize(PROGRAM)
+        body = functions['g']
+        product = body.left.right
+        self.assertIs(product.left, product.right.argument)
+        self.assertIs(product.left, body.left.left.left.right)
+        report = optimizer.report()
+        self.assertEqual(report['removed'], report['nodes_before'] - report['nodes_after'])
+        self.assertGreater(report['removed'], 0)
+
+    def test_same_results(self):
+        """Optimized programs evaluate to the same values, with shared nodes computed once."""
+        plain = Interpreter(SemanticAnalyzer(Parser(Lexer(PROGRAM))))
+        optimized = Interpreter(SemanticAnalyzer(Parser(Lexer(PROGRAM))), optimize=True)
+        plain.interpret()
+        optimized.interpret()
+        for x in (0.5, 2.0, 7.0):
+            self.assertAlmostEqual(plain.call_function('g', [x]), optimized.call_function('g', [x]))
+            self.assertAlmostEqual(plain.evaluate_derivative('g', [x]), optimized.evaluate_derivative('g', [x]))
+        self.assertEqual(optimized.compiled_functions['g'].source.count('_log('), 1)
+
+    def test_inlining(self):
+        """Small callees are inlined with their arguments and folded into flat expressions."""
+        interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(
+            "f(x) = 2*x\ng(x) = 4*f(x) + f(x^2)\nh(x) = g(3) + g(x)\n"))), optimize=True)
+        interpreter.interpret()
+        _, body = interpreter.functions['h']
+        self.assertFalse(any(node.type == 'FunctionCall' for node in postorder(body)))
+        # g(3) = 4*6 + 18 is folded
+        self.assertEqual(body.left, Number(42.0))
+        self.assertEqual(interpreter.call_function('h', [2.0]), 42.0 + 16.0 + 8.0)
+        self.assertEqual(interpreter.optimizer.report()['inlined'], 4)
+
+    def test_inlining_threshold(self):
+        """Bodies larger than the threshold are called instead."""
+        text = "f(x) = sin(x) + cos(x)\ng(x) = f(x) * 2\n"
+        for threshold, inlined in ((5, True), (4, False)):
+            interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(text))), optimize=True,
+                                      inline_threshold=threshold)
+            interpreter.interpret()
+            _, body = interpreter.functions['g']
+            self.assertEqual(body.left.type != 'FunctionCall', inlined)
+
+    def test_inlining_redefinition(self):
+        """A redefined function is not inlined into itself and its inlined copies are replaced."""
+        interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(
+            "f(x) = x + 1\ng(x) = f(x) * 2\nh(x) = g(x) + 1\nf(x) = f(x) + x\n"))), optimize=True)
+        interpreter.interpret()
+        self.assertEqual(interpreter.functions['f'][1].left, FunctionCall('f', [Variable('x')]))
+        self.assertEqual(interpreter.optimizer.inlined['g'], {'f'})
+        # g now calls the recursive f, which is called by name
+        with self.assertRaises(RecursionError):
+            interpreter.call_function('h', [1.0])
+        interpreter.handle_function_definition(interpreter.optimizer.optimize_statement(
+            FunctionDefinition('f', ['x'], BinaryExpression(Variable('x'), '*', Number(3.0)))))
+        self.assertEqual(interpreter.call_function('h', [1.0]), 7.0)
+
+    def test_printed_as_written(self):
+        """Print statements show the definitions as written, not their inlined bodies."""
+        text = "f(x) = x + 3\ng(x, y) = x*y + f(x)^2\nprint(g(x, y))\nprint(g(2, y))\n"
+        outputs = []
+        for optimize in (False, True):
+            output = io.StringIO()
+            with redirect_stdout(output):
+                Interpreter(SemanticAnalyzer(Parser(Lexer(text))), optimize=optimize).interpret()
+            outputs.append(output.getvalue())
+        self.assertIn("g(x, y) = x * y + f(x) ^ 2\n", outputs[1])
+        self.assertEqual(outputs[0], outputs[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+from tests.compiler_tests import run
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter
+from mrog.parallel import ParallelExecutor
+
+PROGRAM = """
+f(x) = x^2
+g(x, y) = f(x) + y
+print(f(1))
+print(g(1, 2))
+print(f'(3))
+f(x) = 3*x
+print(g(1, 2))
+print(g(x, 2))
+""" + ''.join(f"print(g({i}, 1))\n" for i in range(20))
+
+
+def output_of(interpret):
+    output = io.StringIO()
+    with redirect_stdout(output):
+        interpret()
+    return output.getvalue()
+
+
+class TestParallel(unittest.TestCase):
+
+    def test_same_output_in_order(self):
+        """Print statements run in workers print the serial output in program order."""
+        serial = output_of(Interpreter(SemanticAnalyzer(Parser(Lexer(PROGRAM)))).interpret)
+        interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(PROGRAM))))
+        with ParallelExecutor(interpreter, workers=2, batch_size=7) as executor:
+            self.assertEqual(output_of(executor.interpret), serial)
+
+    def test_error_after_earlier_lines(self):
+        """A failing print raises its error after the lines printed before it, as in a serial run."""
+        program = "f(x) = sqrt(x)\n" + ''.join(f"print(f({x}))\n" for x in (1, 4, 9, 16)) + "print(f(0-1))\n"
+        interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(program))))
+        output = io.StringIO()
+        with ParallelExecutor(interpreter, workers=2, chunks_per_worker=1) as executor:
+            with redirect_stdout(output), self.assertRaises(ValueError):
+                executor.interpret()
+        self.assertEqual(output.getvalue(), "f(1) = 1.0\nf(4) = 2.0\nf(9) = 3.0\nf(16) = 4.0\n")
+
+    def test_map_points(self):
+        """A point sweep split across workers gives the values of the interpreter."""
+        interpreter = run("f(x) = x^2\ng(x, y) = f(x) + y\n")
+        points = [(x / 4, 2.0) for x in range(30)]
+        with ParallelExecutor(interpreter, workers=2) as executor:
+            self.assertEqual(executor.map_points('g', points),
+                             [interpreter.call_function('g', list(p)) for p in points])
+
+
+if __name__ == '__main__':
+    unittest.main()
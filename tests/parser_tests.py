@@ -1,6 +1,8 @@
 import unittest
 from mrog.parser import Parser
+from mrog.lexer import Lexer
 from mrog.token import Token, TokenType
+from mrog.nodes import *
 
 class TestLexer(unittest.TestCase):
 
@@ -26,6 +28,43 @@ class TestLexer(unittest.TestCase):
         """Test case for a single token."""
         pass
 
+    def test_nodes(self):
+        """Statements are parsed into slotted node objects."""
+        ast = Parser(Lexer("f(x) = 2*x + log(2, x)\nprint(f'(1))")).parse()
+        self.assertEqual(ast, [
+            FunctionDefinition('f', ['x'], BinaryExpression(
+                BinaryExpression(Number(2.0), '*', Variable('x')), '+',
+                MathFunction('log', Variable('x'), Number(2.0)))),
+            PrintStatement(Derivative('f', [Number(1.0)])),
+        ])
+        self.assertFalse(hasattr(ast[0], '__dict__'))
+
+    def test_precedence(self):
+        """Powers bind tightest and associate to the right, the other operators to the left."""
+        def parse(text):
+            return Parser(Lexer(f"f(a, b, c) = {text}")).parse()[0].expression
+        a, b, c = Variable('a'), Variable('b'), Variable('c')
+        self.assertEqual(parse("a - b - c"), BinaryExpression(BinaryExpression(a, '-', b), '-', c))
+        self.assertEqual(parse("a / b * c"), BinaryExpression(BinaryExpression(a, '/', b), '*', c))
+        self.assertEqual(parse("a ^ b ^ c"), BinaryExpression(a, '^', BinaryExpression(b, '^', c)))
+        self.assertEqual(parse("a * b ^ c"), BinaryExpression(a, '*', BinaryExpression(b, '^', c)))
+        self.assertEqual(parse("a + b * c"), BinaryExpression(a, '+', BinaryExpression(b, '*', c)))
+        self.assertEqual(parse("(a + b) * c"), BinaryExpression(BinaryExpression(a, '+', b), '*', c))
+        self.assertEqual(parse("a * b!"), BinaryExpression(a, '*', Factorial(b)))
+        self.assertEqual(parse("log(a, b + c) ^ 2"),
+                         BinaryExpression(MathFunction('log', BinaryExpression(b, '+', c), a), '^', Number(2.0)))
+
+    def test_deep_nesting(self):
+        """Expressions nested far beyond the Python recursion limit are parsed."""
+        depth = 20000
+        ast = Parser(Lexer(f"f(x) = {'sin(' * depth}x{')' * depth} + {'(' * depth}x{')' * depth}")).parse()
+        node = ast[0].expression.left
+        for _ in range(depth):
+            self.assertEqual(node.function, 'sin')
+            node = node.argument
+        self.assertEqual(node, Variable('x'))
+        self.assertEqual(ast[0].expression.right, Variable('x'))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,94 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout, redirect_stderr
+from mrog.profiler import Profiler, profile, node_types
+from mrog.parser import Parser
+from mrog.lexer import Lexer
+from mrog.mrog import main
+
+PROGRAM = """f(x) = sin(x)^2 + x*cos(x)
+g(x, y) = f(x) * y + f(y)
+print(g(1, 2))
+print(f'(3))
+print(g(2, 3))
+"""
+
+
+def quiet_profile(source, **options):
+    with redirect_stdout(io.StringIO()):
+        return profile(source, **options)
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_report(self):
+        """Every stage is timed, and calls and nodes are counted."""
+        report = quiet_profile(PROGRAM)
+        self.assertEqual(list(report['stages']), ['cache', 'lexer', 'parser', 'analyzer', 'interpreter'])
+        for stage in ('lexer', 'parser', 'analyzer', 'interpreter'):
+            self.assertGreater(report['stages'][stage], 0)
+        self.assertAlmostEqual(report['total'], sum(report['stages'].values()))
+        self.assertEqual({name: entry['calls'] for name, entry in report['functions'].items()},
+                         {'g': 2, 'f': 4, "f'": 1})
+        self.assertLessEqual(report['functions']['f']['cumulative'], report['functions']['g']['cumulative'])
+        self.assertGreaterEqual(report['functions']['g']['own'], 0)
+        json.dumps(report)
+
+    def test_node_counts_match_tree_walker(self):
+        """Compiled bodies count the nodes the tree-walker would evaluate."""
+        program = "f(x) = sin(x)^2 + x*cos(x)\ng(x, y) = f(x) * y + f(y)\nprint(g(1, 2))\nprint(g(2, 3))\n"
+        compiled = quiet_profile(program)
+        walked = quiet_profile(program, compile=False)
+        self.assertEqual(compiled['nodes'], walked['nodes'])
+        self.assertEqual(compiled['nodes']['FunctionCall'], 2 + 4)
+        self.assertEqual(compiled['functions']['f']['calls'], walked['functions']['f']['calls'])
+
+    def test_shared_nodes_counted_once(self):
+        statement = Parser(Lexer("f(x) = sin(x) + x")).parse()[0]
+        shared = statement.expression.right = statement.expression.left.argument
+        self.assertIs(shared, statement.expression.right)
+        self.assertEqual(node_types(statement.expression),
+                         {'BinaryExpression': 1, 'MathFunction': 1, 'Variable': 1})
+
+    def test_streamed_stages(self):
+        """Interleaved stages are timed exclusive of each other when streaming."""
+        report = quiet_profile(io.StringIO(PROGRAM), stream=True)
+        self.assertGreater(report['stages']['lexer'], 0)
+        self.assertGreater(report['stages']['parser'], 0)
+        self.assertEqual(report['functions']['g']['calls'], 2)
+
+    def test_command_line(self):
+        with tempfile.TemporaryDirectory() as directory:
+            program = os.path.join(directory, 'program.mg')
+            output = os.path.join(directory, 'profile.json')
+            with open(program, 'w') as file:
+                file.write(PROGRAM)
+            stderr = io.StringIO()
+            with redirect_stdout(io.StringIO()), redirect_stderr(stderr):
+                main([program, '--profile', '--profile-output', output])
+            with open(output) as file:
+                report = json.load(file)
+            self.assertEqual(report['functions']['g']['calls'], 2)
+            self.assertIn('interpreter', stderr.getvalue())
+            # A warm start reads the cache instead of lexing and parsing
+            with redirect_stdout(io.StringIO()):
+                main([program, '--profile-output', output])
+            with open(output) as file:
+                report = json.load(file)
+            self.assertGreater(report['stages']['cache'], 0)
+            self.assertEqual(report['stages']['lexer'], 0)
+
+    def test_disabled(self):
+        """Without a profiler the interpreter keeps its methods and registered functions unwrapped."""
+        from tests.compiler_tests import run
+        interpreter = run("f(x) = x + 1\n")
+        self.assertNotIn('evaluate_expression', vars(interpreter))
+        self.assertTrue(hasattr(interpreter.compiled_functions['f'], 'source'))
+        self.assertIsInstance(Profiler().report()['stages'], dict)
+
+
+if __name__ == '__main__':
+    unittest.main()
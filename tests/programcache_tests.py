@@ -0,0 +1,101 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+from mrog import programcache
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter
+from mrog.exceptions import UndefinedFunctionError
+
+PROGRAM = """f(x) = 2*x + sin(x)
+g(x, y) = matrix([[f(x), y], [x*y, f'(y)]])
+print(f(3))
+print(g(1, 2))
+"""
+
+
+def output(analyzer):
+    interpreter = Interpreter(analyzer)
+    text = io.StringIO()
+    with redirect_stdout(text):
+        interpreter.interpret()
+    return text.getvalue()
+
+
+class TestProgramCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'program.mg')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def analyze_without_parsing(self, source):
+        """Analyze through the cache, failing if the program is parsed."""
+        with mock.patch.object(programcache, 'SemanticAnalyzer', side_effect=AssertionError("parsed")):
+            return programcache.analyze(self.path, source)
+
+    def test_warm_cache_skips_parsing(self):
+        """A second run loads the statements the first run stored and prints the same output."""
+        cold = programcache.analyze(self.path, PROGRAM)
+        self.assertTrue(os.path.exists(programcache.cache_path(self.path)))
+        self.assertIn(programcache.CACHE_DIRECTORY, programcache.cache_path(self.path))
+        warm = self.analyze_without_parsing(PROGRAM)
+        self.assertEqual(warm.analyze(), cold.analyze())
+        self.assertEqual(output(warm), output(SemanticAnalyzer(Parser(Lexer(PROGRAM)))))
+
+    def test_stale_entries(self):
+        """Entries of another source, mrog version or cache format are not used."""
+        programcache.analyze(self.path, PROGRAM)
+        changed = PROGRAM + "print(f(4))\n"
+        self.assertIsNone(programcache.load(self.path, changed))
+        self.assertEqual(len(programcache.analyze(self.path, changed).analyze()), 5)
+        self.assertEqual(len(self.analyze_without_parsing(changed).analyze()), 5)
+        with mock.patch.object(programcache, '__version__', 'other'):
+            self.assertIsNone(programcache.load(self.path, changed))
+        with mock.patch.object(programcache, 'CACHE_FORMAT', programcache.CACHE_FORMAT + 1):
+            self.assertIsNone(programcache.load(self.path, changed))
+
+    def test_corrupt_entries(self):
+        """Truncated, altered or foreign entries are rebuilt instead of loaded."""
+        programcache.analyze(self.path, PROGRAM)
+        path = programcache.cache_path(self.path)
+        with open(path, 'rb') as file:
+            data = file.read()
+        for corrupt in (data[:len(data) // 2], data[:-1] + bytes([data[-1] ^ 1]), b'', b'not a cache entry'):
+            with open(path, 'wb') as file:
+                file.write(corrupt)
+            self.assertIsNone(programcache.load(self.path, PROGRAM))
+            self.assertEqual(output(programcache.analyze(self.path, PROGRAM)), "f(3) = 6.141120008059867\n"
+                             "g(1, 2) = [[2.8414709848078967, 2.0], [2.0, 1.5838531634528576]]\n")
+        self.assertIsNotNone(programcache.load(self.path, PROGRAM))
+
+    def test_unpickling_errors(self):
+        """Entries whose statements cannot be unpickled any more are rebuilt."""
+        with mock.patch.object(programcache.pickle, 'dumps', return_value=b'cmrog.nodes\nRemoved\n.'):
+            programcache.analyze(self.path, PROGRAM)
+        self.assertTrue(os.path.exists(programcache.cache_path(self.path)))
+        self.assertIsNone(programcache.load(self.path, PROGRAM))
+        self.assertEqual(len(programcache.analyze(self.path, PROGRAM).analyze()), 4)
+        self.assertEqual(len(self.analyze_without_parsing(PROGRAM).analyze()), 4)
+
+    def test_errors_are_not_cached(self):
+        source = "print(h(1))\n"
+        with self.assertRaises(UndefinedFunctionError):
+            programcache.analyze(self.path, source)
+        self.assertFalse(os.path.exists(programcache.cache_path(self.path)))
+
+    def test_unwritable_directory(self):
+        """Programs still run when the cache cannot be written."""
+        with mock.patch.object(programcache.os, 'makedirs', side_effect=PermissionError):
+            self.assertEqual(len(programcache.analyze(self.path, PROGRAM).analyze()), 4)
+        self.assertIsNone(programcache.load(self.path, PROGRAM))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+from mrog.session import Session
+from mrog.sampling import AdaptiveSampler, write_samples
+from mrog.vectorize import parse_grid
+from mrog.exceptions import InvalidGridError
+
+
+def define(text, **options):
+    session = Session(**options)
+    session.execute(text)
+    return session.interpreter
+
+
+def interpolation_error(sampler, points, values):
+    xs = np.linspace(points[0, 0], points[-1, 0], 100001)
+    return np.abs(np.interp(xs, points[:, 0], values) - sampler.evaluator.evaluate(sampler.function_name, xs)).max()
+
+
+class TestSampling(unittest.TestCase):
+
+    def test_interval(self):
+        """Points gather where the function bends, within the tolerance of linear interpolation."""
+        interpreter = define("f(x) = tanh(40 * (x - 0.5))\n")
+        sampler = AdaptiveSampler(interpreter, 'f', 1e-4)
+        points, values = sampler.sample(parse_grid(['x=0:1:17']))
+        self.assertTrue(np.all(np.diff(points[:, 0]) > 0))
+        self.assertEqual(sampler.stats['evaluations'], len(values))
+        self.assertEqual(sampler.stats['derivative_evaluations'], len(values))
+        # Twice the tolerance is relative to the range of tanh
+        self.assertLess(interpolation_error(sampler, points, values), 4e-4)
+        near = np.abs(points[:, 0] - 0.5) < 0.1
+        self.assertGreater(near.sum(), 5 * (~near).sum())
+        # A uniform grid of as many points is far less accurate
+        uniform = np.linspace(0, 1, len(values))
+        uniform_error = interpolation_error(sampler, uniform[:, None], sampler.evaluator.evaluate('f', uniform))
+        self.assertGreater(uniform_error, 10 * interpolation_error(sampler, points, values))
+
+    def test_measured_error(self):
+        """A kink that second derivatives miss is found from the measured interpolation error."""
+        interpreter = define("f(x) = abs(x - 0.3) + x\n")
+        for curvature in (True, False):
+            sampler = AdaptiveSampler(interpreter, 'f', 1e-4, curvature=curvature)
+            points, values = sampler.sample(parse_grid(['x=0:1:17']))
+            self.assertLess(interpolation_error(sampler, points, values), 1e-3)
+            self.assertLess(len(values), sampler.stats['uniform_points'] / 10)
+        self.assertEqual(sampler.stats['derivative_evaluations'], 0)
+
+    def test_linear(self):
+        """Functions exactly interpolated keep the initial grid."""
+        interpreter = define("f(x, y) = 2 * x + x * y - y\n")
+        sampler = AdaptiveSampler(interpreter, 'f')
+        points, values = sampler.sample(parse_grid(['x=0:1:5', 'y=-1:1:3']))
+        self.assertEqual(points.shape, (15, 2))
+        self.assertEqual(sampler.stats['rounds'], 0)
+        np.testing.assert_allclose(values, 2 * points[:, 0] + points[:, 0] * points[:, 1] - points[:, 1])
+
+    def test_rectangle(self):
+        """Cells are split where a function of two variables bends, without repeating points."""
+        interpreter = define("f(x, y) = exp(0 - 50 * ((x - 0.5)^2 + (y - 0.5)^2))\n")
+        sampler = AdaptiveSampler(interpreter, 'f', 1e-3)
+        points, values = sampler.sample(parse_grid(['x=0:1:9', 'y=0:1:9']))
+        self.assertEqual(len(np.unique(points, axis=0)), len(points))
+        np.testing.assert_allclose(values, sampler.evaluator.evaluate('f', points[:, 0], points[:, 1]))
+        self.assertGreater(sampler.stats['rounds'], 2)
+        self.assertLess(len(values), sampler.stats['uniform_points'] / 10)
+        center = np.max(np.abs(points - 0.5), axis=1) < 0.25
+        self.assertGreater(center.sum(), (~center).sum())
+
+    def test_max_points(self):
+        interpreter = define("f(x) = sin(1 / (x + 0.01))\n")
+        sampler = AdaptiveSampler(interpreter, 'f', 1e-8, max_points=500)
+        points, values = sampler.sample(parse_grid(['x=0:1:17']))
+        self.assertEqual(len(values), 500)
+
+    def test_invalid(self):
+        interpreter = define("f(x, y, z) = x\ng(x) = matrix([[x, 1]])\nh(x, y) = x\n")
+        with self.assertRaises(InvalidGridError):
+            AdaptiveSampler(interpreter, 'f')
+        with self.assertRaises(InvalidGridError):
+            AdaptiveSampler(interpreter, 'g').sample(parse_grid(['x=0:1:3']))
+        with self.assertRaises(InvalidGridError):
+            AdaptiveSampler(interpreter, 'h').sample(parse_grid(['x=0:1:3']))
+
+    def test_write(self):
+        """Samples are written as CSV rows or as a .npy array of the same rows."""
+        interpreter = define("f(x, y) = x * y^2\n")
+        points, values = AdaptiveSampler(interpreter, 'f').sample(parse_grid(['x=0:1:5', 'y=0:1:5']))
+        output = io.StringIO()
+        write_samples(output, 'f', ['x', 'y'], points, values, chunk_size=7)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0], "x,y,f")
+        self.assertEqual(len(lines), len(values) + 1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'samples.npy')
+            write_samples(path, 'f', ['x', 'y'], points, values, chunk_size=7)
+            np.testing.assert_array_equal(np.load(path), np.column_stack([points, values]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from mrog.server import EvaluationServer
+
+
+async def exchange(server, requests, path=None):
+    """Send request lines to a server all at once and return its responses."""
+    listener = await server.start(path=path, port=0)
+    async with listener:
+        if path:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection('127.0.0.1', listener.sockets[0].getsockname()[1])
+        for request in requests:
+            writer.write((request if isinstance(request, str) else json.dumps(request)).encode() + b'\n')
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in requests]
+        writer.close()
+        await writer.wait_closed()
+        # Let the server see the end of the connection before the loop stops
+        await asyncio.sleep(0.01)
+    return responses
+
+
+def run(server, requests, path=None):
+    return asyncio.run(exchange(server, requests, path))
+
+
+class TestServer(unittest.TestCase):
+
+    def test_requests_in_order(self):
+        """Definitions stay compiled across requests and responses come back in order."""
+        server = EvaluationServer()
+        responses = run(server, [
+            {'id': 1, 'op': 'define', 'source': "f(x) = x^2\ng(x, y) = f(x) + y\nprint(g(1, 2))"},
+            {'id': 2, 'op': 'evaluate', 'function': 'g', 'arguments': [3, 1]},
+            {'id': 3, 'op': 'batch', 'function': 'f', 'points': [[1], [2], [3]]},
+            {'id': 4, 'op': 'define', 'source': "f(x) = 2 * x"},
+            {'id': 5, 'op': 'evaluate', 'function': 'g', 'arguments': [3, 1]},
+        ])
+        self.assertEqual([r['id'] for r in responses], [1, 2, 3, 4, 5])
+        self.assertTrue(all(r['ok'] for r in responses))
+        self.assertEqual(responses[0]['output'], ["g(1, 2) = 3.0"])
+        self.assertEqual(responses[1]['value'], 10.0)
+        self.assertEqual(responses[2]['values'], [1.0, 4.0, 9.0])
+        self.assertFalse(responses[2]['metrics']['offloaded'])
+        self.assertEqual(responses[4]['value'], 7.0)
+        for response in responses:
+            self.assertGreaterEqual(response['metrics']['latency_ms'], response['metrics']['compute_ms'])
+        server.close()
+
+    def test_offloaded_batch(self):
+        """Large batches are evaluated by the worker processes with the latest definitions."""
+        server = EvaluationServer(workers=2, offload_points=10)
+        points = [[x / 4, 2] for x in range(40)]
+        responses = run(server, [
+            {'op': 'define', 'source': "f(x, y) = x^2 + y"},
+            {'op': 'batch', 'function': 'f', 'points': points},
+            {'op': 'define', 'source': "f(x, y) = x * y"},
+            {'op': 'batch', 'function': 'f', 'points': points},
+            {'op': 'stats'},
+        ])
+        self.assertTrue(responses[1]['metrics']['offloaded'])
+        self.assertEqual(responses[1]['values'], [(x / 4) ** 2 + 2 for x in range(40)])
+        self.assertEqual(responses[3]['values'], [x / 4 * 2 for x in range(40)])
+        stats = responses[4]
+        self.assertEqual(stats['offloaded_batches'], 2)
+        self.assertEqual(stats['requests']['batch']['count'], 2)
+        self.assertIn('p99_ms', stats['requests']['define'])
+        server.close()
+
+    def test_errors(self):
+        """Invalid requests get an error response and the connection goes on."""
+        server = EvaluationServer()
+        responses = run(server, [
+            "not json",
+            {'id': 'a', 'op': 'launch'},
+            {'id': 'b', 'op': 'evaluate', 'function': 'f', 'arguments': [1]},
+            {'id': 'c', 'op': 'define', 'source': "f(x) = y"},
+            {'id': 'd', 'op': 'define', 'source': "f(x) = x"},
+            {'id': 'e', 'op': 'evaluate', 'function': 'f', 'arguments': [1, 2]},
+            {'id': 'f', 'op': 'evaluate', 'function': 'f', 'arguments': ["one"]},
+            {'id': 'g', 'op': 'stats'},
+        ])
+        self.assertEqual([r['ok'] for r in responses], [False] * 3 + [False, True, False, False, True])
+        self.assertEqual(responses[1]['id'], 'a')
+        self.assertIn("unknown operation", responses[1]['error'])
+        self.assertEqual(responses[2]['error'], "Invalid request: function f is not defined")
+        self.assertTrue(responses[3]['error'].startswith("Error in line 1"))
+        self.assertEqual(responses[7]['errors'], 6)
+
+    def test_exact_numbers(self):
+        """Numbers given as text are read exactly and exact results are returned as text."""
+        server = EvaluationServer(numeric='fraction')
+        with tempfile.TemporaryDirectory() as directory:
+            responses = run(server, [
+                {'op': 'define', 'source': "f(x) = x / 3"},
+                {'op': 'evaluate', 'function': 'f', 'arguments': ["1/7"]},
+                {'op': 'evaluate', 'function': 'f', 'arguments': [0.5]},
+            ], path=os.path.join(directory, 'mrog.sock'))
+        self.assertEqual([r['value'] for r in responses[1:]], ["1/21", "1/6"])
+
+    def test_non_finite_values(self):
+        """Infinite and NaN results are answered as text, which stays valid JSON."""
+        server = EvaluationServer()
+        responses = run(server, [
+            {'op': 'define', 'source': "f(x) = x^3\ng(x) = x - x"},
+            {'op': 'evaluate', 'function': 'f', 'arguments': ["1e400"]},
+            {'op': 'batch', 'function': 'f', 'points': [["-1e400"], [1]]},
+            {'op': 'evaluate', 'function': 'g', 'arguments': ["inf"]},
+        ])
+        self.assertEqual(responses[1]['value'], "inf")
+        self.assertEqual(responses[2]['values'], ["-inf", 1.0])
+        self.assertEqual(responses[3]['value'], "nan")
+        server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import io
+import unittest
+from mrog.session import Session, repl
+from mrog.exceptions import *
+
+LIBRARY = """
+f(x) = 2*x
+g(x) = f(x) + 1
+h(x) = g(x) * f(x)
+k(x) = x^2
+"""
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Session(memoize=64)
+        self.session.execute(LIBRARY)
+
+    def test_statements_one_at_a_time(self):
+        """Functions defined by earlier statements are visible to later ones."""
+        session = Session()
+        self.assertEqual(session.execute("f(x) = x + 1\n"), [])
+        self.assertEqual(session.execute("print(f(2))\n"), session.execute("print(f(2))"))
+        self.assertEqual(session.line, 4)
+
+    def test_redefinition_updates_dependents(self):
+        """Callers see the new body of a redefined function, directly or not."""
+        before = self.session.execute("print(h(1))\n")
+        self.session.execute("f(x) = 3*x\n")
+        after = self.session.execute("print(h(1))\n")
+        self.assertNotEqual(before, after)
+        self.assertEqual(self.session.interpreter.call_function('h', [1.0]), 12.0)
+
+    def test_dependents_callee_first(self):
+        """Dependents are listed transitively, each after the functions it calls."""
+        self.assertEqual(self.session.dependents('f'), ['g', 'h'])
+        self.assertEqual(self.session.dependents('k'), [])
+
+    def test_unrelated_functions_stay_compiled(self):
+        """Redefining a function keeps the compiled forms and cached results of unrelated functions."""
+        interpreter = self.session.interpreter
+        for name in ('f', 'g', 'h', 'k'):
+            interpreter.call_function(name, [2.0])
+        compiled = interpreter.compiled_functions['k']
+        self.session.execute("f(x) = 3*x\n")
+        self.assertIs(interpreter.compiled_functions['k'], compiled)
+        self.assertTrue(interpreter.memo_caches['k'])
+        for name in ('f', 'g', 'h'):
+            self.assertNotIn(name, interpreter.compiled_functions.keys())
+            self.assertFalse(interpreter.memo_caches[name])
+
+    def test_redefinition_replaces_inlined_copies(self):
+        """Optimized callers holding an inlined copy of a redefined function use the new body."""
+        session = Session(optimize=True)
+        session.execute(LIBRARY)
+        self.assertEqual(session.interpreter.optimizer.inlined['h'], {'f', 'g'})
+        session.execute("f(x) = 3*x\n")
+        self.assertEqual(session.execute("print(h(1))\n"), ["h(1) = 12.0"])
+
+    def test_call_graph_follows_redefinitions(self):
+        """A redefinition that stops calling a function is no longer its dependent."""
+        self.session.execute("g(x) = k(x)\n")
+        self.assertEqual(self.session.dependents('f'), ['h'])
+        self.assertEqual(self.session.dependents('k'), ['g', 'h'])
+
+    def test_recursive_definitions(self):
+        """Functions calling each other do not make the dependency search loop."""
+        self.session.execute("k(x) = h(x) + k(x)\n")
+        self.assertEqual(self.session.dependents('k'), [])
+        self.assertEqual(self.session.dependents('f'), ['g', 'h', 'k'])
+        self.session.execute("f(x) = x\n")
+
+    def test_errors_report_session_lines(self):
+        """Errors name the line within the session, and the session goes on after them."""
+        with self.assertRaises(UndefinedFunctionError) as error:
+            self.session.execute("m(x) = q(x)\n")
+        self.assertIn(f"line {self.session.line}", error.exception.message)
+        self.assertEqual(self.session.execute("print(k(3))\n"), ["k(3) = 9.0"])
+
+    def test_repl(self):
+        """The read-eval-print loop prints results and errors until the input ends."""
+        lines = iter(["f(x) = x + 1", "", "print(q(1))", "print(f(1))",
+                      "k(x) = matrix([[1, 2]]) * matrix([[x, 2]])", "print(k(1))", "g(x) = sqrt(x)", "print(g(0-1))", "print(f(2))"])
+        def read(prompt):
+            for line in lines:
+                return line
+            raise EOFError
+        output = io.StringIO()
+        repl(Session(), read, output)
+        printed = output.getvalue().splitlines()
+        self.assertIn("Undefined function q", printed[0])
+        self.assertEqual(printed[1], "f(1) = 2.0")
+        self.assertIn("Invalid matrix operation", printed[2])
+        self.assertIn("math domain error", printed[3])
+        self.assertEqual(printed[4], "f(2) = 3.0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+from mrog.lexer import Lexer
+from mrog.parser import Parser
+from mrog.semantic import SemanticAnalyzer
+from mrog.interpreter import Interpreter
+from mrog.exceptions import UndefinedFunctionError
+
+PROGRAM = """f(x) = 2*x
+print(f(3))
+g(x, y) = f(x) + y  # comment
+print(g(1, 2))
+"""
+
+
+def stream(lines):
+    """Interpret lines in streaming mode, returning the interpreter and its output."""
+    interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(lines))), stream=True)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        interpreter.interpret()
+    return interpreter, output.getvalue()
+
+
+class TestStream(unittest.TestCase):
+
+    def test_same_output(self):
+        """Streaming a file gives the output of interpreting the whole text."""
+        interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(PROGRAM))))
+        output = io.StringIO()
+        with redirect_stdout(output):
+            interpreter.interpret()
+        streamed, streamed_output = stream(io.StringIO(PROGRAM))
+        self.assertEqual(streamed_output, output.getvalue())
+        self.assertEqual(streamed_output, "f(3) = 6.0\ng(1, 2) = 4.0\n")
+        # Per-line bookkeeping is dropped once a statement has been analyzed
+        self.assertEqual(streamed.semantic_analyzer.parser.used_variables, {})
+        self.assertEqual(streamed.semantic_analyzer.parser.functions_called, {})
+
+    def test_incremental(self):
+        """A statement runs before the lines after it are read."""
+        output = io.StringIO()
+        def lines():
+            yield "f(x) = x^2\n"
+            yield "print(f(2))\n"
+            yield "g(x) = f(x)\n"
+            self.assertEqual(output.getvalue(), "f(2) = 4.0\n")
+            yield "print(g(3))\n"
+        interpreter = Interpreter(SemanticAnalyzer(Parser(Lexer(lines()))), stream=True)
+        with redirect_stdout(output):
+            interpreter.interpret()
+        self.assertEqual(output.getvalue(), "f(2) = 4.0\ng(3) = 9.0\n")
+
+    def test_diagnostics(self):
+        """Errors report the same line as in whole-program mode."""
+        text = "f(x) = x\nprint(f(1))\n\ng(x) = h(x)\n"
+        with self.assertRaises(UndefinedFunctionError) as whole:
+            Interpreter(SemanticAnalyzer(Parser(Lexer(text)))).interpret()
+        with self.assertRaises(UndefinedFunctionError) as streamed:
+            stream(io.StringIO(text))
+        self.assertEqual(str(streamed.exception), str(whole.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+from tests.compiler_tests import run
+from mrog.vectorize import VectorizedEvaluator, parse_grid
+
+PROGRAM = """
+f(x) = 2*x
+g(x) = 4*f(x) + log(3, x^2) + acoth(x + 1) + csc(x)
+h(x, y) = sqrt(x^2 + y^2) * 3! - f'(y)
+c(x) = 5
+m(x, y) = matrix([[x*y, 1], [sech(x), y]])
+"""
+
+
+class TestVectorize(unittest.TestCase):
+
+    def setUp(self):
+        """Build an interpreter and a vectorized evaluator for the same program."""
+        self.interpreter = run(PROGRAM)
+        self.evaluator = VectorizedEvaluator(self.interpreter)
+
+    def test_matches_scalar_interpreter(self):
+        """Vectorized results agree with the scalar interpreter point by point."""
+        xs = np.linspace(0.5, 3, 7)
+        for name, args in [('g', [xs]), ('h', [xs, 2.0])]:
+            expected = [self.interpreter.call_function(name, [x] + args[1:]) for x in xs]
+            np.testing.assert_allclose(self.evaluator.evaluate(name, *args), expected, rtol=1e-6)
+
+    def test_result_shapes(self):
+        """Constant bodies broadcast to the points and matrices keep their entries first."""
+        xs = np.linspace(0, 1, 4)
+        self.assertEqual(self.evaluator.evaluate('c', xs).tolist(), [5.0] * 4)
+        self.assertEqual(self.evaluator.evaluate('m', xs, xs).shape, (2, 2, 4))
+
+    def test_grid(self):
+        """Grid specifications expand to the Cartesian product of the variable ranges."""
+        mesh, values = self.evaluator.evaluate_grid('h', parse_grid(['x=0:1:3', 'y=1:2:5']))
+        self.assertEqual(values.shape, (3, 5))
+        self.assertAlmostEqual(values[2, 0], self.interpreter.call_function('h', [1.0, 1.0]), places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()